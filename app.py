@@ -1,272 +1,107 @@
 import os
-from flask import Flask, request, jsonify, url_for, Blueprint
+from flask import Flask, request, jsonify, url_for, Blueprint, Response, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token, JWTManager, jwt_required, get_jwt_identity
-from datetime import datetime, timedelta
-from sqlalchemy import func, Enum as SQLAlchemyEnum, Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Date
-from sqlalchemy.orm import relationship
-from flask_sqlalchemy import SQLAlchemy
+from flask_jwt_extended import create_access_token, JWTManager, jwt_required, get_jwt_identity, get_jwt
+from datetime import datetime, timedelta, date, timezone
+from sqlalchemy import func, String, MetaData, Table, text, inspect as sa_inspect
+from sqlalchemy import select, exists, literal, cast, false, update, or_, bindparam
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload, selectinload, undefer, aliased, configure_mappers
 from functools import wraps
 import threading
+import time
 import requests  # Para a API do Brevo
-import enum
 
-# ===================================================================
-# 1. DEFINIÇÃO DOS MODELOS (models.py)
-# ===================================================================
-
-db = SQLAlchemy()
-
-# Tabela de associação
-user_cultures = db.Table('user_cultures',
-    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('culture_id', db.Integer, db.ForeignKey('culture.id'), primary_key=True)
+from models import (
+    db, user_cultures, UserType, User, Culture, PlantedCulture, EventType, HistoryEvent, DiagnosisHistory,
+    Doubt, Suggestion, Alert, UserEditHistory, UserEditHistoryField, PasswordResetToken, SyncChange,
+    ArchivedPlantedCulture, ArchivedHistoryEvent, ArchivedAlert, HomeSnapshot,
+    CultureCooccurrence, CultureRecommendation, TokenRevocation
 )
-
-class UserType(enum.Enum):
-    COMMON = "COMMON"
-    ADMIN = "ADMIN"
-
-class User(db.Model):
-    __tablename__ = 'users'
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(150), nullable=False)
-    email = db.Column(db.String(150), unique=True, nullable=False)
-    password_hash = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
-    user_type = db.Column(SQLAlchemyEnum(UserType), nullable=False, default=UserType.COMMON)
-
-    cultures = db.relationship('Culture', secondary=user_cultures, lazy='subquery',
-                                backref=db.backref('interested_users', lazy=True))
-    
-    planted_cultures = db.relationship('PlantedCulture', backref='user', lazy=True, cascade="all, delete-orphan")
-    
-    diagnosis_history = db.relationship('DiagnosisHistory', backref='user', lazy=True)
-    doubts = db.relationship('Doubt', backref='author', lazy=True)
-    suggestions = db.relationship('Suggestion', backref='author', lazy=True)
-    edit_history = db.relationship('UserEditHistory', foreign_keys='UserEditHistory.edited_user_id', backref='edited_user')
-    reset_tokens = db.relationship('PasswordResetToken', backref='user', lazy=True)
-    alerts = db.relationship('Alert', backref='user', lazy=True) # Relacionamento de alertas
-
-    def __repr__(self):
-        return f'<User {self.email}>'
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'email': self.email,
-            'user_type': self.user_type.name
-        }
-
-class Culture(db.Model):
-    __tablename__ = 'culture'
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), unique=True, nullable=False)
-    image_url = db.Column(db.String(255), nullable=False)
-    cycle_days = db.Column(db.Integer, nullable=False, default=90)
-    
-    planted_instances = db.relationship('PlantedCulture', backref='culture')
-    diagnosis_history = db.relationship('DiagnosisHistory', backref='culture')
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'image_url': self.image_url,
-            'cycle_days': self.cycle_days 
-        }
-
-class PlantedCulture(db.Model):
-    __tablename__ = 'planted_culture'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    planting_date = db.Column(db.Date, nullable=False)
-    predicted_harvest_date = db.Column(db.Date, nullable=True)
-    notes = db.Column(db.Text, nullable=True)
-    
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    culture_id = db.Column(db.Integer, db.ForeignKey('culture.id'), nullable=False)
-    
-    history_events = db.relationship('HistoryEvent', backref='planted_culture', lazy=True, cascade="all, delete-orphan")
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'planting_date': self.planting_date.isoformat(),
-            'predicted_harvest_date': self.predicted_harvest_date.isoformat() if self.predicted_harvest_date else None,
-            'notes': self.notes,
-            'user_id': self.user_id,
-            'culture': self.culture.to_dict(),
-            'history_events': [event.to_dict() for event in self.history_events]
-        }
-
-class EventType(enum.Enum):
-    PLANTIO = "PLANTIO"
-    ADUBAGEM = "ADUBAGEM"
-    AGROTOXICO = "AGROTOXICO"
-    VENENO = "VENENO"
-    COLHEITA = "COLHEITA"
-    OUTRO = "OUTRO"
-
-class HistoryEvent(db.Model):
-    __tablename__ = 'history_event'
-
-    id = db.Column(db.Integer, primary_key=True)
-    event_date = db.Column(db.DateTime, nullable=False, default=func.now())
-    event_type = db.Column(SQLAlchemyEnum(EventType), nullable=False)
-    observation = db.Column(db.Text, nullable=True)
-    
-    planted_culture_id = db.Column(db.Integer, db.ForeignKey('planted_culture.id'), nullable=False)
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'event_date': self.event_date.isoformat(),
-            'event_type': self.event_type.name,
-            'observation': self.observation
-        }
-
-class DiagnosisHistory(db.Model):
-    __tablename__ = 'diagnosis_history'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    diagnosis_name = db.Column(db.String(255), nullable=False)
-    observation = db.Column(db.Text, nullable=True)
-    photo_path = db.Column(db.String(512), nullable=False)
-    analysis_date = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
-    
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    culture_id = db.Column(db.Integer, db.ForeignKey('culture.id'), nullable=False)
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'diagnosis_name': self.diagnosis_name,
-            'observation': self.observation,
-            'photo_path': self.photo_path,
-            'analysis_date': self.analysis_date.isoformat(),
-            'culture_name': self.culture.name,
-            'culture_id': self.culture_id,
-            'user_id': self.user_id
-        }
-
-class Doubt(db.Model):
-    __tablename__ = 'doubts'
-
-    id = db.Column(db.Integer, primary_key=True)
-    question_text = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
-    is_anonymous = db.Column(db.Boolean, default=False, nullable=False)
-    
-    reply_text = db.Column(db.Text, nullable=True)
-    replied_at = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
-
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'question_text': self.question_text,
-            'created_at': self.created_at.isoformat(),
-            'author_name': 'Anônimo' if self.is_anonymous else self.author.name,
-            'reply_text': self.reply_text,
-            'replied_at': self.replied_at.isoformat() if self.replied_at else None
-        }
-
-class Suggestion(db.Model):
-    __tablename__ = 'suggestions'
-
-    id = db.Column(db.Integer, primary_key=True)
-    suggestion_text = db.Column(db.Text, nullable=False)
-    created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
-    is_anonymous = db.Column(db.Boolean, default=False, nullable=False)
-    
-    reply_text = db.Column(db.Text, nullable=True)
-    replied_at = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
-
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'suggestion_text': self.suggestion_text,
-            'created_at': self.created_at.isoformat(),
-            'author_name': 'Anônimo' if self.is_anonymous else self.author.name,
-            'reply_text': self.reply_text,
-            'replied_at': self.replied_at.isoformat() if self.replied_at else None
-        }
-
-class Alert(db.Model):
-    __tablename__ = 'alerts'
-
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(100), nullable=False)
-    message = db.Column(db.Text, nullable=False)
-    is_read = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
-    
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'message': self.message,
-            'is_read': self.is_read,
-            'created_at': self.created_at.isoformat(),
-            'user_id': self.user_id
-        }
-
-class UserEditHistory(db.Model):
-    __tablename__ = 'user_edit_history'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    edited_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    edited_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    field_changed = db.Column(db.String(50), nullable=False)
-    old_value = db.Column(db.Text, nullable=True)
-    new_value = db.Column(db.Text, nullable=True)
-    changed_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
-
-    editor = db.relationship('User', foreign_keys=[edited_by_user_id])
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'field_changed': self.field_changed,
-            'old_value': self.old_value,
-            'new_value': self.new_value,
-            'changed_at': self.changed_at.isoformat(),
-            'editor_name': self.editor.name
-        }
-
-class PasswordResetToken(db.Model):
-    __tablename__ = 'password_reset_tokens'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    token = db.Column(db.String(512), unique=True, nullable=False)
-    expires_at = db.Column(db.DateTime, nullable=False)
-    
-    def __repr__(self):
-        return f"<PasswordResetToken user_id={self.user_id}>"
+from knowledge_base import disease_explanations, disease_weather_rules
+
+import metrics
+import query_debug
+from query_debug import query_budget
+import profiler
+from profiler import ProfilerError
+import rate_limit
+from rate_limit import Policy
+import response_cache
+from response_cache import cached
+import response_encoding
+from response_encoding import precompressed
+import text_search
+import user_search
+import similarity
+import outbreaks
+import weather_risk
+import geo
+import recommendations
+import revocation
 
 # ===================================================================
-# 2. INÍCIO DA CONFIGURAÇÃO DO APP (app.py)
+# 1. CONFIGURAÇÃO DO APP (os modelos ficam em models.py)
 # ===================================================================
 
-app = Flask(__name__)
-
 # --- Configuração ---
-database_url = os.environ.get('DATABASE_URL', 'sqlite:///database.db')
-if database_url and database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'super-secret-key-fallback')
-app.config['RESET_TOKEN_EXPIRES'] = timedelta(hours=1)
+def load_config(app):
+    database_url = os.environ.get('DATABASE_URL', 'sqlite:///database.db')
+    if database_url and database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'super-secret-key-fallback')
+    app.config['RESET_TOKEN_EXPIRES'] = timedelta(hours=1)
+    app.config['HARVEST_REMINDER_DAYS'] = int(os.environ.get('HARVEST_REMINDER_DAYS', 7))
+    app.config['MAX_UPCOMING_HARVEST_DAYS'] = 365
+    app.config['HARVEST_RECOMPUTE_CHUNK'] = int(os.environ.get('HARVEST_RECOMPUTE_CHUNK', 5000))
+    app.config['SYNC_PAGE_SIZE'] = 1000
+    app.config['SYNC_OVERLAP_SECONDS'] = 30
+    app.config['SEARCH_MAX_PER_PAGE'] = 50
+    app.config['SIMILARITY_MIN_SCORE'] = 0.35
+    app.config['SIMILARITY_REFRESH_SECONDS'] = 30
+    app.config['SIMILARITY_OVERLAP_SECONDS'] = 60
+    app.config['ARCHIVE_HARVESTED_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_HARVESTED_AFTER_DAYS', 90))
+    app.config['ARCHIVE_READ_ALERTS_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_READ_ALERTS_AFTER_DAYS', 90))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))
+    app.config['HOME_RANKING_SIZE'] = 5
+    app.config['HOME_RANKING_REFRESH_SECONDS'] = 60
+    app.config['OUTBREAK_WINDOW_DAYS'] = int(os.environ.get('OUTBREAK_WINDOW_DAYS', outbreaks.DEFAULT_WINDOW))
+    app.config['OUTBREAK_Z_THRESHOLD'] = float(os.environ.get('OUTBREAK_Z_THRESHOLD', outbreaks.DEFAULT_Z_THRESHOLD))
+    app.config['OUTBREAK_MIN_COUNT'] = int(os.environ.get('OUTBREAK_MIN_COUNT', outbreaks.DEFAULT_MIN_COUNT))
+    app.config['OUTBREAK_ALERT_DAYS'] = int(os.environ.get('OUTBREAK_ALERT_DAYS', 3))
+    app.config['WEATHER_RISK_THRESHOLD'] = float(os.environ.get('WEATHER_RISK_THRESHOLD', 0.6))
+    app.config['WEATHER_RISK_CHUNK'] = int(os.environ.get('WEATHER_RISK_CHUNK', 50000))
+    app.config['NEARBY_DEFAULT_RADIUS_KM'] = 20
+    app.config['NEARBY_MAX_RADIUS_KM'] = 100
+    app.config['NEARBY_DEFAULT_DAYS'] = 30
+    app.config['NEARBY_MAX_DAYS'] = 365
+    app.config['RECOMMENDATION_SIZE'] = 10
+    app.config['RECOMMENDATION_MODEL_REFRESH_SECONDS'] = 300
+    app.config['RECOMMENDATION_CHUNK'] = int(os.environ.get('RECOMMENDATION_CHUNK', 50000))
+    app.config['HOME_SNAPSHOT_MAX_AGE'] = int(os.environ.get('HOME_SNAPSHOT_MAX_AGE', 3600))
+    app.config['TOKEN_REVOCATION_REFRESH_SECONDS'] = int(os.environ.get('TOKEN_REVOCATION_REFRESH_SECONDS', 5))
+    app.config['TOKEN_REVOCATION_OVERLAP_SECONDS'] = 30
+    app.config['TOKEN_REVOCATION_RELOAD_SECONDS'] = 3600
+    app.config['TOKEN_REVOCATION_CAPACITY'] = revocation.DEFAULT_CAPACITY
+
+# --- LIMITES DE REQUISIÇÕES POR ROTA ---
+# Policy(escopo, capacidade, período em segundos): 'ip' usa o IP do cliente,
+# 'email' o e-mail informado (rotas sem JWT) e 'account' a identidade do JWT.
+RATE_LIMIT_POLICIES = {
+    'login': [Policy('ip', 20, 60), Policy('email', 5, 60)],
+    'register': [Policy('ip', 5, 3600)],
+    'request_password_reset': [Policy('ip', 5, 3600), Policy('email', 3, 3600)],
+    'reset_password': [Policy('ip', 10, 3600)],
+    'post_doubt': [Policy('account', 20, 3600)],
+    'post_suggestion': [Policy('account', 20, 3600)],
+    'save_diagnosis': [Policy('account', 120, 3600)],
+    'add_planted_culture': [Policy('account', 60, 3600)],
+    'add_history_event': [Policy('account', 240, 3600)],
+}
 
 # --- CONFIGURAÇÃO BREVO/E-MAIL (API HTTP) ---
 BREVO_API_KEY = os.environ.get('BREVO_API_KEY')
@@ -275,21 +110,22 @@ BREVO_API_URL = "https://api.brevo.com/v3/smtp/email"
 # --- FIM DA CONFIGURAÇÃO DE E-MAIL ---
 
 
-# --- Inicialização das Extensões ---
-db.init_app(app)
-jwt = JWTManager(app)
+# --- Extensões e blueprint (ligados ao app em create_app) ---
+jwt = JWTManager()
+api = Blueprint('api', __name__)
 
 
 # --- FUNÇÕES AUXILIARES DE E-MAIL (BREVO ASSÍNCRONO) ---
-def send_brevo_email_async(recipient_email, subject, html_content):
-    """Função que envia o e-mail via API do Brevo (HTTPS), rodando em uma thread."""
+def brevo_request(recipient_email, subject, html_content):
+    """Cabeçalhos e corpo da chamada à API do Brevo, ou None se não estiver configurado."""
     brevo_api_key = os.environ.get('BREVO_API_KEY')
     sender_email = os.environ.get('MAIL_SENDER_EMAIL')
     bcc_email = "jpzurlo.jz@gmail.com" 
     
     if not brevo_api_key or not sender_email:
         print("ERRO: Configuração Brevo (API Key ou SENDER_EMAIL) ausente.")
-        return
+        metrics.registry.inc('plantdoctor_email_sends_total', outcome='not_configured')
+        return None
 
     headers = {
         "accept": "application/json",
@@ -304,21 +140,32 @@ def send_brevo_email_async(recipient_email, subject, html_content):
         "htmlContent": html_content,
         "bcc": [{"email": bcc_email}] 
     }
+    return headers, data
+
+def send_brevo_email_async(recipient_email, subject, html_content):
+    """Função que envia o e-mail via API do Brevo (HTTPS), rodando em uma thread."""
+    brevo_call = brevo_request(recipient_email, subject, html_content)
+    if brevo_call is None:
+        return
+    headers, data = brevo_call
 
     try:
         response = requests.post(BREVO_API_URL, headers=headers, json=data)
         response.raise_for_status() 
         print(f">>> Brevo E-mail enviado (c/ BCC). Status: {response.status_code}")
+        metrics.registry.inc('plantdoctor_email_sends_total', outcome='sent')
 
     except requests.exceptions.HTTPError as e:
         error_details = e.response.text
         print(f"ERRO DE ENVIO BREVO: {e.response.status_code}. Detalhe: {error_details}")
+        metrics.registry.inc('plantdoctor_email_sends_total', outcome='http_error')
     except Exception as e:
         print(f"Erro inesperado no envio Brevo: {e}")
+        metrics.registry.inc('plantdoctor_email_sends_total', outcome='error')
 
 
-def send_welcome_email(recipient_email, name): 
-    """Lógica do e-mail de Boas-Vindas."""
+def welcome_email_content(recipient_email, name):
+    """Assunto e HTML do e-mail de Boas-Vindas."""
     subject = "🌱 Bem-vindo(a) ao Plant Doctor!"
     html_content = f"""
         <html><body>
@@ -331,6 +178,12 @@ def send_welcome_email(recipient_email, name):
             <hr>
         </body></html>
     """
+    return subject, html_content
+
+
+def send_welcome_email(recipient_email, name): 
+    """Lógica do e-mail de Boas-Vindas."""
+    subject, html_content = welcome_email_content(recipient_email, name)
     threading.Thread(target=send_brevo_email_async, args=[recipient_email, subject, html_content]).start()
 
 
@@ -355,6 +208,20 @@ def send_reset_email(recipient_email, token):
 # --- FIM DAS FUNÇÕES DE E-MAIL ---
 
 
+# --- FUNÇÕES AUXILIARES DE SENHA (COM MEDIÇÃO DE TEMPO) ---
+def hash_password(password):
+    started = time.perf_counter()
+    password_hash = generate_password_hash(password)
+    metrics.registry.observe('plantdoctor_password_hash_seconds', time.perf_counter() - started, operation='generate')
+    return password_hash
+
+def verify_password(password_hash, password):
+    started = time.perf_counter()
+    is_valid = check_password_hash(password_hash, password)
+    metrics.registry.observe('plantdoctor_password_hash_seconds', time.perf_counter() - started, operation='check')
+    return is_valid
+
+
 # --- DECORATOR PARA PROTEGER ROTAS DE ADMIN ---
 def admin_required():
     def wrapper(fn):
@@ -362,25 +229,843 @@ def admin_required():
         @jwt_required()
         def decorator(*args, **kwargs):
             current_user_id = int(get_jwt_identity())
-            user = User.query.get(current_user_id)
-            if user and user.user_type == UserType.ADMIN:
+            user_type = db.session.query(User.user_type).filter(User.id == current_user_id).scalar()
+            if user_type == UserType.ADMIN:
                 return fn(*args, **kwargs)
             else:
                 return jsonify(message="Acesso restrito a administradores."), 403
         return decorator
     return wrapper
 
-# --- FUNÇÃO AUXILIAR PARA REGISTRAR HISTÓRICO DE ADMIN ---
-def log_user_change(edited_user, admin_user_id, field, old_value, new_value):
+# --- REVOGAÇÃO DE TOKENS (LOGOUT, TROCA DE SENHA E DE PAPEL) ---
+_token_revocations_state = {'cache': None, 'loaded_until': None, 'last_refresh': None, 'built_at': None}
+_token_revocations_lock = threading.Lock()
+
+def _epoch(value):
+    """datetime ingênuo em UTC (como o datetime.utcnow() gravado) -> segundos desde a época."""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+def token_revocations(force=False):
+    """Cache de revogações deste worker, atualizado no máximo a cada TOKEN_REVOCATION_REFRESH_SECONDS.
+
+    A atualização traz só as linhas novas, relendo uma margem de
+    TOKEN_REVOCATION_OVERLAP_SECONDS para não perder transações que fizeram commit
+    depois da leitura anterior. A cada TOKEN_REVOCATION_RELOAD_SECONDS (ou quando o
+    filtro enche) o cache é refeito do zero, sem as revogações já expiradas.
+    """
+    state = _token_revocations_state
+    config = current_app.config
+
+    def fresh():
+        return state['cache'] is not None and state['last_refresh'] is not None \
+            and time.monotonic() - state['last_refresh'] < config['TOKEN_REVOCATION_REFRESH_SECONDS']
+
+    if not force and fresh():
+        return state['cache']
+    # Se outra thread já está atualizando, segue com o cache atual; sem cache
+    # (primeira carga ou carga anterior com erro) espera por ela
+    if not _token_revocations_lock.acquire(blocking=state['cache'] is None):
+        return state['cache']
+    try:
+        if not force and fresh():
+            return state['cache']
+        now = time.monotonic()
+        started = datetime.utcnow()
+        query = db.session.query(TokenRevocation.user_id, TokenRevocation.jti, TokenRevocation.revoked_at)
+        cache = state['cache']
+        if cache is None or cache.tokens.full or now - state['built_at'] >= config['TOKEN_REVOCATION_RELOAD_SECONDS']:
+            rows = query.filter(TokenRevocation.expires_at >= started).all()
+            cache = revocation.RevocationCache(max(config['TOKEN_REVOCATION_CAPACITY'], 2 * len(rows)))
+            built_at = now
+        else:
+            overlap = timedelta(seconds=config['TOKEN_REVOCATION_OVERLAP_SECONDS'])
+            rows = query.filter(TokenRevocation.revoked_at >= state['loaded_until'] - overlap).all()
+            built_at = state['built_at']
+        for user_id, jti, revoked_at in rows:
+            cache.add(user_id, jti, _epoch(revoked_at))
+        # Só depois da leitura: se ela falhar, a próxima requisição tenta de novo
+        state.update(cache=cache, loaded_until=started, built_at=built_at, last_refresh=now)
+    finally:
+        _token_revocations_lock.release()
+    return state['cache']
+
+def record_token_revocation(user_id, jti=None, expires_at=None):
+    """Revoga um token (`jti`) ou, sem jti, todos os tokens já emitidos para o usuário. Não faz commit.
+
+    Vale na hora neste worker; os demais a veem na próxima atualização do cache.
+    """
+    now = datetime.utcnow()
+    if expires_at is None:
+        # A marca só precisa durar até o último token anterior a ela expirar
+        lifetime = max(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'] or timedelta(days=3650),
+                       current_app.config['RESET_TOKEN_EXPIRES'])
+        expires_at = now + lifetime
+    db.session.add(TokenRevocation(user_id=user_id, jti=jti, revoked_at=now, expires_at=expires_at))
+    cache = _token_revocations_state['cache']
+    if cache is not None:
+        cache.add(user_id, jti, _epoch(now))
+
+def is_token_revoked(jwt_payload):
+    """Sem consulta ao banco, a não ser que o jti caia no filtro de Bloom."""
+    status = token_revocations().check(int(jwt_payload['sub']), jwt_payload.get('jti'), jwt_payload.get('iat', 0))
+    if status == 'maybe':
+        return db.session.query(exists().where(TokenRevocation.jti == jwt_payload['jti'])).scalar()
+    return status == 'revoked'
+
+def refresh_token_revocations():
+    token_revocations()
+
+@jwt.token_in_blocklist_loader
+def token_in_blocklist(jwt_header, jwt_payload):
+    return is_token_revoked(jwt_payload)
+
+# --- FUNÇÕES AUXILIARES PARA REGISTRAR HISTÓRICO DE ADMIN ---
+AUDITED_USER_FIELDS = ('name', 'email', 'password', 'user_type')
+
+def log_user_change(changes, field, old_value, new_value):
     if str(old_value) != str(new_value):
-        history_entry = UserEditHistory(
+        changes.append({'field': field, 'old_value': str(old_value), 'new_value': str(new_value)})
+
+def save_user_changes(edited_user, admin_user_id, changes):
+    """Grava uma única linha de auditoria com todos os campos alterados na ação."""
+    if changes:
+        db.session.add(UserEditHistory(
             edited_user_id=edited_user.id,
             edited_by_user_id=admin_user_id,
-            field_changed=field,
-            old_value=str(old_value),
-            new_value=str(new_value)
+            field_changed=','.join(change['field'] for change in changes),
+            changes=changes,
+            fields=[UserEditHistoryField(field=change['field']) for change in changes]
+        ))
+
+def audit_page(query, limit, order_column=UserEditHistory.id):
+    """Paginação por keyset (id decrescente): devolve (itens, próximo cursor).
+
+    order_column: coluna igual ao id da linha pela qual o índice usado já vem ordenado.
+    """
+    rows = query.order_by(order_column.desc()).limit(limit + 1).all()
+    next_cursor = rows[limit - 1][0].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def parse_audit_pagination():
+    cursor = request.args.get('cursor', type=int)
+    limit = min(200, max(1, request.args.get('limit', 50, type=int)))
+    return cursor, limit
+
+# --- FUNÇÕES AUXILIARES DE PLANTIOS ---
+def open_planting_filter():
+    """Filtro SQL para plantios ainda não colhidos (sem evento de COLHEITA)."""
+    return ~exists().where(
+        HistoryEvent.planted_culture_id == PlantedCulture.id,
+        HistoryEvent.event_type == EventType.COLHEITA
+    )
+
+def create_harvest_reminders(reference_date=None, window_days=None):
+    """Cria avisos de colheita próxima para todos os usuários com um único INSERT…SELECT.
+
+    Idempotente por plantio/dia: a chave de deduplicação inclui a data de referência,
+    então rodar a rotina duas vezes no mesmo dia não duplica avisos.
+    Retorna o número de avisos criados.
+    """
+    today = reference_date or date.today()
+    if window_days is None:
+        window_days = current_app.config['HARVEST_REMINDER_DAYS']
+    window_end = today + timedelta(days=window_days)
+
+    dedup_key = literal('harvest:') + cast(PlantedCulture.id, String) + literal(':' + today.isoformat())
+
+    reminders = select(
+        literal('Colheita Próxima'),
+        literal('Sua plantação de ') + Culture.name + literal(' tem colheita prevista para ')
+            + cast(PlantedCulture.predicted_harvest_date, String) + literal('.'),
+        false(),
+        PlantedCulture.user_id,
+        dedup_key
+    ).join(Culture, PlantedCulture.culture_id == Culture.id).where(
+        PlantedCulture.predicted_harvest_date >= today,
+        PlantedCulture.predicted_harvest_date <= window_end,
+        open_planting_filter(),
+        ~exists().where(
+            Alert.user_id == PlantedCulture.user_id,
+            Alert.dedup_key == dedup_key
+        )
+    )
+
+    result = db.session.execute(
+        Alert.__table__.insert().from_select(
+            ['title', 'message', 'is_read', 'user_id', 'dedup_key'], reminders
         )
-        db.session.add(history_entry)
+    )
+    mark_home_snapshots_stale(
+        select(Alert.user_id).where(Alert.dedup_key.like('harvest:%:' + today.isoformat()))
+    )
+    db.session.commit()
+    return result.rowcount
+
+def date_plus_days(date_column, days):
+    """Expressão SQL 'data + N dias', portável entre SQLite e Postgres."""
+    if db.engine.dialect.name == 'sqlite':
+        return func.date(date_column, f'{int(days):+d} days')
+    return date_column + literal(int(days))
+
+def recompute_harvest_dates(culture_id, cycle_days, chunk_size=None, commit=True):
+    """Recalcula a colheita prevista dos plantios em aberto de uma cultura.
+
+    Usa UPDATEs em lote por faixa de id (um commit por faixa) para manter os
+    locks curtos em tabelas grandes; com commit=False todas as faixas ficam na
+    transação de quem chamou. Retorna o número de plantios alterados.
+    """
+    chunk_size = chunk_size or current_app.config['HARVEST_RECOMPUTE_CHUNK']
+    min_id, max_id = db.session.query(
+        func.min(PlantedCulture.id), func.max(PlantedCulture.id)
+    ).filter(PlantedCulture.culture_id == culture_id).one()
+
+    if min_id is None:
+        return 0
+
+    new_harvest_date = date_plus_days(PlantedCulture.planting_date, cycle_days)
+    touched = 0
+    for start in range(min_id, max_id + 1, chunk_size):
+        chunk_filter = (
+            PlantedCulture.culture_id == culture_id,
+            PlantedCulture.id >= start,
+            PlantedCulture.id < start + chunk_size,
+            or_(PlantedCulture.predicted_harvest_date.is_(None),
+                PlantedCulture.predicted_harvest_date != new_harvest_date),
+            open_planting_filter()
+        )
+        # O UPDATE em lote não passa pelo flush do ORM: registra a sincronização antes
+        db.session.execute(SyncChange.__table__.insert().from_select(
+            ['user_id', 'entity', 'entity_id', 'operation'],
+            select(PlantedCulture.user_id, literal('planted_culture'), PlantedCulture.id, literal('upsert'))
+            .where(*chunk_filter)
+        ))
+        result = db.session.execute(
+            update(PlantedCulture).where(*chunk_filter)
+            .values(predicted_harvest_date=new_harvest_date)
+            .execution_options(synchronize_session=False)
+        )
+        if commit:
+            db.session.commit()
+        touched += result.rowcount
+    return touched
+
+# --- ARQUIVAMENTO DE DADOS FRIOS ---
+def _copy_rows(source, target, where):
+    """INSERT…SELECT das linhas de source em target (mesmas colunas, mesmos ids)."""
+    columns = [column.name for column in target.columns if column.name in source.columns]
+    db.session.execute(target.insert().from_select(columns, select(*[source.c[name] for name in columns]).where(where)))
+
+def archive_cold_data(harvested_days=None, read_alert_days=None, batch_size=None):
+    """Move para as tabelas de arquivo os plantios colhidos há mais de N dias (com
+    seus eventos) e os avisos lidos mais antigos que N dias.
+
+    Trabalha em lotes de ids com um commit por lote, para manter as transações e os
+    locks curtos. Retorna {'plantings': n, 'history_events': n, 'alerts': n}.
+    """
+    if harvested_days is None:
+        harvested_days = current_app.config['ARCHIVE_HARVESTED_AFTER_DAYS']
+    if read_alert_days is None:
+        read_alert_days = current_app.config['ARCHIVE_READ_ALERTS_AFTER_DAYS']
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    moved = {'plantings': 0, 'history_events': 0, 'alerts': 0}
+
+    harvested_before = datetime.utcnow() - timedelta(days=harvested_days)
+    harvested = exists().where(
+        HistoryEvent.planted_culture_id == PlantedCulture.id,
+        HistoryEvent.event_type == EventType.COLHEITA,
+        HistoryEvent.event_date < harvested_before
+    )
+    while True:
+        ids = db.session.execute(
+            select(PlantedCulture.id).where(harvested).order_by(PlantedCulture.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        # O DELETE em lote não passa pelo flush do ORM: avisa a sincronização antes
+        db.session.execute(SyncChange.__table__.insert().from_select(
+            ['user_id', 'entity', 'entity_id', 'operation'],
+            select(PlantedCulture.user_id, literal('history_event'), HistoryEvent.id, literal('delete'))
+            .join(PlantedCulture, HistoryEvent.planted_culture_id == PlantedCulture.id)
+            .where(PlantedCulture.id.in_(ids))
+            .union_all(
+                select(PlantedCulture.user_id, literal('planted_culture'), PlantedCulture.id, literal('delete'))
+                .where(PlantedCulture.id.in_(ids))
+            )
+        ))
+        _copy_rows(PlantedCulture.__table__, ArchivedPlantedCulture.__table__, PlantedCulture.id.in_(ids))
+        _copy_rows(HistoryEvent.__table__, ArchivedHistoryEvent.__table__, HistoryEvent.planted_culture_id.in_(ids))
+        # Eventos antes dos plantios, por causa da chave estrangeira
+        moved['history_events'] += db.session.execute(
+            HistoryEvent.__table__.delete().where(HistoryEvent.planted_culture_id.in_(ids))
+        ).rowcount
+        moved['plantings'] += db.session.execute(
+            PlantedCulture.__table__.delete().where(PlantedCulture.id.in_(ids))
+        ).rowcount
+        db.session.commit()
+
+    read_before = datetime.utcnow() - timedelta(days=read_alert_days)
+    while True:
+        ids = db.session.execute(
+            select(Alert.id).where(Alert.is_read.is_(True), Alert.created_at < read_before)
+            .order_by(Alert.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        _copy_rows(Alert.__table__, ArchivedAlert.__table__, Alert.id.in_(ids))
+        moved['alerts'] += db.session.execute(Alert.__table__.delete().where(Alert.id.in_(ids))).rowcount
+        db.session.commit()
+
+    return moved
+
+# --- FUNÇÕES AUXILIARES DA TELA INICIAL (SNAPSHOT POR USUÁRIO) ---
+def build_home_document(user_id):
+    """Monta o documento da tela inicial: interesses, plantios em aberto, avisos não lidos e ranking."""
+    today = date.today()
+    cultures = Culture.query.join(user_cultures, user_cultures.c.culture_id == Culture.id).filter(
+        user_cultures.c.user_id == user_id
+    ).order_by(Culture.name).all()
+    plantings = PlantedCulture.query.options(joinedload(PlantedCulture.culture)).filter(
+        PlantedCulture.user_id == user_id, open_planting_filter()
+    ).order_by(PlantedCulture.predicted_harvest_date, PlantedCulture.id).all()
+    unread_alerts = db.session.query(func.count(Alert.id)).filter(
+        Alert.user_id == user_id, Alert.is_read.is_(False)
+    ).scalar()
+
+    active = [planting.to_dict(include_history=False) for planting in plantings]
+    upcoming = [p for p in active if p['predicted_harvest_date'] and p['predicted_harvest_date'] >= today.isoformat()]
+    return {
+        'cultures': [culture.to_dict() for culture in cultures],
+        'active_plantings': active,
+        'next_harvest': upcoming[0] if upcoming else None,
+        'unread_alerts': unread_alerts,
+        'ranking': home_ranking(),
+    }
+
+_home_ranking_state = {'rows': None, 'loaded_at': None}
+
+def home_ranking():
+    """Topo do ranking de culturas (agregado global), recalculado no máximo a cada HOME_RANKING_REFRESH_SECONDS."""
+    state = _home_ranking_state
+    now = time.monotonic()
+    if state['loaded_at'] is None or now - state['loaded_at'] >= current_app.config['HOME_RANKING_REFRESH_SECONDS']:
+        ranking = culture_ranking_query().limit(current_app.config['HOME_RANKING_SIZE']).all()
+        state['rows'] = [{"name": name, "count": count} for name, count in ranking]
+        state['loaded_at'] = now
+    return state['rows']
+
+def refresh_home_snapshot(user_id, commit=True):
+    """Reescreve o snapshot do usuário (criando-o se preciso). Retorna (versão, documento)."""
+    payload = build_home_document(user_id)
+    now = datetime.utcnow()
+    insert = sqlite_insert if db.engine.dialect.name == 'sqlite' else postgresql_insert
+    statement = insert(HomeSnapshot.__table__).values(
+        user_id=user_id, version=1, stale=False, built_at=now, payload=payload
+    )
+    version = db.session.execute(statement.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'version': HomeSnapshot.__table__.c.version + 1, 'stale': False,
+              'built_at': now, 'payload': statement.excluded.payload}
+    ).returning(HomeSnapshot.__table__.c.version)).scalar_one()
+    if commit:
+        db.session.commit()
+    return version, payload
+
+def mark_home_snapshots_stale(user_ids=None):
+    """Marca snapshots para serem refeitos na próxima leitura (rotinas em lote).
+
+    `user_ids` pode ser uma lista ou um SELECT de ids; None marca todos.
+    """
+    statement = update(HomeSnapshot).values(stale=True).execution_options(synchronize_session=False)
+    if user_ids is not None:
+        statement = statement.where(HomeSnapshot.user_id.in_(user_ids))
+    db.session.execute(statement)
+
+# --- DETECÇÃO DE SURTOS NOS DIAGNÓSTICOS ---
+def is_disease_label(label):
+    """Rótulos do modelo que não são doença (planta saudável, imagem qualquer) não entram na análise."""
+    return label != 'Natural Images' and not label.lower().endswith(('saudavel', 'healthy'))
+
+def detect_outbreaks(reference_date=None, history_days=None):
+    """Procura surtos nas contagens diárias de diagnósticos por (cultura, doença) e avisa os admins.
+
+    Carrega `history_days` dias até `reference_date` (padrão: só o necessário para a
+    janela de referência mais os dias avaliados) e cria, num único INSERT, um aviso
+    por admin para cada dia sinalizado entre os últimos OUTBREAK_ALERT_DAYS. A chave
+    de deduplicação inclui cultura, doença e dia, então rodar de novo não duplica.
+    Retorna {'series', 'days', 'flagged', 'alerts'}.
+    """
+    config = current_app.config
+    today = reference_date or date.today()
+    window = config['OUTBREAK_WINDOW_DAYS']
+    alert_days = config['OUTBREAK_ALERT_DAYS']
+    history_days = max(history_days or 0, window + alert_days)
+    start = today - timedelta(days=history_days - 1)
+
+    day = func.date(DiagnosisHistory.analysis_date)
+    rows = db.session.query(
+        DiagnosisHistory.culture_id, DiagnosisHistory.diagnosis_name, day, func.count(DiagnosisHistory.id)
+    ).filter(
+        DiagnosisHistory.analysis_date >= datetime(start.year, start.month, start.day),
+        DiagnosisHistory.analysis_date < datetime(today.year, today.month, today.day) + timedelta(days=1)
+    ).group_by(DiagnosisHistory.culture_id, DiagnosisHistory.diagnosis_name, day).all()
+
+    series_keys = sorted({(culture_id, label) for culture_id, label, _, _ in rows if is_disease_label(label)})
+    result = {'series': len(series_keys), 'days': history_days, 'flagged': 0, 'alerts': 0}
+    if not series_keys:
+        return result
+    series_index = {key: i for i, key in enumerate(series_keys)}
+    rows = [row for row in rows if (row[0], row[1]) in series_index]
+    matrix = outbreaks.daily_matrix(
+        [series_index[(culture_id, label)] for culture_id, label, _, _ in rows],
+        [(date.fromisoformat(str(row_day)) - start).days for _, _, row_day, _ in rows],
+        [count for _, _, _, count in rows],
+        len(series_keys), history_days
+    )
+    found = outbreaks.detect(matrix, window=window, z_threshold=config['OUTBREAK_Z_THRESHOLD'],
+                             min_count=config['OUTBREAK_MIN_COUNT'])
+
+    first_alert_day = history_days - alert_days
+    flagged_series, flagged_days = found['flags'][:, first_alert_day:].nonzero()
+    result['flagged'] = len(flagged_series)
+    if not result['flagged']:
+        return result
+
+    culture_names = dict(db.session.query(Culture.id, Culture.name))
+    candidates = {}
+    for series, day_offset in zip(flagged_series.tolist(), (flagged_days + first_alert_day).tolist()):
+        culture_id, label = series_keys[series]
+        flagged_day = start + timedelta(days=day_offset)
+        kind = 'pico' if found['spike'][series, day_offset] else 'alta sustentada'
+        dedup_key = f'outbreak:{culture_id}:{flagged_day.isoformat()}:{label}'[:100]
+        candidates[dedup_key] = (
+            f"{int(matrix[series, day_offset])} diagnósticos de {label} em {culture_names.get(culture_id, culture_id)} "
+            f"no dia {flagged_day.strftime('%d/%m/%Y')} ({kind}; média de "
+            f"{found['baseline'][series, day_offset]:.1f}/dia nos {window} dias anteriores)."
+        )
+
+    admin_ids = [admin_id for (admin_id,) in db.session.query(User.id).filter(User.user_type == UserType.ADMIN)]
+    existing = set(db.session.query(Alert.user_id, Alert.dedup_key).filter(
+        Alert.user_id.in_(admin_ids), Alert.dedup_key.in_(list(candidates))
+    ))
+    new_alerts = [
+        {'title': 'Possível surto', 'message': message, 'is_read': False, 'user_id': admin_id, 'dedup_key': key}
+        for key, message in candidates.items() for admin_id in admin_ids if (admin_id, key) not in existing
+    ]
+    if new_alerts:
+        db.session.execute(Alert.__table__.insert(), new_alerts)
+        mark_home_snapshots_stale(admin_ids)
+    db.session.commit()
+    result['alerts'] = len(new_alerts)
+    return result
+
+# --- RISCO DE DOENÇAS PELO CLIMA ---
+def create_weather_risk_alerts(paths, reference_date=None, chunk_size=None):
+    """Avisa os produtores cujos plantios em aberto estão com clima favorável a alguma doença.
+
+    Lê as observações das estações em `paths` (arquivos ou pastas, ver weather_risk.py),
+    calcula o risco de cada regra de disease_weather_rules por estação e percorre os
+    plantios com estação em lotes de WEATHER_RISK_CHUNK por faixa de id (um INSERT e
+    um commit por lote), então a memória não cresce com o número de plantios.
+    No máximo um aviso por plantio/doença por semana.
+    Retorna {'stations', 'plantings', 'alerts'}.
+    """
+    config = current_app.config
+    today = reference_date or date.today()
+    chunk_size = chunk_size or config['WEATHER_RISK_CHUNK']
+    rules = disease_weather_rules
+    labels = list(rules)
+
+    weather = weather_risk.load_observations(paths, today, max(rule['window_days'] for rule in rules.values()))
+    result = {'stations': len(weather.stations), 'plantings': 0, 'alerts': 0}
+    if not weather.stations:
+        return result
+    risk, favorable_days = weather_risk.station_risk(weather, rules)
+    culture_names = dict(db.session.query(Culture.id, Culture.name))
+    culture_positions, rule_mask = weather_risk.culture_rule_mask(rules, culture_names)
+    if not culture_positions:
+        return result
+
+    week = today.isocalendar()
+    period = f'{week.year}-W{week.week:02d}'
+    insert = sqlite_insert if db.engine.dialect.name == 'sqlite' else postgresql_insert
+    last_id = 0
+    while True:
+        chunk = db.session.query(
+            PlantedCulture.id, PlantedCulture.user_id, PlantedCulture.culture_id, PlantedCulture.weather_station
+        ).filter(
+            PlantedCulture.id > last_id,
+            PlantedCulture.weather_station.isnot(None),
+            PlantedCulture.culture_id.in_(list(culture_positions)),
+            open_planting_filter()
+        ).order_by(PlantedCulture.id).limit(chunk_size).all()
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        result['plantings'] += len(chunk)
+
+        station_index = weather_risk.station_positions(weather, [row.weather_station for row in chunk])
+        _, at_risk = weather_risk.planting_risk(
+            risk, station_index, rule_mask[[culture_positions[row.culture_id] for row in chunk]],
+            config['WEATHER_RISK_THRESHOLD']
+        )
+        alerts = []
+        for position, rule in zip(*(indices.tolist() for indices in at_risk.nonzero())):
+            planting, label = chunk[position], labels[rule]
+            window = min(rules[label]['window_days'], weather.days)
+            alerts.append({
+                'title': 'Risco de doença',
+                'message': (
+                    f"O clima está favorável a {label.split('_', 1)[1].replace('_', ' ')} no seu plantio de "
+                    f"{culture_names[planting.culture_id]}: {favorable_days[rule, station_index[position]]} "
+                    f"dos últimos {window} dias (estação {planting.weather_station}). "
+                    f"{disease_explanations[label]['prevencao']}"
+                ),
+                'is_read': False,
+                'user_id': planting.user_id,
+                'dedup_key': f'weather:{planting.id}:{label}:{period}'[:100],
+            })
+        if alerts:
+            result['alerts'] += db.session.execute(
+                insert(Alert.__table__).on_conflict_do_nothing(index_elements=['user_id', 'dedup_key']), alerts
+            ).rowcount
+        db.session.commit()
+
+    mark_home_snapshots_stale(select(Alert.user_id).where(Alert.dedup_key.like(f'weather:%:{period}')))
+    db.session.commit()
+    return result
+
+# --- RECOMENDAÇÃO DE CULTURAS (COOCORRÊNCIA) ---
+def user_culture_pairs_query(user_id=None, user_ids=None):
+    """Pares distintos (usuário, cultura) de interesses e plantios (de um usuário, de vários ou de todos)."""
+    interests = select(user_cultures.c.user_id, user_cultures.c.culture_id)
+    plantings = select(PlantedCulture.user_id, PlantedCulture.culture_id)
+    if user_id is not None:
+        interests = interests.where(user_cultures.c.user_id == user_id)
+        plantings = plantings.where(PlantedCulture.user_id == user_id)
+    elif user_ids is not None:
+        interests = interests.where(user_cultures.c.user_id.in_(user_ids))
+        plantings = plantings.where(PlantedCulture.user_id.in_(user_ids))
+    return interests.union(plantings)
+
+def _upsert_recommendations(rows):
+    insert = sqlite_insert if db.engine.dialect.name == 'sqlite' else postgresql_insert
+    statement = insert(CultureRecommendation.__table__)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'built_at': statement.excluded.built_at, 'payload': statement.excluded.payload}
+    ), rows)
+
+def rebuild_culture_recommendations(chunk_size=None):
+    """Refaz o modelo de coocorrência e as recomendações de todos os usuários com culturas.
+
+    Lê todos os pares de uma vez (dois inteiros por par), monta a matriz de
+    coocorrência em blocos e grava as recomendações em lotes de RECOMMENDATION_CHUNK
+    usuários (um INSERT…ON CONFLICT e um commit por lote).
+    Retorna {'users', 'pairs', 'cultures'}.
+    """
+    config = current_app.config
+    chunk_size = chunk_size or config['RECOMMENDATION_CHUNK']
+    user_ids, culture_ids = recommendations.load_pairs(
+        db.session.execute(user_culture_pairs_query()).partitions(100000)
+    )
+    model, counts, users, (user_index, culture_index) = recommendations.Model.build(
+        [culture_id for (culture_id,) in db.session.query(Culture.id)], user_ids, culture_ids, chunk_size
+    )
+    db.session.execute(CultureCooccurrence.__table__.delete())
+    model_rows = model.rows(counts)
+    if model_rows:
+        db.session.execute(CultureCooccurrence.__table__.insert(), model_rows)
+    db.session.commit()
+    _recommendation_model_state['model'] = model
+
+    now = datetime.utcnow()
+    size = config['RECOMMENDATION_SIZE']
+    for first, owned in recommendations.user_blocks(user_index, culture_index, len(users), len(model.culture_ids),
+                                                     chunk_size):
+        best, scores = recommendations.top_k(owned, model.similarity, model.popularity, size)
+        _upsert_recommendations([
+            {'user_id': user_id, 'built_at': now, 'payload': items}
+            for user_id, items in zip(users[first:first + len(owned)].tolist(), model.items(best, scores))
+        ])
+        db.session.commit()
+
+    # Quem ficou sem interesses nem plantios desde o último rebuild recebe as mais populares
+    db.session.execute(update(CultureRecommendation).where(CultureRecommendation.built_at < now).values(
+        built_at=now, payload=model.recommend([], size)
+    ))
+    db.session.commit()
+    return {'users': len(users), 'pairs': len(user_ids), 'cultures': len(model.culture_ids)}
+
+_recommendation_model_state = {'model': None, 'loaded_at': None}
+
+def recommendation_model():
+    """Modelo do último rebuild, relido do banco no máximo a cada RECOMMENDATION_MODEL_REFRESH_SECONDS."""
+    state = _recommendation_model_state
+    now = time.monotonic()
+    if state['loaded_at'] is None or now - state['loaded_at'] >= current_app.config['RECOMMENDATION_MODEL_REFRESH_SECONDS']:
+        state['model'] = recommendations.Model.from_rows(db.session.query(
+            CultureCooccurrence.culture_id, CultureCooccurrence.other_culture_id,
+            CultureCooccurrence.users, CultureCooccurrence.score
+        ).all())
+        state['loaded_at'] = now
+    return state['model']
+
+def refresh_culture_recommendations(user_id, commit=True):
+    """Recalcula as recomendações de um usuário com o modelo atual (caminho incremental). Retorna os itens."""
+    db.session.flush()
+    owned = [culture_id for _, culture_id in db.session.execute(user_culture_pairs_query(user_id))]
+    items = recommendation_model().recommend(owned, current_app.config['RECOMMENDATION_SIZE'])
+    _upsert_recommendations([{'user_id': user_id, 'built_at': datetime.utcnow(), 'payload': items}])
+    if commit:
+        db.session.commit()
+    return items
+
+def refresh_users_culture_recommendations(user_ids):
+    """Caminho incremental para um lote de usuários (importação em massa): uma consulta e um upsert, sem commit."""
+    owned = {user_id: [] for user_id in user_ids}
+    if not owned:
+        return
+    db.session.flush()
+    for user_id, culture_id in db.session.execute(user_culture_pairs_query(user_ids=list(owned))):
+        owned[user_id].append(culture_id)
+    model, size, now = recommendation_model(), current_app.config['RECOMMENDATION_SIZE'], datetime.utcnow()
+    _upsert_recommendations([{'user_id': user_id, 'built_at': now, 'payload': model.recommend(cultures, size)}
+                             for user_id, cultures in owned.items()])
+
+# --- ÍNDICE DE DÚVIDAS PARECIDAS (JÁ RESPONDIDAS) ---
+SIMILARITY_DIMENSIONS = int(os.environ.get('SIMILARITY_DIMENSIONS', similarity.DEFAULT_DIMENSIONS))
+answered_doubts_index = similarity.SimilarityIndex(dimensions=SIMILARITY_DIMENSIONS)
+_answered_doubts_state = {'loaded_until': None, 'last_refresh': None}
+_answered_doubts_lock = threading.Lock()
+
+def refresh_answered_doubts_index(force=False, batch_size=10000):
+    """Traz para o índice deste worker as dúvidas respondidas desde a última atualização.
+
+    Relê uma margem de SIMILARITY_OVERLAP_SECONDS: replied_at é gravado antes do
+    commit, então uma resposta pode aparecer depois da leitura anterior com um
+    instante já passado. Reindexar uma dúvida só substitui o vetor dela.
+    """
+    state = _answered_doubts_state
+    now = time.monotonic()
+    if not force and state['last_refresh'] is not None \
+            and now - state['last_refresh'] < current_app.config['SIMILARITY_REFRESH_SECONDS']:
+        return
+    # Se outra thread já está atualizando, segue com o índice atual
+    if not _answered_doubts_lock.acquire(blocking=False):
+        return
+    try:
+        state['last_refresh'] = now
+        query = db.session.query(Doubt.id, Doubt.question_text, Doubt.replied_at).filter(Doubt.reply_text.isnot(None))
+        if state['loaded_until'] is not None:
+            overlap = timedelta(seconds=current_app.config['SIMILARITY_OVERLAP_SECONDS'])
+            query = query.filter(Doubt.replied_at >= state['loaded_until'] - overlap)
+        batch = []
+        for row in query.order_by(Doubt.replied_at).yield_per(batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                answered_doubts_index.add([r.id for r in batch], [r.question_text for r in batch])
+                state['loaded_until'] = batch[-1].replied_at
+                batch = []
+        if batch:
+            answered_doubts_index.add([r.id for r in batch], [r.question_text for r in batch])
+            state['loaded_until'] = batch[-1].replied_at
+    finally:
+        _answered_doubts_lock.release()
+
+def find_similar_answered_doubts(question_text, k=5, exclude_id=None):
+    refresh_answered_doubts_index()
+    hits = answered_doubts_index.query(question_text, k=k, min_score=current_app.config['SIMILARITY_MIN_SCORE'],
+                                       exclude_id=exclude_id)
+    if not hits:
+        return []
+    doubts = {d.id: d for d in Doubt.query.options(joinedload(Doubt.author)).filter(
+        Doubt.id.in_([doubt_id for doubt_id, _ in hits]))}
+    return [dict(doubts[doubt_id].to_dict(), similarity=round(score, 4))
+            for doubt_id, score in hits if doubt_id in doubts]
+
+# --- ÍNDICE DE BUSCA TEXTUAL ---
+def ensure_search_schemas():
+    """Índices da busca textual e da busca de usuários, cada um na sua transação (só da primeira vez no processo)."""
+    text_search.ensure_schema(db.engine)
+    user_search.ensure_schema(db.engine)
+
+def rebuild_search_index(batch_size=5000):
+    """(Re)indexa todas as dúvidas e sugestões, em lotes por faixa de id."""
+    text_search.ensure_schema(db.engine)
+    total = 0
+    for kind, model, text_column in (('doubt', Doubt, Doubt.question_text),
+                                     ('suggestion', Suggestion, Suggestion.suggestion_text)):
+        last_id = 0
+        while True:
+            rows = db.session.query(model.id, text_column, model.reply_text).filter(
+                model.id > last_id
+            ).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            text_search.index_documents(db.session, [
+                (kind, item_id, '\n'.join(t for t in (item_text, reply) if t)) for item_id, item_text, reply in rows
+            ])
+            db.session.commit()
+            last_id = rows[-1][0]
+            total += len(rows)
+    return total
+
+# --- MIGRAÇÃO DO HISTÓRICO DE EDIÇÕES (UMA LINHA POR AÇÃO) ---
+def migrate_user_edit_history(batch_size=5000):
+    """Leva user_edit_history do formato antigo (uma linha por campo, com
+    old_value/new_value) para o atual (uma linha por ação, com `changes`) e
+    preenche user_edit_history_fields. Idempotente; chamada pelo create_db.py.
+
+    As linhas antigas de uma mesma ação (mesmo usuário, admin e changed_at, com
+    ids consecutivos) viram a primeira delas; as demais são apagadas.
+    Retorna {'folded': linhas antigas convertidas, 'indexed': linhas com campos novos}.
+    """
+    engine = db.engine
+    postgres = engine.dialect.name == 'postgresql'
+    result = {'folded': 0, 'indexed': 0}
+    with engine.begin() as connection:
+        columns = {column['name'] for column in sa_inspect(connection).get_columns('user_edit_history')}
+        if 'changes' not in columns:
+            connection.execute(text("ALTER TABLE user_edit_history ADD COLUMN changes JSON"))
+        if postgres:
+            connection.execute(text("ALTER TABLE user_edit_history ALTER COLUMN field_changed TYPE VARCHAR(255)"))
+        UserEditHistoryField.__table__.create(connection, checkfirst=True)
+    legacy = 'old_value' in columns
+
+    with engine.connect() as connection:
+        history = Table('user_edit_history', MetaData(), autoload_with=connection)
+        fields = UserEditHistoryField.__table__
+        selected = [history.c.id, history.c.edited_user_id, history.c.edited_by_user_id, history.c.changed_at,
+                    history.c.field_changed, history.c.changes]
+        if legacy:
+            selected += [history.c.old_value, history.c.new_value]
+        pending, last_id = None, 0
+        while True:
+            rows = connection.execute(
+                select(*selected).where(history.c.id > last_id).order_by(history.c.id).limit(batch_size)
+            ).mappings().all()
+            # Agrupa as linhas antigas consecutivas da mesma ação; o grupo aberto no fim do lote segue para o próximo
+            groups = []
+            for row in rows:
+                action = (row['edited_user_id'], row['edited_by_user_id'], row['changed_at'])
+                if row['changes'] is not None:
+                    groups.append((None, [row]))
+                elif pending is not None and pending[0] == action:
+                    pending[1].append(row)
+                else:
+                    if pending is not None:
+                        groups.append(pending)
+                    pending = (action, [row])
+            if not rows and pending is not None:
+                groups.append(pending)
+                pending = None
+            if not groups and not rows:
+                break
+
+            updates, deleted, field_rows = [], [], []
+            for action, group in groups:
+                first = group[0]
+                if action is None:
+                    field_names = [name for name in first['field_changed'].split(',') if name]
+                else:
+                    changes = [{'field': row['field_changed'], 'old_value': row['old_value'],
+                                'new_value': row['new_value']} for row in group]
+                    field_names = list(dict.fromkeys(change['field'] for change in changes))
+                    updates.append({'_id': first['id'], 'field_changed': ','.join(field_names), 'changes': changes})
+                    deleted += [row['id'] for row in group[1:]]
+                    result['folded'] += len(group)
+                field_rows += [{'field': name, 'history_id': first['id']} for name in field_names]
+
+            if field_rows:
+                known = set(connection.execute(select(fields.c.field, fields.c.history_id).where(
+                    fields.c.history_id.in_({row['history_id'] for row in field_rows})
+                )).all())
+                field_rows = [row for row in field_rows if (row['field'], row['history_id']) not in known]
+            if updates:
+                connection.execute(history.update().where(history.c.id == bindparam('_id')).values(
+                    field_changed=bindparam('field_changed'), changes=bindparam('changes')), updates)
+            if deleted:
+                connection.execute(history.delete().where(history.c.id.in_(deleted)))
+            if field_rows:
+                connection.execute(fields.insert(), field_rows)
+                result['indexed'] += len({row['history_id'] for row in field_rows})
+            connection.commit()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+
+    if legacy:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE user_edit_history DROP COLUMN old_value"))
+            connection.execute(text("ALTER TABLE user_edit_history DROP COLUMN new_value"))
+            if postgres:
+                connection.execute(text("ALTER TABLE user_edit_history ALTER COLUMN changes SET NOT NULL"))
+    return result
+
+# --- MIGRAÇÃO DO ESQUEMA (COLUNAS E ÍNDICES NOVOS EM TABELAS EXISTENTES) ---
+# create_all só cria tabelas que faltam: colunas novas em tabelas antigas entram
+# aqui, como (coluna do modelo, expressão SQL que preenche as linhas existentes).
+# Colunas com preenchimento entram anuláveis, são preenchidas e só depois
+# recebem NOT NULL (no SQLite, que não altera colunas, ficam anuláveis; o ORM
+# sempre as preenche).
+SCHEMA_COLUMNS = [
+    (Alert.__table__.c.dedup_key, None),
+    (PlantedCulture.__table__.c.updated_at, 'CURRENT_TIMESTAMP'),
+    (HistoryEvent.__table__.c.updated_at, 'CURRENT_TIMESTAMP'),
+    (DiagnosisHistory.__table__.c.updated_at, 'CURRENT_TIMESTAMP'),
+    (PlantedCulture.__table__.c.weather_station, None),
+    # Registros antigos não têm coordenadas: geo_cell fica nulo, como num POST sem localização
+    (PlantedCulture.__table__.c.latitude, None),
+    (PlantedCulture.__table__.c.longitude, None),
+    (PlantedCulture.__table__.c.geo_cell, None),
+    (DiagnosisHistory.__table__.c.latitude, None),
+    (DiagnosisHistory.__table__.c.longitude, None),
+    (DiagnosisHistory.__table__.c.geo_cell, None),
+    # Preenchida com '' e recalculada em seguida por user_search.backfill_search_keys
+    (User.__table__.c.search_key, "''"),
+]
+
+# Restrições únicas de tabelas antigas, criadas como índice único de mesmo nome
+SCHEMA_UNIQUE_INDEXES = [
+    ('alerts', 'uq_alerts_user_dedup', ('user_id', 'dedup_key')),
+]
+
+def migrate_schema():
+    """Acrescenta às tabelas existentes as colunas, restrições únicas e índices
+    das versões novas. Idempotente; chamada pelo create_db.py logo após o create_all.
+
+    Os avisos antigos ficam com dedup_key nulo: só os gerados em lote têm chave,
+    e a restrição (user_id, dedup_key) aceita vários nulos.
+    Retorna a lista das colunas acrescentadas ('tabela.coluna').
+    """
+    added = []
+    with db.engine.begin() as connection:
+        inspector = sa_inspect(connection)
+        postgres = connection.dialect.name == 'postgresql'
+        columns = {}
+        for column, fill in SCHEMA_COLUMNS:
+            table = column.table.name
+            if table not in columns:
+                columns[table] = {existing['name'] for existing in inspector.get_columns(table)}
+            if column.name in columns[table]:
+                continue
+            ddl = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} {ddl}"))
+            if fill is not None:
+                connection.execute(text(f"UPDATE {table} SET {column.name} = {fill}"))
+                if postgres and not column.nullable:
+                    connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column.name} SET NOT NULL"))
+            added.append(f'{table}.{column.name}')
+
+        for table, name, indexed in SCHEMA_UNIQUE_INDEXES:
+            existing = {index['name'] for index in inspector.get_indexes(table)}
+            existing |= {constraint['name'] for constraint in inspector.get_unique_constraints(table)}
+            if name not in existing:
+                connection.execute(text(f"CREATE UNIQUE INDEX {name} ON {table} ({', '.join(indexed)})"))
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return added
 
 # --- FUNÇÃO PARA POPULAR O BANCO DE DADOS ---
 def seed_data():
@@ -408,11 +1093,11 @@ def seed_data():
 
 
 # ===================================================================
-# 3. DEFINIÇÃO DAS ROTAS (endpoints da API)
+# 2. DEFINIÇÃO DAS ROTAS (endpoints da API)
 # ===================================================================
 
 # --- ROTAS DE AUTENTICAÇÃO ---
-@app.route("/api/auth/register", methods=["POST"])
+@api.route("/api/auth/register", methods=["POST"])
 def register():
     data = request.get_json()
     name = data.get('name')
@@ -425,7 +1110,7 @@ def register():
     if User.query.filter_by(email=email).first():
         return jsonify({"message": "Este e-mail já está registado."}), 409
     
-    hashed_password = generate_password_hash(password)
+    hashed_password = hash_password(password)
     
     new_user = User(name=name, email=email, password_hash=hashed_password)
     db.session.add(new_user)
@@ -435,7 +1120,8 @@ def register():
     
     return jsonify({"message": f"Utilizador {name} registado com sucesso!"}), 201
 
-@app.route("/api/auth/login", methods=["POST"])
+@api.route("/api/auth/login", methods=["POST"])
+@query_budget(2)
 def login():
     data = request.get_json()
     email = data.get('email')
@@ -444,10 +1130,10 @@ def login():
     if not email or not password:
         return jsonify({"message": "Email ou senha em falta."}), 400
     
-    user = User.query.filter_by(email=email).first()
-    if user and check_password_hash(user.password_hash, password):
+    user = User.query.options(undefer(User.password_hash)).filter_by(email=email).first()
+    if user and verify_password(user.password_hash, password):
         access_token = create_access_token(identity=str(user.id))
-        has_cultures = len(user.cultures) > 0
+        has_cultures = db.session.query(exists().where(user_cultures.c.user_id == user.id)).scalar()
         
         return jsonify({
             "message": "Login bem-sucedido!",
@@ -458,7 +1144,28 @@ def login():
     else:
         return jsonify({"message": "Credenciais inválidas."}), 401
 
-@app.route("/api/auth/request-password-reset", methods=["GET"])
+@api.route("/api/auth/logout", methods=["POST"])
+@query_budget(3)
+@jwt_required()
+def logout():
+    """Revoga o token da requisição; com {"all": true}, todas as sessões do usuário."""
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+
+    TokenRevocation.query.filter(
+        TokenRevocation.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+
+    if data.get('all'):
+        record_token_revocation(user_id)
+    else:
+        claims = get_jwt()
+        expires_at = datetime.fromtimestamp(claims['exp'], timezone.utc).replace(tzinfo=None) if 'exp' in claims else None
+        record_token_revocation(user_id, claims['jti'], expires_at)
+    db.session.commit()
+    return jsonify({"message": "Sessão encerrada."}), 200
+
+@api.route("/api/auth/request-password-reset", methods=["GET"])
 def request_password_reset():
     email = request.args.get('email')
     
@@ -472,9 +1179,9 @@ def request_password_reset():
 
     token = create_access_token(
         identity=str(user.id), 
-        expires_delta=app.config['RESET_TOKEN_EXPIRES']
+        expires_delta=current_app.config['RESET_TOKEN_EXPIRES']
     )
-    expiration = datetime.utcnow() + app.config['RESET_TOKEN_EXPIRES']
+    expiration = datetime.utcnow() + current_app.config['RESET_TOKEN_EXPIRES']
     
     new_token_entry = PasswordResetToken(user_id=user.id, token=token, expires_at=expiration)
     
@@ -486,10 +1193,10 @@ def request_password_reset():
         
     except Exception as e:
         db.session.rollback()
-        app.logger.error(f"Erro ao gerar token de reset para {user.email}: {e}")
+        current_app.logger.error(f"Erro ao gerar token de reset para {user.email}: {e}")
         return jsonify({"message": "Erro interno do servidor ao processar o pedido."}), 500
 
-@app.route("/api/auth/reset-password", methods=["POST"])
+@api.route("/api/auth/reset-password", methods=["POST"])
 def reset_password():
     data = request.get_json()
     token = data.get('token')
@@ -516,20 +1223,60 @@ def reset_password():
     if not user:
         return jsonify({"message": "Usuário não encontrado."}), 404
         
-    user.password_hash = generate_password_hash(new_password)
-    db.session.delete(token_entry) 
+    user.password_hash = hash_password(new_password)
+    # Invalida as sessões abertas e os outros links de redefinição ainda pendentes
+    record_token_revocation(user.id)
+    PasswordResetToken.query.filter_by(user_id=user.id).delete(synchronize_session=False)
     db.session.commit()
 
     return jsonify({"message": "Senha redefinida com sucesso!"}), 200
 
 # --- ROTAS DE ADMINISTRAÇÃO ---
-@app.route("/api/admin/users", methods=["GET"])
+@api.route("/api/admin/users", methods=["GET"])
+@query_budget(2)
 @admin_required()
 def get_all_users():
     users = User.query.order_by(User.name).all()
     return jsonify([user.to_dict() for user in users]), 200
 
-@app.route("/api/admin/users/<int:user_id>", methods=["PUT"])
+@api.route("/api/admin/users/search", methods=["GET"])
+@admin_required()
+def search_users():
+    """Busca incremental de usuários por nome/e-mail (prefixo e trecho, sem acentos), com cursor."""
+    query = request.args.get('q') or ''
+    if not user_search.normalize_query(query):
+        return jsonify(message="Informe o texto da busca em 'q'."), 400
+    limit = min(current_app.config['SEARCH_MAX_PER_PAGE'], max(1, request.args.get('limit', 20, type=int)))
+
+    cursor = None
+    if request.args.get('cursor'):
+        cursor = user_search.decode_cursor(request.args['cursor'])
+        if cursor is None:
+            return jsonify(message="Cursor inválido."), 400
+
+    user_type = (request.args.get('user_type') or '').upper() or None
+    if user_type and user_type not in UserType.__members__:
+        return jsonify(message=f"user_type inválido. Use um de: {', '.join(UserType.__members__)}."), 400
+
+    try:
+        registered_from = request.args.get('registered_from')
+        registered_from = datetime.fromisoformat(registered_from) if registered_from else None
+        registered_until = request.args.get('registered_until')
+        registered_until = datetime.fromisoformat(registered_until) if registered_until else None
+    except ValueError:
+        return jsonify(message="Datas inválidas. Use o formato ISO (YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS)."), 400
+
+    user_ids, next_cursor = user_search.search(
+        db.session, query, limit, cursor,
+        user_type=user_type, registered_from=registered_from, registered_until=registered_until
+    )
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
+    return jsonify({
+        "items": [users[user_id].to_dict() for user_id in user_ids if user_id in users],
+        "next_cursor": next_cursor
+    }), 200
+
+@api.route("/api/admin/users/<int:user_id>", methods=["PUT"])
 @admin_required()
 def update_user(user_id):
     admin_id = int(get_jwt_identity())
@@ -538,55 +1285,201 @@ def update_user(user_id):
         return jsonify(message="Usuário não encontrado."), 404
     
     data = request.get_json()
+    changes = []
 
     if 'name' in data:
-        log_user_change(user_to_update, admin_id, 'name', user_to_update.name, data['name'])
+        log_user_change(changes, 'name', user_to_update.name, data['name'])
         user_to_update.name = data['name']
     
     if 'email' in data:
-        log_user_change(user_to_update, admin_id, 'email', user_to_update.email, data['email'])
+        log_user_change(changes, 'email', user_to_update.email, data['email'])
         user_to_update.email = data['email']
         
     if 'password' in data and data['password']:
-        log_user_change(user_to_update, admin_id, 'password', 'N/A', 'Atualizada')
-        user_to_update.password_hash = generate_password_hash(data['password'])
+        log_user_change(changes, 'password', 'N/A', 'Atualizada')
+        user_to_update.password_hash = hash_password(data['password'])
 
     if 'user_type' in data:
         new_role_str = data.get('user_type', '').upper()
         try:
             new_role = UserType[new_role_str]
-            log_user_change(user_to_update, admin_id, 'user_type', user_to_update.user_type.name, new_role.name)
+            log_user_change(changes, 'user_type', user_to_update.user_type.name, new_role.name)
             user_to_update.user_type = new_role
         except KeyError:
             return jsonify(message="Tipo de usuário inválido."), 400
-            
+
+    # Nova senha ou novo papel: os tokens já emitidos para o usuário deixam de valer
+    if any(change['field'] in ('password', 'user_type') for change in changes):
+        record_token_revocation(user_to_update.id)
+    save_user_changes(user_to_update, admin_id, changes)
     db.session.commit()
     return jsonify(user_to_update.to_dict()), 200
 
-@app.route("/api/admin/users/<int:user_id>/history", methods=["GET"])
+@api.route("/api/admin/users/<int:user_id>/history", methods=["GET"])
 @admin_required()
 def get_user_history(user_id):
     user = User.query.get(user_id)
     if not user:
         return jsonify(message="Usuário não encontrado."), 404
     
-    history = UserEditHistory.query.filter_by(edited_user_id=user_id).order_by(UserEditHistory.changed_at.desc()).all()
-    return jsonify([entry.to_dict() for entry in history]), 200
+    cursor, limit = parse_audit_pagination()
+    query = db.session.query(UserEditHistory, User.name).join(
+        User, User.id == UserEditHistory.edited_by_user_id
+    ).filter(UserEditHistory.edited_user_id == user_id)
+    if cursor:
+        query = query.filter(UserEditHistory.id < cursor)
+
+    history, next_cursor = audit_page(query, limit)
+    response = jsonify([entry.to_dict(editor_name=editor_name) for entry, editor_name in history])
+    # A lista continua sendo o corpo; o cursor da próxima página vai no cabeçalho
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response, 200
+
+@api.route("/api/admin/audit", methods=["GET"])
+@admin_required()
+def get_audit_feed():
+    """Feed global de auditoria, filtrável por admin, campo e período."""
+    cursor, limit = parse_audit_pagination()
+    editor = aliased(User)
+    edited = aliased(User)
+    query = db.session.query(UserEditHistory, editor.name, edited.name).join(
+        editor, editor.id == UserEditHistory.edited_by_user_id
+    ).join(edited, edited.id == UserEditHistory.edited_user_id)
+
+    admin_id = request.args.get('admin_id', type=int)
+    if admin_id:
+        query = query.filter(UserEditHistory.edited_by_user_id == admin_id)
+
+    # Com filtro de campo, a ordem e o cursor vão para (campo, history_id): a chave
+    # de user_edit_history_fields já entrega as linhas em ordem, sem ordenar todas
+    order_column = UserEditHistory.id
+    field = request.args.get('field')
+    if field:
+        if field not in AUDITED_USER_FIELDS:
+            return jsonify(message=f"Campo inválido. Use um de: {', '.join(AUDITED_USER_FIELDS)}."), 400
+        query = query.join(UserEditHistoryField, (UserEditHistoryField.history_id == UserEditHistory.id)
+                           & (UserEditHistoryField.field == field))
+        order_column = UserEditHistoryField.history_id
+
+    try:
+        if request.args.get('since'):
+            query = query.filter(UserEditHistory.changed_at >= datetime.fromisoformat(request.args['since']))
+        if request.args.get('until'):
+            query = query.filter(UserEditHistory.changed_at < datetime.fromisoformat(request.args['until']))
+    except ValueError:
+        return jsonify(message="Datas inválidas. Use o formato ISO (YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS)."), 400
+
+    if cursor:
+        query = query.filter(order_column < cursor)
+
+    entries, next_cursor = audit_page(query, limit, order_column)
+    return jsonify({
+        "items": [dict(entry.to_dict(editor_name=editor_name), edited_user_name=edited_name)
+                  for entry, editor_name, edited_name in entries],
+        "next_cursor": next_cursor
+    }), 200
+
+
+@api.route("/api/admin/cultures/<int:culture_id>", methods=["PUT"])
+@admin_required()
+def update_culture(culture_id):
+    culture = Culture.query.get(culture_id)
+    if not culture:
+        return jsonify(message="Cultura não encontrada."), 404
+
+    data = request.get_json() or {}
+
+    if 'cycle_days' in data:
+        cycle_days = data['cycle_days']
+        if not isinstance(cycle_days, int) or isinstance(cycle_days, bool) or cycle_days <= 0:
+            return jsonify(message="'cycle_days' deve ser um inteiro positivo."), 400
+    else:
+        cycle_days = culture.cycle_days
+
+    name = culture.name
+    if 'name' in data:
+        name = data['name'].strip() if isinstance(data['name'], str) else ''
+        if not name or len(name) > 50:
+            return jsonify({"message": "'name' deve ter entre 1 e 50 caracteres."}), 400
+        if Culture.query.filter(Culture.name == name, Culture.id != culture.id).first():
+            return jsonify({"message": "Já existe uma cultura com este nome."}), 409
+    image_url = culture.image_url
+    if 'image_url' in data:
+        image_url = data['image_url'].strip() if isinstance(data['image_url'], str) else ''
+        if not image_url or len(image_url) > 255:
+            return jsonify({"message": "'image_url' deve ter entre 1 e 255 caracteres."}), 400
+
+    culture.name = name
+    culture.image_url = image_url
+    cycle_changed = cycle_days != culture.cycle_days
+    culture.cycle_days = cycle_days
+
+    # Cultura, colheitas previstas e snapshots numa só transação: nenhum plantio
+    # fica com a data calculada pelo ciclo antigo se algo falhar no meio
+    plantings_updated = 0
+    if cycle_changed:
+        plantings_updated = recompute_harvest_dates(culture.id, cycle_days, commit=False)
+    # Nome e ciclo da cultura aparecem nas telas iniciais de todos os usuários
+    mark_home_snapshots_stale()
+    db.session.commit()
+    response_cache.invalidate('cultures')
+
+    return jsonify({
+        "culture": culture.to_dict(),
+        "plantings_updated": plantings_updated
+    }), 200
+
+
+@api.route("/api/admin/profiler", methods=["POST"])
+@admin_required()
+def start_profiler():
+    """Inicia uma sessão de profiling por amostragem em todos os workers."""
+    data = request.get_json() or {}
+    try:
+        session = profiler.profiler.start(
+            route_pattern=data.get('route_pattern', '*'),
+            max_requests=data.get('max_requests'),
+            duration=data.get('duration', 30),
+            interval=data.get('interval', 0.01),
+            max_overhead=data.get('max_overhead', 0.01)
+        )
+    except ProfilerError as e:
+        return jsonify(message=str(e)), 400
+    return jsonify(session), 201
+
+@api.route("/api/admin/profiler", methods=["DELETE"])
+@admin_required()
+def stop_profiler():
+    profiler.profiler.stop()
+    return jsonify(message="Sessão de profiling encerrada."), 200
+
+@api.route("/api/admin/profiler", methods=["GET"])
+@admin_required()
+def get_profiler_results():
+    """Pilhas colapsadas (prontas para flamegraph.pl) da última sessão."""
+    session, workers, collapsed = profiler.profiler.results()
+    if request.args.get('format') == 'collapsed':
+        return Response(collapsed + '\n', mimetype='text/plain')
+    return jsonify({"session": session, "workers": workers, "collapsed": collapsed}), 200
 
 
 # --- ROTAS DE CULTURAS (GERAL) ---
-@app.route("/api/cultures", methods=["GET"])
+@api.route("/api/cultures", methods=["GET"])
+@query_budget(1)
 @jwt_required()
+@cached(tags=['cultures'], per_user=False)
+@precompressed
 def get_cultures():
     try:
         all_cultures = Culture.query.order_by(Culture.name).all()
         return jsonify([culture.to_dict() for culture in all_cultures]), 200
     except Exception as e:
-        app.logger.error(f"Erro ao buscar culturas: {e}")
+        current_app.logger.error(f"Erro ao buscar culturas: {e}")
         return jsonify({"message": "Erro interno ao buscar culturas."}), 500
 
 # --- ROTAS DE CULTURAS DO USUÁRIO (INTERESSES) ---
-@app.route("/api/user/cultures", methods=["POST"])
+@api.route("/api/user/cultures", methods=["POST"])
 @jwt_required()
 def save_user_cultures():
     try:
@@ -594,7 +1487,7 @@ def save_user_cultures():
     except ValueError:
         return jsonify({"message": "ID de utilizador inválido no token."}), 400
 
-    user = User.query.get(user_id)
+    user = User.query.options(selectinload(User.cultures)).get(user_id)
     if not user:
         return jsonify({"message": "Utilizador não encontrado."}), 404
 
@@ -605,30 +1498,53 @@ def save_user_cultures():
         return jsonify({"message": "Dados inválidos. 'culture_ids' deve ser uma lista de IDs."}), 400
     
     user.cultures.clear()
-    for culture_id in culture_ids:
-        culture = Culture.query.get(culture_id)
-        if culture:
-            user.cultures.append(culture)
-            
+    if culture_ids:
+        user.cultures.extend(Culture.query.filter(Culture.id.in_(culture_ids)).all())
+    refresh_home_snapshot(user_id, commit=False)
+    refresh_culture_recommendations(user_id, commit=False)
     db.session.commit()
+    response_cache.invalidate(f'user_cultures:{user_id}')
     return jsonify({"message": "Culturas guardadas com sucesso!"}), 200
 
-@app.route("/api/user/my-cultures", methods=["GET"])
+@api.route("/api/user/my-cultures", methods=["GET"])
+@query_budget(2)
 @jwt_required()
+@cached(tags=['user_cultures:{user_id}', 'cultures'])
 def get_my_cultures():
     try:
         user_id = int(get_jwt_identity())
     except ValueError:
         return jsonify({"message": "ID de utilizador inválido no token."}), 400
 
-    user = User.query.get(user_id)
+    user = User.query.options(selectinload(User.cultures)).get(user_id)
     if not user:
         return jsonify({"message": "Utilizador não encontrado."}), 404
     
     return jsonify([culture.to_dict() for culture in user.cultures]), 200
 
+@api.route("/api/user/recommended-cultures", methods=["GET"])
+@query_budget(5) # 2 com a recomendação pronta; até 5 quando precisa calculá-la
+@jwt_required()
+def get_recommended_cultures():
+    """Culturas que produtores com culturas parecidas também cultivam, com a pontuação de associação."""
+    user_id = int(get_jwt_identity())
+    limit = request.args.get('limit', 5, type=int)
+    if not 1 <= limit <= current_app.config['RECOMMENDATION_SIZE']:
+        return jsonify({"message": f"limit deve estar entre 1 e {current_app.config['RECOMMENDATION_SIZE']}."}), 400
+
+    stored = db.session.get(CultureRecommendation, user_id)
+    items = stored.payload if stored else refresh_culture_recommendations(user_id)
+    items = items[:limit]
+    cultures = {culture.id: culture for culture in Culture.query.filter(
+        Culture.id.in_([item['culture_id'] for item in items])
+    )} if items else {}
+    return jsonify([
+        dict(cultures[item['culture_id']].to_dict(), score=item['score'])
+        for item in items if item['culture_id'] in cultures
+    ]), 200
+
 # --- ROTAS DE GESTÃO DE PLANTIOS ---
-@app.route("/api/planted-cultures", methods=["POST"])
+@api.route("/api/planted-cultures", methods=["POST"])
 @jwt_required()
 def add_planted_culture():
     user_id = int(get_jwt_identity())
@@ -637,10 +1553,16 @@ def add_planted_culture():
     culture_id = data.get('culture_id')
     planting_date_str = data.get('planting_date')
     notes = data.get('notes')
+    weather_station = (data.get('weather_station') or '').strip() or None
 
     if not culture_id or not planting_date_str:
         return jsonify({"message": "culture_id e planting_date são obrigatórios."}), 400
 
+    try:
+        latitude, longitude = geo.parse_coordinates(data.get('latitude'), data.get('longitude'))
+    except (TypeError, ValueError):
+        return jsonify({"message": "Coordenadas inválidas: informe latitude (-90 a 90) e longitude (-180 a 180) juntas."}), 400
+
     try:
         planting_date = datetime.strptime(planting_date_str, "%Y-%m-%d").date()
     except ValueError:
@@ -657,24 +1579,41 @@ def add_planted_culture():
         culture_id=culture_id,
         planting_date=planting_date,
         predicted_harvest_date=predicted_harvest_date,
-        notes=notes
+        notes=notes,
+        weather_station=weather_station,
+        latitude=latitude,
+        longitude=longitude
     )
     db.session.add(new_planting)
+    refresh_home_snapshot(user_id, commit=False)
+    refresh_culture_recommendations(user_id, commit=False)
     db.session.commit()
 
     return jsonify(new_planting.to_dict()), 201
 
-@app.route("/api/planted-cultures", methods=["GET"])
+@api.route("/api/planted-cultures", methods=["GET"])
+@query_budget(5)
 @jwt_required()
 def get_user_planted_cultures():
     user_id = int(get_jwt_identity())
     user = User.query.get(user_id)
     if not user:
         return jsonify({"message": "Utilizador não encontrado."}), 404
-        
-    return jsonify([planting.to_dict() for planting in user.planted_cultures]), 200
 
-@app.route("/api/planted-cultures/<int:planted_culture_id>/history", methods=["POST"])
+    plantings = PlantedCulture.query.options(
+        joinedload(PlantedCulture.culture), selectinload(PlantedCulture.history_events)
+    ).filter_by(user_id=user_id).order_by(PlantedCulture.id).all()
+    result = [planting.to_dict() for planting in plantings]
+
+    # Plantios colhidos e arquivados só quando pedidos explicitamente
+    if request.args.get('include_archived') == '1':
+        archived = ArchivedPlantedCulture.query.options(
+            joinedload(ArchivedPlantedCulture.culture), selectinload(ArchivedPlantedCulture.history_events)
+        ).filter_by(user_id=user_id).order_by(ArchivedPlantedCulture.id).all()
+        result = [planting.to_dict() for planting in archived] + result
+    return jsonify(result), 200
+
+@api.route("/api/planted-cultures/<int:planted_culture_id>/history", methods=["POST"])
 @jwt_required()
 def add_history_event(planted_culture_id):
     user_id = int(get_jwt_identity())
@@ -701,50 +1640,205 @@ def add_history_event(planted_culture_id):
         observation=observation
     )
     db.session.add(new_event)
+    refresh_home_snapshot(user_id, commit=False)
     db.session.commit()
     
     return jsonify(new_event.to_dict()), 201
 
-# --- ROTAS DE DIAGNÓSTICO (IA) ---
-@app.route("/api/diagnosis-history", methods=["POST"])
+# --- ROTAS DE CALENDÁRIO DE COLHEITAS ---
+@api.route("/api/harvests/upcoming", methods=["GET"])
+@query_budget(1)
 @jwt_required()
-def save_diagnosis():
-    """Salva um novo resultado de diagnóstico da IA."""
+def get_upcoming_harvests():
+    """Lista os plantios do usuário com colheita prevista nos próximos N dias."""
     user_id = int(get_jwt_identity())
-    data = request.get_json()
-    
+
+    try:
+        days = int(request.args.get('days', 30))
+    except ValueError:
+        return jsonify({"message": "Parâmetro 'days' inválido."}), 400
+
+    if days < 0 or days > current_app.config['MAX_UPCOMING_HARVEST_DAYS']:
+        return jsonify({"message": f"'days' deve estar entre 0 e {current_app.config['MAX_UPCOMING_HARVEST_DAYS']}."}), 400
+
+    today = date.today()
+    plantings = PlantedCulture.query.options(joinedload(PlantedCulture.culture)).filter(
+        PlantedCulture.user_id == user_id,
+        PlantedCulture.predicted_harvest_date >= today,
+        PlantedCulture.predicted_harvest_date <= today + timedelta(days=days),
+        open_planting_filter()
+    ).order_by(PlantedCulture.predicted_harvest_date).all()
+
+    return jsonify([{
+        'planted_culture_id': planting.id,
+        'culture': planting.culture.to_dict(),
+        'planting_date': planting.planting_date.isoformat(),
+        'predicted_harvest_date': planting.predicted_harvest_date.isoformat(),
+        'days_until_harvest': (planting.predicted_harvest_date - today).days
+    } for planting in plantings]), 200
+
+# --- ROTA DE SINCRONIZAÇÃO INCREMENTAL ---
+@api.route("/api/sync", methods=["GET"])
+@jwt_required()
+def get_changes_since():
+    """Devolve só o que mudou desde o token informado (ou tudo, sem token)."""
+    user_id = int(get_jwt_identity())
+    since = request.args.get('since')
+
+    if not since:
+        return jsonify(full_sync_payload(user_id)), 200
+
+    try:
+        since_id = int(since)
+    except ValueError:
+        return jsonify({"message": "Token de sincronização inválido."}), 400
+
+    page_size = current_app.config['SYNC_PAGE_SIZE']
+    changes = SyncChange.query.filter(
+        SyncChange.user_id == user_id,
+        SyncChange.id > since_id
+    ).order_by(SyncChange.id).limit(page_size + 1).all()
+
+    has_more = len(changes) > page_size
+    changes = changes[:page_size]
+    token = changes[-1].id if changes else since_id
+
+    # O id é reservado no INSERT, não no commit: uma transação mais lenta pode
+    # gravar um id abaixo do token já entregue. Relê as alterações dos últimos
+    # SYNC_OVERLAP_SECONDS abaixo do token; reenviar é inofensivo, as seções
+    # refletem o estado atual dos registros
+    since_at = db.session.query(SyncChange.changed_at).filter(
+        SyncChange.user_id == user_id,
+        SyncChange.id == since_id
+    ).scalar()
+    if since_at is not None:
+        overlap = timedelta(seconds=current_app.config['SYNC_OVERLAP_SECONDS'])
+        changes = SyncChange.query.filter(
+            SyncChange.user_id == user_id,
+            SyncChange.id <= since_id,
+            SyncChange.changed_at >= since_at - overlap
+        ).order_by(SyncChange.id).all() + changes
+
+    # Só a última operação de cada registro importa
+    latest = {}
+    for change in changes:
+        latest[(change.entity, change.entity_id)] = change.operation
+
+    def ids_for(entity, operation):
+        return [entity_id for (name, entity_id), op in latest.items() if name == entity and op == operation]
+
+    plantings = PlantedCulture.query.options(joinedload(PlantedCulture.culture)).filter(
+        PlantedCulture.user_id == user_id,
+        PlantedCulture.id.in_(ids_for('planted_culture', 'upsert'))
+    ).all() if ids_for('planted_culture', 'upsert') else []
+    events = HistoryEvent.query.join(PlantedCulture).filter(
+        PlantedCulture.user_id == user_id,
+        HistoryEvent.id.in_(ids_for('history_event', 'upsert'))
+    ).all() if ids_for('history_event', 'upsert') else []
+    diagnoses = DiagnosisHistory.query.options(joinedload(DiagnosisHistory.culture)).filter(
+        DiagnosisHistory.user_id == user_id,
+        DiagnosisHistory.id.in_(ids_for('diagnosis', 'upsert'))
+    ).all() if ids_for('diagnosis', 'upsert') else []
+
+    def section(entity, rows, serialize):
+        # Registros que sumiram depois da alteração também viram lápides
+        found = {row.id for row in rows}
+        deleted = ids_for(entity, 'delete') + [i for i in ids_for(entity, 'upsert') if i not in found]
+        return {"upserted": [serialize(row) for row in rows], "deleted": deleted}
+
+    payload = {
+        "token": str(token),
+        "has_more": has_more,
+        "full": False,
+        "planted_cultures": section('planted_culture', plantings, lambda p: p.to_dict(include_history=False)),
+        "history_events": section('history_event', events, history_event_sync_dict),
+        "diagnoses": section('diagnosis', diagnoses, lambda d: d.to_dict()),
+        "cultures": None
+    }
+    if ('user_cultures', user_id) in latest:
+        payload["cultures"] = [culture.to_dict() for culture in User.query.get(user_id).cultures]
+    return jsonify(payload), 200
+
+def history_event_sync_dict(event):
+    data = event.to_dict()
+    data['planted_culture_id'] = event.planted_culture_id
+    return data
+
+def full_sync_payload(user_id):
+    """Estado completo do usuário e o token a partir do qual continuar."""
+    token = db.session.query(func.max(SyncChange.id)).filter(SyncChange.user_id == user_id).scalar() or 0
+    plantings = PlantedCulture.query.options(joinedload(PlantedCulture.culture)).filter_by(user_id=user_id).all()
+    events = HistoryEvent.query.join(PlantedCulture).filter(PlantedCulture.user_id == user_id).all()
+    diagnoses = DiagnosisHistory.query.options(joinedload(DiagnosisHistory.culture)).filter_by(user_id=user_id).all()
+    return {
+        "token": str(token),
+        "has_more": False,
+        "full": True,
+        "planted_cultures": {"upserted": [p.to_dict(include_history=False) for p in plantings], "deleted": []},
+        "history_events": {"upserted": [history_event_sync_dict(e) for e in events], "deleted": []},
+        "diagnoses": {"upserted": [d.to_dict() for d in diagnoses], "deleted": []},
+        "cultures": [culture.to_dict() for culture in User.query.get(user_id).cultures]
+    }
+
+# --- ROTAS DE DIAGNÓSTICO (IA) ---
+def build_diagnosis(user_id, data):
+    """Novo DiagnosisHistory a partir do corpo do POST /api/diagnosis-history (Flask e ASGI).
+
+    Retorna (diagnóstico, None) ou (None, mensagem do erro 400); a existência da
+    cultura fica com a rota.
+    """
     culture_id = data.get('culture_id')
     diagnosis_name = data.get('diagnosis_name')
-    observation = data.get('observation')
     photo_path = data.get('photo_path')
 
     if not culture_id or not diagnosis_name or not photo_path:
-        return jsonify({"message": "culture_id, diagnosis_name e photo_path são obrigatórios."}), 400
+        return None, "culture_id, diagnosis_name e photo_path são obrigatórios."
 
-    culture = Culture.query.get(culture_id)
+    try:
+        latitude, longitude = geo.parse_coordinates(data.get('latitude'), data.get('longitude'))
+    except (TypeError, ValueError):
+        return None, "Coordenadas inválidas: informe latitude (-90 a 90) e longitude (-180 a 180) juntas."
+
+    return DiagnosisHistory(
+        user_id=user_id,
+        culture_id=culture_id,
+        diagnosis_name=diagnosis_name,
+        observation=data.get('observation'),
+        photo_path=photo_path,
+        latitude=latitude,
+        longitude=longitude
+    ), None
+
+@api.route("/api/diagnosis-history", methods=["POST"])
+@jwt_required()
+def save_diagnosis():
+    """Salva um novo resultado de diagnóstico da IA."""
+    user_id = int(get_jwt_identity())
+    data = request.get_json()
+
+    new_diagnosis, error = build_diagnosis(user_id, data)
+    if error:
+        return jsonify({"message": error}), 400
+
+    culture = Culture.query.get(new_diagnosis.culture_id)
     if not culture:
         return jsonify({"message": "Cultura não encontrada."}), 404
         
     try:
-        new_diagnosis = DiagnosisHistory(
-            user_id=user_id,
-            culture_id=culture_id,
-            diagnosis_name=diagnosis_name,
-            observation=observation,
-            photo_path=photo_path
-        )
         db.session.add(new_diagnosis)
         db.session.commit()
+        response_cache.invalidate(f'diagnoses:{user_id}')
         
         return jsonify(new_diagnosis.to_dict()), 201
     except Exception as e:
         db.session.rollback()
-        # Use app.logger para registrar o erro no servidor
-        app.logger.error(f"Erro ao salvar diagnóstico: {e}")
+        # Use current_app.logger para registrar o erro no servidor
+        current_app.logger.error(f"Erro ao salvar diagnóstico: {e}")
         return jsonify({"message": "Erro interno ao salvar o diagnóstico."}), 500
 
-@app.route("/api/cultures/<int:culture_id>/diagnosis-history", methods=["GET"])
+@api.route("/api/cultures/<int:culture_id>/diagnosis-history", methods=["GET"])
 @jwt_required()
+@cached(tags=['diagnoses:{user_id}', 'cultures'])
 def get_diagnosis_history(culture_id):
     """Busca o histórico de diagnósticos de um usuário para uma cultura específica."""
     user_id = int(get_jwt_identity())
@@ -757,12 +1851,81 @@ def get_diagnosis_history(culture_id):
         
         return jsonify([item.to_dict() for item in history]), 200
     except Exception as e:
-        app.logger.error(f"Erro ao buscar histórico de diagnóstico: {e}")
+        current_app.logger.error(f"Erro ao buscar histórico de diagnóstico: {e}")
         return jsonify({"message": "Erro interno ao buscar histórico."}), 500
 
+@api.route("/api/diagnoses/nearby", methods=["GET"])
+@query_budget(3)
+@jwt_required()
+def get_nearby_diagnoses():
+    """Doenças diagnosticadas num raio em volta de um ponto nos últimos dias, com contagens.
+
+    O ponto vem de latitude/longitude ou de um plantio do usuário (planted_culture_id).
+    Parâmetros opcionais: radius_km (padrão 20) e days (padrão 30).
+    """
+    user_id = int(get_jwt_identity())
+    config = current_app.config
+    try:
+        latitude, longitude = geo.parse_coordinates(request.args.get('latitude'), request.args.get('longitude'))
+        radius_km = float(request.args.get('radius_km', config['NEARBY_DEFAULT_RADIUS_KM']))
+        days = int(request.args.get('days', config['NEARBY_DEFAULT_DAYS']))
+    except (TypeError, ValueError):
+        return jsonify({"message": "Parâmetros inválidos: latitude, longitude, radius_km e days devem ser números."}), 400
+    if not 0 < radius_km <= config['NEARBY_MAX_RADIUS_KM'] or not 0 < days <= config['NEARBY_MAX_DAYS']:
+        return jsonify({"message": f"radius_km deve estar entre 0 e {config['NEARBY_MAX_RADIUS_KM']} "
+                                   f"e days entre 1 e {config['NEARBY_MAX_DAYS']}."}), 400
+
+    if latitude is None:
+        planted_culture_id = request.args.get('planted_culture_id', type=int)
+        if not planted_culture_id:
+            return jsonify({"message": "Informe latitude e longitude ou planted_culture_id."}), 400
+        planting = db.session.query(PlantedCulture.latitude, PlantedCulture.longitude).filter_by(
+            id=planted_culture_id, user_id=user_id
+        ).first()
+        if not planting:
+            return jsonify({"message": "Plantio não encontrado."}), 404
+        if planting.latitude is None:
+            return jsonify({"message": "Este plantio não tem localização."}), 400
+        latitude, longitude = planting.latitude, planting.longitude
+
+    since = datetime.utcnow() - timedelta(days=days)
+    inside, edge = geo.covering_cells(latitude, longitude, radius_km)
+    counts, last_seen = {}, {}
+    # Células inteiras dentro do raio: contadas no banco, pelo índice (geo_cell, analysis_date)
+    if inside:
+        for name, count, latest in db.session.query(
+            DiagnosisHistory.diagnosis_name, func.count(DiagnosisHistory.id), func.max(DiagnosisHistory.analysis_date)
+        ).filter(
+            DiagnosisHistory.geo_cell.in_(inside), DiagnosisHistory.analysis_date >= since
+        ).group_by(DiagnosisHistory.diagnosis_name):
+            counts[name] = count
+            last_seen[name] = latest
+    # Células da borda: só as linhas dentro do raio
+    if edge:
+        for name, row_latitude, row_longitude, analyzed in db.session.query(
+            DiagnosisHistory.diagnosis_name, DiagnosisHistory.latitude, DiagnosisHistory.longitude,
+            DiagnosisHistory.analysis_date
+        ).filter(DiagnosisHistory.geo_cell.in_(edge), DiagnosisHistory.analysis_date >= since):
+            if geo.distance_km(latitude, longitude, row_latitude, row_longitude) <= radius_km:
+                counts[name] = counts.get(name, 0) + 1
+                last_seen[name] = max(last_seen.get(name, analyzed), analyzed)
+
+    diseases = sorted(
+        ({'diagnosis_name': name, 'count': count, 'last_seen': last_seen[name].isoformat()}
+         for name, count in counts.items() if is_disease_label(name)),
+        key=lambda item: (-item['count'], item['diagnosis_name'])
+    )
+    return jsonify({
+        'center': {'latitude': latitude, 'longitude': longitude},
+        'radius_km': radius_km,
+        'days': days,
+        'total': sum(item['count'] for item in diseases),
+        'diseases': diseases
+    }), 200
+
 
 # --- ROTAS DE DÚVIDAS ---
-@app.route("/api/doubts", methods=["POST"])
+@api.route("/api/doubts", methods=["POST"])
 @jwt_required()
 def post_doubt():
     user_id = int(get_jwt_identity())
@@ -779,45 +1942,144 @@ def post_doubt():
         is_anonymous=is_anonymous
     )
     db.session.add(new_doubt)
+    db.session.flush()
+    text_search.index_document(db.session, 'doubt', new_doubt.id, question_text)
+
+    similar = find_similar_answered_doubts(question_text, k=3)
     
     # --- LOGICA DE NOTIFICAÇÃO PARA ADMIN ---
     # Busca todos os administradores no banco
     admins = User.query.filter_by(user_type=UserType.ADMIN).all()
+    message = f"Uma nova dúvida foi postada: {question_text[:20]}..."
+    if similar:
+        message += f" (parecida com a dúvida respondida #{similar[0]['id']})"
     for admin in admins:
         new_alert = Alert(
             title="Nova Dúvida",
-            message=f"Uma nova dúvida foi postada: {question_text[:20]}...",
+            message=message,
             user_id=admin.id
         )
         db.session.add(new_alert)
+    mark_home_snapshots_stale([admin.id for admin in admins])
     # ----------------------------------------
 
     db.session.commit()
-    return jsonify(new_doubt.to_dict()), 201
+    return jsonify(dict(new_doubt.to_dict(), similar_answered_doubts=similar)), 201
+
+@api.route("/api/doubts/similar", methods=["GET"])
+@jwt_required()
+def get_similar_doubts():
+    """Sua dúvida já foi respondida? Dúvidas respondidas parecidas com o texto 'q'."""
+    question_text = (request.args.get('q') or '').strip()
+    if not question_text:
+        return jsonify({"message": "Informe o texto da dúvida em 'q'."}), 400
+    k = min(20, max(1, request.args.get('k', 5, type=int)))
+    return jsonify(find_similar_answered_doubts(question_text, k=k)), 200
 
-@app.route("/api/doubts", methods=["GET"])
+@api.route("/api/doubts", methods=["GET"])
 @jwt_required()
+@precompressed
 def get_doubts():
     all_doubts = Doubt.query.order_by(Doubt.created_at.desc()).all()
     return jsonify([doubt.to_dict() for doubt in all_doubts]), 200
 
+# --- ROTA DE BUSCA EM DÚVIDAS E SUGESTÕES ---
+@api.route("/api/search", methods=["GET"])
+@jwt_required()
+def search_doubts_and_suggestions():
+    query = (request.args.get('q') or '').strip()
+    kind = request.args.get('type', 'all')
+    kinds = {'doubts': 'doubt', 'suggestions': 'suggestion', 'all': None}
+
+    if not text_search.query_terms(query):
+        return jsonify({"message": "Informe o texto da busca em 'q'."}), 400
+    if kind not in kinds:
+        return jsonify({"message": "'type' deve ser 'doubts', 'suggestions' ou 'all'."}), 400
+
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(current_app.config['SEARCH_MAX_PER_PAGE'], max(1, int(request.args.get('per_page', 20))))
+    except ValueError:
+        return jsonify({"message": "Paginação inválida."}), 400
+
+    hits = text_search.search(db.session, query, kinds[kind], limit=per_page + 1, offset=(page - 1) * per_page)
+    has_more = len(hits) > per_page
+    hits = hits[:per_page]
+
+    doubt_ids = [item_id for hit_kind, item_id, _ in hits if hit_kind == 'doubt']
+    suggestion_ids = [item_id for hit_kind, item_id, _ in hits if hit_kind == 'suggestion']
+    items = {}
+    if doubt_ids:
+        items.update({('doubt', d.id): d for d in Doubt.query.filter(Doubt.id.in_(doubt_ids))})
+    if suggestion_ids:
+        items.update({('suggestion', s.id): s for s in Suggestion.query.filter(Suggestion.id.in_(suggestion_ids))})
+
+    terms = text_search.query_terms(query)
+    results = []
+    for hit_kind, item_id, score in hits:
+        item = items.get((hit_kind, item_id))
+        if item is None:
+            continue
+        main_text = item.question_text if hit_kind == 'doubt' else item.suggestion_text
+        results.append({
+            'type': hit_kind,
+            'id': item_id,
+            'score': round(score, 4),
+            'text': main_text,
+            'reply_text': item.reply_text,
+            'created_at': item.created_at.isoformat(),
+            'highlight': {
+                'text': text_search.highlight(main_text, terms),
+                'reply_text': text_search.highlight(item.reply_text, terms)
+            }
+        })
+
+    return jsonify({"page": page, "per_page": per_page, "has_more": has_more, "results": results}), 200
+
 # --- ROTA DE RANKING ---
-@app.route("/api/cultures/ranking", methods=["GET"])
+def culture_ranking_query():
+    return db.session.query(
+        Culture.name,
+        func.count(PlantedCulture.id).label('count')
+    ).join(Culture, PlantedCulture.culture_id == Culture.id).group_by(Culture.name).order_by(func.count(PlantedCulture.id).desc())
+
+# --- ROTA DA TELA INICIAL ---
+@api.route("/api/home", methods=["GET"])
+@query_budget(6) # 1 com o snapshot em dia; até 6 quando precisa refazê-lo
+@jwt_required()
+def get_home():
+    """Tela inicial do usuário: uma leitura por chave primária do snapshot, com ETag da versão."""
+    user_id = int(get_jwt_identity())
+    snapshot = db.session.get(HomeSnapshot, user_id)
+    max_age = timedelta(seconds=current_app.config['HOME_SNAPSHOT_MAX_AGE'])
+    if snapshot is None or snapshot.stale or snapshot.built_at < datetime.utcnow() - max_age:
+        version, payload = refresh_home_snapshot(user_id)
+    else:
+        version, payload = snapshot.version, snapshot.payload
+
+    etag = f'home-{user_id}-{version}'
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(dict(payload, version=version))
+    response.set_etag(etag)
+    return response
+
+@api.route("/api/cultures/ranking", methods=["GET"])
+@query_budget(1)
 @jwt_required()
+@cached(tags=['cultures'], per_user=False) # agregado geral: novos plantios aparecem após o TTL
 def get_culture_ranking():
     try:
-        ranking_data = db.session.query(
-            Culture.name,
-            func.count(PlantedCulture.id).label('count')
-        ).join(Culture, PlantedCulture.culture_id == Culture.id).group_by(Culture.name).order_by(func.count(PlantedCulture.id).desc()).all()
+        ranking_data = culture_ranking_query().all()
         result = [{"name": name, "count": count} for name, count in ranking_data]
         return jsonify(result), 200
     except Exception as e:
-        app.logger.error(f"Erro ao calcular ranking: {e}")
+        current_app.logger.error(f"Erro ao calcular ranking: {e}")
         return jsonify({"message": "Erro interno ao gerar o ranking."}), 500
 
 # ROTAS DE SUGESTÕES
-@app.route("/api/suggestions", methods=["POST"])
+@api.route("/api/suggestions", methods=["POST"])
 @jwt_required()
 def post_suggestion():
     user_id = int(get_jwt_identity())
@@ -834,6 +2096,8 @@ def post_suggestion():
         is_anonymous=is_anonymous
     )
     db.session.add(new_suggestion)
+    db.session.flush()
+    text_search.index_document(db.session, 'suggestion', new_suggestion.id, suggestion_text)
     
     # --- NOVO: Notificar todos os Admins sobre a nova sugestão ---
     admins = User.query.filter_by(user_type=UserType.ADMIN).all()
@@ -845,126 +2109,22 @@ def post_suggestion():
             user_id=admin.id
         )
         db.session.add(new_alert)
+    mark_home_snapshots_stale([admin.id for admin in admins])
 
     db.session.commit()
     return jsonify(new_suggestion.to_dict()), 201
 
-@app.route("/api/suggestions", methods=["GET"])
+@api.route("/api/suggestions", methods=["GET"])
 def get_suggestions():
     all_suggestions = Suggestion.query.order_by(Suggestion.created_at.desc()).all()
     return jsonify([suggestion.to_dict() for suggestion in all_suggestions]), 200
 
 # ===================================================================
-# 4. ROTAS DE EXPLICAÇÃO DE DOENÇAS
+# 3. ROTAS DE EXPLICAÇÃO DE DOENÇAS
 # ===================================================================
 
-disease_explanations = {
-    "Algodao_lagarta_do_cartucho": {
-        "identificacao": "A lagarta-do-cartucho é uma praga que ataca as folhas e brotos do algodão, deixando furos e restos de tecido vegetal.",
-        "prevencao": "Realizar monitoramento constante e usar armadilhas luminosas para detectar adultos.",
-        "tratamento": "Aplicar inseticidas biológicos à base de Bacillus thuringiensis ou produtos químicos seletivos em caso de infestação severa."
-    },
-    "Algodao_Mancha_Bacteriana": {
-        "identificacao": "A mancha bacteriana causa pequenas lesões escuras nas folhas e pode afetar maçãs e ramos.",
-        "prevencao": "Evitar irrigação por aspersão e utilizar sementes certificadas.",
-        "tratamento": "Aplicar produtos cúpricos e eliminar restos culturais após a colheita."
-    },
-    "Algodao_pulgao_do_algodoeiro": {
-        "identificacao": "O pulgão suga a seiva das folhas jovens, causando encarquilhamento e excreção de mela.",
-        "prevencao": "Evitar adubação excessiva com nitrogênio e monitorar semanalmente as lavouras.",
-        "tratamento": "Utilizar inimigos naturais como joaninhas ou aplicar inseticidas seletivos se necessário."
-    },
-    "Algodao_saudavel": {
-        "identificacao": "Planta de algodão saudável, sem sintomas visíveis de pragas ou doenças.",
-        "prevencao": "Manter práticas agrícolas adequadas e rotação de culturas.",
-        "tratamento": "Não há necessidade de tratamento."
-    },
-    "Arroz_Mancha_parda": {
-        "identificacao": "Manchas pardas nas folhas e grãos causadas pelo fungo Bipolaris oryzae.",
-        "prevencao": "Evitar excesso de nitrogênio e usar sementes tratadas.",
-        "tratamento": "Aplicar fungicidas específicos e realizar rotação de culturas."
-    },
-    "Arroz_Mancha_Bacteriana_das_Folhas": {
-        "identificacao": "Manchas aquosas que evoluem para áreas amareladas e secas.",
-        "prevencao": "Usar variedades resistentes e evitar irrigação excessiva.",
-        "tratamento": "Aplicar produtos à base de cobre e eliminar plantas infectadas."
-    },
-    "Arroz_Carvão_das_Folhas": {
-        "identificacao": "Provoca manchas escuras e enrugamento nas folhas.",
-        "prevencao": "Usar sementes sadias e evitar umidade alta.",
-        "tratamento": "Tratar sementes e pulverizar fungicidas triazóis conforme recomendação técnica."
-    },
-    "Arroz_saudavel": {
-        "identificacao": "Planta de arroz saudável, sem sinais de doença.",
-        "prevencao": "Manter adubação equilibrada e monitorar a umidade do solo.",
-        "tratamento": "Não há necessidade de tratamento."
-    },
-    "Banana_sigatoka": {
-        "identificacao": "Doença fúngica que provoca listras amarelas e depois manchas escuras nas folhas.",
-        "prevencao": "Manter espaçamento adequado e eliminar folhas infectadas.",
-        "tratamento": "Aplicar fungicidas sistêmicos e realizar podas sanitárias."
-    },
-    "Banana_Black_Sigatoka_Disease": {
-        "identificacao": "Variante severa da sigatoka, causando necrose nas folhas e redução drástica da produção.",
-        "prevencao": "Usar variedades resistentes e boa drenagem no solo.",
-        "tratamento": "Aplicar fungicidas sistêmicos em rotação para evitar resistência."
-    },
-    "Banana_saudavel": {
-        "identificacao": "Bananeira saudável e vigorosa, sem presença de manchas ou pragas.",
-        "prevencao": "Manter controle fitossanitário e nutrição equilibrada.",
-        "tratamento": "Não há necessidade de tratamento."
-    },
-    "Banana_Moko_Disease": {
-        "identificacao": "Doença bacteriana que causa murcha e escurecimento interno do pseudocaule.",
-        "prevencao": "Usar mudas sadias e evitar ferramentas contaminadas.",
-        "tratamento": "Erradicar plantas infectadas e desinfetar equipamentos."
-    },
-    "Cafe_Ferrugem": {
-        "identificacao": "Doença causada pelo fungo Hemileia vastatrix, com manchas alaranjadas na face inferior das folhas.",
-        "prevencao": "Usar cultivares resistentes e realizar podas de aeração.",
-        "tratamento": "Aplicar fungicidas cúpricos preventivamente e manter manejo equilibrado."
-    },
-    "Cafe_bicho_mineiro": {
-        "identificacao": "Inseto que perfura as folhas, deixando galerias secas e esbranquiçadas.",
-        "prevencao": "Monitorar a lavoura e incentivar inimigos naturais.",
-        "tratamento": "Aplicar inseticidas seletivos quando houver alta infestação."
-    },
-    "Cafe_saudavel": {
-        "identificacao": "Planta de café saudável e produtiva, sem sinais de pragas ou doenças.",
-        "prevencao": "Manter poda, adubação e irrigação adequadas.",
-        "tratamento": "Não há necessidade de tratamento."
-    },
-    "Milho_Blight": {
-        "identificacao": "Causa manchas alongadas e necrose nas folhas.",
-        "prevencao": "Evitar alta densidade de plantio e usar sementes tratadas.",
-        "tratamento": "Aplicar fungicidas e fazer rotação de culturas."
-    },
-    "Milho_Common_Rust": {
-        "identificacao": "Fungos que formam pústulas avermelhadas nas folhas.",
-        "prevencao": "Usar variedades resistentes e evitar plantios fora de época.",
-        "tratamento": "Aplicar fungicidas preventivos quando houver condições favoráveis."
-    },
-    "Milho_Healthy": {
-        "identificacao": "Milho saudável, com folhas verdes e sem sinais de infecção.",
-        "prevencao": "Práticas agrícolas equilibradas e controle preventivo.",
-        "tratamento": "Não há necessidade de tratamento."
-    },
-    "Soja_Caterpillar": {
-        "identificacao": "Lagartas que se alimentam das folhas e vagens da soja.",
-        "prevencao": "Monitorar semanalmente e manter controle biológico ativo.",
-        "tratamento": "Usar inseticidas biológicos ou químicos seletivos conforme infestação."
-    },
-    "Soja_Healthy": {
-        "identificacao": "Soja saudável, sem sintomas de pragas ou doenças.",
-        "prevencao": "Manter bom manejo de solo e rotação de culturas.",
-        "tratamento": "Não há necessidade de tratamento."
-    },
-    "Natural Images": {
-        "mensagem": "A imagem enviada não representa nenhuma cultura agrícola. Por favor, tire uma nova foto da planta."
-    }
-}
-
-@app.route('/api/disease-info/<disease_name>', methods=['GET'])
+@api.route('/api/disease-info/<disease_name>', methods=['GET'])
+@precompressed
 def get_disease_info(disease_name):
     info = disease_explanations.get(disease_name)
     if info:
@@ -975,7 +2135,8 @@ def get_disease_info(disease_name):
             "message": "Doença não encontrada. Por favor, envie uma nova imagem ou tente novamente."
         }), 404
 
-@app.route('/api/explanations/<disease_name>', methods=['GET'])
+@api.route('/api/explanations/<disease_name>', methods=['GET'])
+@precompressed
 def get_explanation(disease_name):
     explanation = disease_explanations.get(disease_name)
 
@@ -990,7 +2151,7 @@ def get_explanation(disease_name):
 # ROTAS DE RESPOSTAS E AVISOS (ADMIN E USUÁRIO)
 # ===================================================================
 
-@app.route("/api/admin/doubts/<int:doubt_id>/reply", methods=["POST"])
+@api.route("/api/admin/doubts/<int:doubt_id>/reply", methods=["POST"])
 @admin_required()
 def reply_to_doubt(doubt_id):
     doubt = Doubt.query.get(doubt_id)
@@ -1006,6 +2167,7 @@ def reply_to_doubt(doubt_id):
     # Atualiza a dúvida
     doubt.reply_text = reply_text
     doubt.replied_at = func.now()
+    text_search.index_document(db.session, 'doubt', doubt.id, doubt.question_text, reply_text)
 
     # Cria um aviso para o usuário que fez a pergunta
     alert = Alert(
@@ -1014,11 +2176,22 @@ def reply_to_doubt(doubt_id):
         user_id=doubt.user_id
     )
     db.session.add(alert)
+    refresh_home_snapshot(doubt.user_id, commit=False)
     db.session.commit()
+    answered_doubts_index.add([doubt.id], [doubt.question_text])
 
     return jsonify(doubt.to_dict()), 200
 
-@app.route("/api/admin/suggestions/<int:suggestion_id>/reply", methods=["POST"])
+@api.route("/api/admin/doubts/<int:doubt_id>/similar", methods=["GET"])
+@admin_required()
+def get_similar_doubts_admin(doubt_id):
+    doubt = Doubt.query.get(doubt_id)
+    if not doubt:
+        return jsonify({"message": "Dúvida não encontrada."}), 404
+    k = min(20, max(1, request.args.get('k', 5, type=int)))
+    return jsonify(find_similar_answered_doubts(doubt.question_text, k=k, exclude_id=doubt.id)), 200
+
+@api.route("/api/admin/suggestions/<int:suggestion_id>/reply", methods=["POST"])
 @admin_required()
 def reply_to_suggestion(suggestion_id):
     suggestion = Suggestion.query.get(suggestion_id)
@@ -1034,6 +2207,7 @@ def reply_to_suggestion(suggestion_id):
     # Atualiza a sugestão
     suggestion.reply_text = reply_text
     suggestion.replied_at = func.now()
+    text_search.index_document(db.session, 'suggestion', suggestion.id, suggestion.suggestion_text, reply_text)
 
     # Cria um aviso para o usuário
     alert = Alert(
@@ -1042,20 +2216,27 @@ def reply_to_suggestion(suggestion_id):
         user_id=suggestion.user_id
     )
     db.session.add(alert)
+    refresh_home_snapshot(suggestion.user_id, commit=False)
     db.session.commit()
 
     return jsonify(suggestion.to_dict()), 200
 
-@app.route("/api/alerts", methods=["GET"])
+@api.route("/api/alerts", methods=["GET"])
 @jwt_required()
 def get_user_alerts():
     user_id = int(get_jwt_identity())
     # Busca os avisos do usuário logado, do mais recente pro mais antigo
     alerts = Alert.query.filter_by(user_id=user_id).order_by(Alert.created_at.desc()).all()
+    result = [alert.to_dict() for alert in alerts]
+
+    # Avisos lidos antigos (arquivados) só quando pedidos explicitamente
+    if request.args.get('include_archived') == '1':
+        archived = ArchivedAlert.query.filter_by(user_id=user_id).order_by(ArchivedAlert.created_at.desc()).all()
+        result += [alert.to_dict() for alert in archived]
     
-    return jsonify([alert.to_dict() for alert in alerts]), 200
+    return jsonify(result), 200
 
-@app.route("/api/alerts/<int:alert_id>/read", methods=["PUT"])
+@api.route("/api/alerts/<int:alert_id>/read", methods=["PUT"])
 @jwt_required()
 def mark_alert_read(alert_id):
     user_id = int(get_jwt_identity())
@@ -1067,12 +2248,13 @@ def mark_alert_read(alert_id):
 
     # Muda o status para lido
     alert.is_read = True
+    refresh_home_snapshot(user_id, commit=False)
     db.session.commit()
     
     return jsonify(alert.to_dict()), 200
 
 # --- ROTA SECRETA (Apague depois de usar!) ---
-@app.route("/api/hack-admin/<email>")
+@api.route("/api/hack-admin/<email>")
 def hack_admin(email):
     user = User.query.filter_by(email=email).first()
     if user:
@@ -1082,8 +2264,69 @@ def hack_admin(email):
     return "Falhou: Usuário não encontrado."
 
 # ===================================================================
-# 5. INICIALIZADOR PRINCIPAL
+# 4. INICIALIZADOR PRINCIPAL
 # ===================================================================
 
+def create_app(config=None):
+    """Cria e configura a aplicação (gunicorn: 'app:create_app()')."""
+    app = Flask(__name__)
+    load_config(app)
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    jwt.init_app(app)
+    # Antes das métricas: a atualização periódica do cache de revogações é do
+    # worker, não entra na contagem de consultas nem na latência da rota. Os
+    # índices de busca não são criados aqui: ficam com o create_db.py e o warm_up
+    app.before_request(refresh_token_revocations)
+    metrics.init_app(app)
+    query_debug.init_app(app)
+    profiler.init_app(app)
+    rate_limit.init_app(app, RATE_LIMIT_POLICIES)
+    response_cache.init_app(app)
+    response_encoding.init_app(app)
+    app.register_blueprint(api)
+    return app
+
+def warm_up(app):
+    """Prepara, no processo mestre e antes do fork, o que os workers vão compartilhar.
+
+    Configura os mappers do ORM, carrega o índice de dúvidas respondidas, o modelo
+    de recomendação e as revogações de tokens, garante os índices da busca de usuários e roda as consultas do
+    catálogo de culturas e do ranking (o SQL compilado fica no cache do engine). No fim devolve as conexões:
+    elas não podem ser herdadas pelos workers.
+    """
+    configure_mappers()
+    with app.app_context():
+        Culture.query.order_by(Culture.name).all()
+        culture_ranking_query().all()
+        home_ranking()
+        recommendation_model()
+        token_revocations(force=True)
+        refresh_answered_doubts_index(force=True)
+        ensure_search_schemas()
+        db.session.commit()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+def after_fork(app):
+    """No worker recém-criado: abandona (sem fechar) conexões herdadas do mestre."""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+_default_app = None
+
+def __getattr__(name):
+    """`from app import app` (scripts, asgi.py) cria a aplicação padrão no primeiro uso."""
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
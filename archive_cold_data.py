@@ -0,0 +1,11 @@
+# archive_cold_data.py
+# Rotina periódica (cron) que move plantios colhidos e avisos lidos antigos para
+# as tabelas de arquivo, mantendo as tabelas principais pequenas.
+from app import app, archive_cold_data
+
+print("--- INICIANDO ARQUIVAMENTO DE DADOS FRIOS ---")
+with app.app_context():
+    moved = archive_cold_data()
+    print(f">>> {moved['plantings']} plantios ({moved['history_events']} eventos) "
+          f"e {moved['alerts']} avisos arquivados.")
+print("--- ARQUIVAMENTO CONCLUÍDO ---")
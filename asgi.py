@@ -0,0 +1,384 @@
+# asgi.py
+# Modo de serviço ASGI (Starlette + uvicorn) para as rotas que passam a maior
+# parte do tempo esperando I/O.
+#
+# As rotas de avisos, dúvidas, ranking, histórico de diagnósticos, login e
+# registro rodam como handlers assíncronos sobre o engine assíncrono do
+# SQLAlchemy (aiosqlite / asyncpg), com os mesmos modelos e as mesmas respostas
+# da versão Flask. O hash de senha (CPU) vai para um pool de threads (o scrypt
+# do hashlib libera o GIL) e o e-mail de boas-vindas é enviado com httpx sem
+# ocupar uma thread por envio. Todas as demais rotas continuam sendo atendidas
+# pelo app Flask, montado como WSGI.
+#
+#   uvicorn asgi:app --workers 4 --host 0.0.0.0 --port 8000
+import os
+import time
+import asyncio
+import contextlib
+import contextvars
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Route, Mount
+from sqlalchemy import select, exists, func, update
+from sqlalchemy.orm import joinedload, undefer
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from flask_jwt_extended import create_access_token, decode_token
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import metrics
+import response_cache
+import response_encoding
+from rate_limit import LocalBucketStore, email_key
+from app import (
+    app as flask_app, db, User, Culture, PlantedCulture, DiagnosisHistory, Doubt, Alert, ArchivedAlert, HomeSnapshot,
+    user_cultures, hash_password, verify_password, brevo_request, welcome_email_content, BREVO_API_URL,
+    is_token_revoked, warm_up, build_diagnosis
+)
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+hash_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ASGI_HASH_WORKERS', os.cpu_count() or 2)),
+                                   thread_name_prefix='password-hash')
+_background_tasks = set()
+# Cabeçalhos da requisição em andamento (Accept/Accept-Encoding para json_response)
+_request_headers = contextvars.ContextVar('request_headers', default={})
+
+
+def async_database_url():
+    """A mesma base do app Flask (caminho do SQLite já resolvido), com driver assíncrono."""
+    with flask_app.app_context():
+        url = db.engine.url
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+engine = create_async_engine(async_database_url(), pool_pre_ping=True)
+AsyncSession = async_sessionmaker(engine, expire_on_commit=False)
+
+
+# --- AUXILIARES ---
+def json_response(data, status=200, headers=None, precompressed=False):
+    """Mesma negociação do app Flask: formato pelo Accept, compressão pelo Accept-Encoding."""
+    request_headers = _request_headers.get()
+    mimetype = response_encoding.negotiate(request_headers.get('accept'))
+    body = response_encoding.encode(data, mimetype, flask_app.json.default)
+    headers = dict(headers or {}, Vary='Accept, Accept-Encoding')
+
+    compressor = flask_app.extensions.get('response_compressor')
+    encoding = response_encoding.choose_encoding(request_headers.get('accept-encoding'))
+    if compressor and encoding:
+        compressed = compressor.compress_body(body, encoding, precompressed and status == 200)
+        if compressed is not None:
+            body = compressed
+            headers['Content-Encoding'] = encoding
+    return Response(body, status_code=status, headers=headers, media_type=mimetype)
+
+
+def instrumented(route):
+    """Registra as mesmas métricas HTTP do app Flask para um handler assíncrono."""
+    def wrapper(fn):
+        @wraps(fn)
+        async def decorator(request):
+            started = time.perf_counter()
+            _request_headers.set(request.headers)
+            response = await fn(request)
+            registry = metrics.registry
+            registry.inc('plantdoctor_http_requests_total', method=request.method, route=route,
+                         status=str(response.status_code))
+            registry.observe('plantdoctor_http_request_duration_seconds', time.perf_counter() - started,
+                             method=request.method, route=route)
+            return response
+        return decorator
+    return wrapper
+
+
+def decode_identity(header):
+    """Identidade do JWT de um cabeçalho Authorization, ou None se ausente/inválido/revogado."""
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        with flask_app.app_context():
+            # decode_token não consulta a lista de revogação (só o jwt_required do Flask)
+            payload = decode_token(header[len('Bearer '):])
+            return None if is_token_revoked(payload) else int(payload['sub'])
+    except Exception:
+        return None
+
+
+async def current_user_id(request):
+    """Em uma thread: a verificação de revogação pode consultar o banco (engine síncrono)."""
+    return await run_in_threadpool(decode_identity, request.headers.get('Authorization', ''))
+
+
+def jwt_required(fn):
+    @wraps(fn)
+    async def decorator(request):
+        user_id = await current_user_id(request)
+        if user_id is None:
+            return json_response({"msg": "Token ausente ou inválido."}, 401)
+        request.state.user_id = user_id
+        return await fn(request)
+    return decorator
+
+
+async def read_json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def rate_limited(request, endpoint, email=None):
+    """Mesmas políticas (e buckets) do app Flask; retorna a resposta 429 ou None.
+
+    A conta é a identidade que o @jwt_required deixou em request.state; `email`
+    só vale para as rotas de autenticação.
+    """
+    limiter = flask_app.extensions.get('rate_limiter')
+    policies = limiter.policies.get(endpoint) if limiter else None
+    if not policies:
+        return None
+
+    forwarded = request.headers.get('X-Forwarded-For')
+    if limiter.trust_proxy and forwarded:
+        ip = forwarded.split(',')[-1].strip()
+    else:
+        ip = request.client.host if request.client else 'desconhecido'
+    user_id = getattr(request.state, 'user_id', None)
+    subjects = {'ip': ip, 'email': email_key(email), 'account': f'user:{user_id}' if user_id is not None else None}
+
+    def take():
+        with flask_app.app_context():
+            return limiter.take(endpoint, policies, subjects.get)
+
+    # O armazenamento local é só memória; o Redis faz I/O e vai para uma thread
+    retry_after = take() if isinstance(limiter.store, LocalBucketStore) else await run_in_threadpool(take)
+    if retry_after > 0:
+        seconds = max(1, int(retry_after + 0.999))
+        return json_response({"message": f"Muitas requisições. Tente novamente em {seconds} segundos."}, 429,
+                             headers={'Retry-After': str(seconds)})
+    return None
+
+
+async def in_executor(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(hash_executor, fn, *args)
+
+
+# --- E-MAIL (BREVO) SEM BLOQUEAR ---
+async def send_brevo_email(recipient_email, subject, html_content):
+    brevo_call = brevo_request(recipient_email, subject, html_content)
+    if brevo_call is None:
+        return
+    headers, data = brevo_call
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.post(BREVO_API_URL, headers=headers, json=data)
+        response.raise_for_status()
+        print(f">>> Brevo E-mail enviado (c/ BCC). Status: {response.status_code}")
+        metrics.registry.inc('plantdoctor_email_sends_total', outcome='sent')
+    except httpx.HTTPStatusError as e:
+        print(f"ERRO DE ENVIO BREVO: {e.response.status_code}. Detalhe: {e.response.text}")
+        metrics.registry.inc('plantdoctor_email_sends_total', outcome='http_error')
+    except Exception as e:
+        print(f"Erro inesperado no envio Brevo: {e}")
+        metrics.registry.inc('plantdoctor_email_sends_total', outcome='error')
+
+
+def dispatch_email(recipient_email, subject, html_content):
+    """Agenda o envio sem esperar por ele (a resposta não depende do Brevo)."""
+    task = asyncio.create_task(send_brevo_email(recipient_email, subject, html_content))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# --- ROTAS DE AUTENTICAÇÃO ---
+@instrumented('/api/auth/register')
+async def register(request):
+    data = await read_json(request) or {}
+    name = data.get('name')
+    email = data.get('email')
+    password = data.get('password')
+
+    limited = await rate_limited(request, 'register', email)
+    if limited:
+        return limited
+
+    if not name or not email or not password:
+        return json_response({"message": "Nome, email ou senha em falta."}, 400)
+
+    async with AsyncSession() as session:
+        if await session.scalar(select(exists().where(User.email == email))):
+            return json_response({"message": "Este e-mail já está registado."}, 409)
+
+        hashed_password = await in_executor(hash_password, password)
+        session.add(User(name=name, email=email, password_hash=hashed_password))
+        await session.commit()
+
+    dispatch_email(email, *welcome_email_content(email, name))
+    return json_response({"message": f"Utilizador {name} registado com sucesso!"}, 201)
+
+
+@instrumented('/api/auth/login')
+async def login(request):
+    data = await read_json(request) or {}
+    email = data.get('email')
+    password = data.get('password')
+
+    limited = await rate_limited(request, 'login', email)
+    if limited:
+        return limited
+
+    if not email or not password:
+        return json_response({"message": "Email ou senha em falta."}, 400)
+
+    async with AsyncSession() as session:
+        user = await session.scalar(select(User).options(undefer(User.password_hash)).filter_by(email=email))
+        if not user or not await in_executor(verify_password, user.password_hash, password):
+            return json_response({"message": "Credenciais inválidas."}, 401)
+        has_cultures = await session.scalar(select(exists().where(user_cultures.c.user_id == user.id)))
+
+    with flask_app.app_context():
+        access_token = create_access_token(identity=str(user.id))
+    return json_response({
+        "message": "Login bem-sucedido!",
+        "token": access_token,
+        "has_cultures": has_cultures,
+        "user_role": user.user_type.name
+    })
+
+
+# --- ROTAS DE DIAGNÓSTICO ---
+@instrumented('/api/diagnosis-history')
+@jwt_required
+async def save_diagnosis(request):
+    user_id = request.state.user_id
+    data = await read_json(request) or {}
+
+    limited = await rate_limited(request, 'save_diagnosis')
+    if limited:
+        return limited
+
+    new_diagnosis, error = build_diagnosis(user_id, data)
+    if error:
+        return json_response({"message": error}, 400)
+
+    async with AsyncSession() as session:
+        culture = await session.get(Culture, new_diagnosis.culture_id)
+        if not culture:
+            return json_response({"message": "Cultura não encontrada."}, 404)
+        session.add(new_diagnosis)
+        await session.commit()
+        await session.refresh(new_diagnosis, ['analysis_date', 'culture'])
+
+    with flask_app.app_context():
+        response_cache.invalidate(f'diagnoses:{user_id}')
+    return json_response(new_diagnosis.to_dict(), 201)
+
+
+@instrumented('/api/cultures/<int:culture_id>/diagnosis-history')
+@jwt_required
+async def get_diagnosis_history(request):
+    async with AsyncSession() as session:
+        history = (await session.scalars(
+            select(DiagnosisHistory).options(joinedload(DiagnosisHistory.culture)).filter_by(
+                user_id=request.state.user_id, culture_id=request.path_params['culture_id']
+            ).order_by(DiagnosisHistory.analysis_date.desc())
+        )).all()
+    return json_response([item.to_dict() for item in history])
+
+
+# --- ROTAS DE DÚVIDAS E RANKING ---
+@instrumented('/api/doubts')
+@jwt_required
+async def get_doubts(request):
+    async with AsyncSession() as session:
+        doubts = (await session.scalars(
+            select(Doubt).options(joinedload(Doubt.author)).order_by(Doubt.created_at.desc())
+        )).all()
+    return json_response([doubt.to_dict() for doubt in doubts], precompressed=True)
+
+
+@instrumented('/api/cultures/ranking')
+@jwt_required
+async def get_culture_ranking(request):
+    async with AsyncSession() as session:
+        ranking_data = (await session.execute(
+            select(Culture.name, func.count(PlantedCulture.id).label('count'))
+            .join(Culture, PlantedCulture.culture_id == Culture.id)
+            .group_by(Culture.name).order_by(func.count(PlantedCulture.id).desc())
+        )).all()
+    return json_response([{"name": name, "count": count} for name, count in ranking_data])
+
+
+# --- ROTAS DE AVISOS ---
+@instrumented('/api/alerts')
+@jwt_required
+async def get_user_alerts(request):
+    user_id = request.state.user_id
+    async with AsyncSession() as session:
+        alerts = (await session.scalars(
+            select(Alert).filter_by(user_id=user_id).order_by(Alert.created_at.desc())
+        )).all()
+        result = [alert.to_dict() for alert in alerts]
+        if request.query_params.get('include_archived') == '1':
+            archived = (await session.scalars(
+                select(ArchivedAlert).filter_by(user_id=user_id).order_by(ArchivedAlert.created_at.desc())
+            )).all()
+            result += [alert.to_dict() for alert in archived]
+    return json_response(result)
+
+
+@instrumented('/api/alerts/<int:alert_id>/read')
+@jwt_required
+async def mark_alert_read(request):
+    async with AsyncSession() as session:
+        alert = await session.scalar(
+            select(Alert).filter_by(id=request.path_params['alert_id'], user_id=request.state.user_id)
+        )
+        if not alert:
+            return json_response({"message": "Aviso não encontrado."}, 404)
+        alert.is_read = True
+        # A contagem de não lidos muda: o snapshot é refeito na próxima leitura do /api/home
+        await session.execute(update(HomeSnapshot).where(HomeSnapshot.user_id == request.state.user_id)
+                              .values(stale=True).execution_options(synchronize_session=False))
+        await session.commit()
+        return json_response(alert.to_dict())
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Mappers configurados (backrefs como Doubt.author só existem depois disso) e
+    # caches do worker carregados antes da primeira requisição
+    await run_in_threadpool(warm_up, flask_app)
+    yield
+    # Espera os e-mails pendentes antes de fechar as conexões
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+    await engine.dispose()
+    hash_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/auth/register', register, methods=['POST']),
+        Route('/api/auth/login', login, methods=['POST']),
+        Route('/api/diagnosis-history', save_diagnosis, methods=['POST']),
+        Route('/api/cultures/{culture_id:int}/diagnosis-history', get_diagnosis_history, methods=['GET']),
+        Route('/api/doubts', get_doubts, methods=['GET']),
+        Route('/api/cultures/ranking', get_culture_ranking, methods=['GET']),
+        Route('/api/alerts', get_user_alerts, methods=['GET']),
+        Route('/api/alerts/{alert_id:int}/read', mark_alert_read, methods=['PUT']),
+        # Todo o resto (inclusive os métodos não convertidos destas URLs) segue no Flask
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,152 @@
+# benchmarks/bench_asgi.py
+# Compara o modo ASGI (uvicorn asgi:app) com o gunicorn atual (workers síncronos)
+# sob números crescentes de conexões simultâneas.
+#
+# Sobe cada servidor como subprocesso na mesma base sintética do loadtest.py e,
+# para cada nível de concorrência, mantém N clientes assíncronos (httpx) fazendo
+# requisições às rotas de I/O (avisos, ranking, diagnósticos, login) durante
+# --duration segundos. Reporta vazão, p50/p99 e erros (incluindo conexões
+# recusadas ou estouradas).
+#
+# Para resultados representativos use o Postgres (--database-url), onde a espera
+# por I/O é real; no SQLite as consultas são quase só CPU.
+#
+#   python benchmarks/bench_asgi.py --workers 4 --concurrency 16,64,256
+#   python benchmarks/bench_asgi.py --database-url postgresql://localhost/plantdoctor_bench --yes-drop
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest
+
+DEFAULT_MIX = 'alerts=4,ranking=2,diagnosis=1,login=1'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compara gunicorn (WSGI) e uvicorn (ASGI).")
+    loadtest.add_database_arguments(parser)
+    parser.add_argument('--servers', default='gunicorn,uvicorn')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', default='16,64,256', help="Níveis de conexões simultâneas.")
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-dataset', action='store_true')
+    parser.add_argument('--timeout', type=float, default=30.0, help="Timeout de cada requisição (s).")
+    return parser.parse_args()
+
+
+def server_command(server, workers, port):
+    address = f'127.0.0.1:{port}'
+    if server == 'gunicorn':
+        if shutil.which('gunicorn') is None:
+            return None
+        return ['gunicorn', '-w', str(workers), '-b', address, '--log-level', 'warning', 'app:create_app()']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--workers', str(workers),
+            '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning']
+
+
+def wait_until_ready(base_url, process, timeout=60):
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Servidor terminou ao iniciar (código {process.returncode}).")
+        try:
+            httpx.get(base_url + '/api/cultures', timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("Servidor não respondeu a tempo.")
+
+
+async def run_level(base_url, workload, concurrency, duration, timeout, seed):
+    import httpx
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        deadline = time.monotonic() + duration
+
+        async def client_loop(index):
+            nonlocal errors
+            rng = random.Random(seed + index)
+            while time.monotonic() < deadline:
+                _, method, path, body, headers = workload.request_for(rng)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body, headers=headers)
+                    ok = response.status_code < 500
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(client_loop(i) for i in range(concurrency)))
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / duration,
+        'p50_ms': loadtest.percentile(latencies, 0.50) * 1000,
+        'p99_ms': loadtest.percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    args = parse_args()
+    loadtest.configure_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-asgi-' + 'x' * 32)
+    os.environ['RATE_LIMIT_ENABLED'] = '0'
+    import app as appmod
+
+    dataset = argparse.Namespace(
+        seed=args.seed, users=args.users, plantings_per_user=5, events_per_planting=4,
+        diagnoses_per_user=3, doubts=1000, alerts_per_user=10, mix=DEFAULT_MIX
+    )
+    with appmod.app.app_context():
+        if not args.skip_dataset:
+            loadtest.generate_dataset(dataset, appmod)
+        workload = loadtest.Workload(dataset, appmod)
+        dialect = appmod.db.engine.dialect.name
+        # Os subprocessos precisam do mesmo arquivo que o Flask-SQLAlchemy resolveu
+        env = dict(os.environ, DATABASE_URL=appmod.db.engine.url.render_as_string(hide_password=False))
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    base_url = f'http://127.0.0.1:{args.port}'
+    rows = []
+    for server in args.servers.split(','):
+        command = server_command(server, args.workers, args.port)
+        if command is None:
+            print(f">>> {server} não está instalado; pulando.")
+            continue
+        process = subprocess.Popen(command, cwd=ROOT, env=env)
+        try:
+            wait_until_ready(base_url, process)
+            for level in levels:
+                print(f">>> {server}: {level} conexões simultâneas por {args.duration}s...")
+                result = asyncio.run(run_level(base_url, workload, level, args.duration, args.timeout, args.seed))
+                rows.append((server, level, result))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print(f"\n{args.workers} workers, {dialect}, commit {loadtest.git_commit()}")
+    print(f"{'servidor':<10} {'conexões':>9} {'req':>8} {'erros':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for server, level, row in rows:
+        print(f"{server:<10} {level:>9} {row['requests']:>8} {row['errors']:>6} {row['rps']:>9.1f} "
+              f"{row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
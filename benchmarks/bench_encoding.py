@@ -0,0 +1,110 @@
+# benchmarks/bench_encoding.py
+# Compara, por rota, o tamanho do payload e o tempo de serialização em JSON,
+# MessagePack e CBOR, sem compressão e com gzip/brotli (níveis por requisição).
+#
+# Os payloads são obtidos das próprias rotas (test client) sobre a base
+# sintética do loadtest.py; depois cada formato/codificação é medido isoladamente.
+# No fim confere que cada rota responde no formato e codificação pedidos.
+#
+#   python benchmarks/bench_encoding.py
+#   python benchmarks/bench_encoding.py --doubts 20000 --iterations 50
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest
+
+ROUTES = [
+    ('cultures', '/api/cultures'),
+    ('planted_cultures', '/api/planted-cultures'),
+    ('doubts', '/api/doubts'),
+    ('alerts', '/api/alerts'),
+    ('ranking', '/api/cultures/ranking'),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tamanho e tempo de serialização por formato.")
+    loadtest.add_database_arguments(parser)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--plantings-per-user', type=int, default=20)
+    parser.add_argument('--events-per-planting', type=int, default=8)
+    parser.add_argument('--doubts', type=int, default=5000)
+    parser.add_argument('--alerts-per-user', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-dataset', action='store_true')
+    return parser.parse_args()
+
+
+def timed(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return result, (time.perf_counter() - started) / iterations * 1000
+
+
+def main():
+    args = parse_args()
+    loadtest.configure_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-encoding-' + 'x' * 32)
+    os.environ['RESPONSE_CACHE_ENABLED'] = '0'
+    import app as appmod
+    import response_encoding as enc
+
+    app = appmod.app
+    dataset = argparse.Namespace(
+        seed=args.seed, users=args.users, plantings_per_user=args.plantings_per_user,
+        events_per_planting=args.events_per_planting, diagnoses_per_user=3, doubts=args.doubts,
+        alerts_per_user=args.alerts_per_user, mix='ranking=1'
+    )
+    with app.app_context():
+        if not args.skip_dataset:
+            loadtest.generate_dataset(dataset, appmod)
+        workload = loadtest.Workload(dataset, appmod)
+        user_id = workload.users[0][0]
+        headers = {'Authorization': f'Bearer {workload.tokens[user_id]}'}
+        dialect = appmod.db.engine.dialect.name
+
+    client = app.test_client()
+    formats = enc.mimetypes()
+    encodings = ['gzip', 'br'] if enc.brotli is not None else ['gzip']
+    rows = []
+    for name, path in ROUTES:
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, (path, response.status_code)
+        payload = response.get_json()
+        for mimetype in formats:
+            body, encode_ms = timed(lambda: enc.encode(payload, mimetype, app.json.default), args.iterations)
+            row = {'route': name, 'format': mimetype.split('/')[1], 'bytes': len(body), 'encode_ms': encode_ms}
+            for encoding in encodings:
+                compressed, compress_ms = timed(lambda: enc.compress(body, encoding), args.iterations)
+                row[encoding] = (len(compressed), compress_ms)
+            rows.append(row)
+
+            # A rota de verdade responde no formato/codificação pedidos
+            check = client.get(path, headers=dict(headers, Accept=mimetype, **{'Accept-Encoding': encodings[-1]}))
+            assert check.mimetype == mimetype, (path, check.mimetype)
+            if len(body) >= app.extensions['response_compressor'].min_size:
+                assert check.headers.get('Content-Encoding') == encodings[-1], (path, check.headers)
+
+    print(f"\n{dialect}, {args.iterations} iterações, commit {loadtest.git_commit()}")
+    header = f"{'rota':<18}{'formato':<9}{'bytes':>10}{'serial. ms':>12}"
+    for encoding in encodings:
+        header += f"{encoding + ' bytes':>12}{encoding + ' ms':>10}"
+    print(header)
+    for row in rows:
+        json_bytes = next(r['bytes'] for r in rows if r['route'] == row['route'] and r['format'] == 'json')
+        line = f"{row['route']:<18}{row['format']:<9}{row['bytes']:>10}{row['encode_ms']:>12.2f}"
+        for encoding in encodings:
+            size, ms = row[encoding]
+            line += f"{size:>12}{ms:>10.2f}"
+        print(line + f"   ({row['bytes'] / json_bytes:.0%} do JSON)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/bench_identity_queries.py
+# Conta as instruções SQL por requisição nas rotas que carregam o usuário
+# (login, admin, culturas do usuário, plantios, tela inicial, redefinição de senha).
+# A verificação de revogação do JWT não pode somar consultas ao caso comum.
+#
+# Cada rota é chamada para um usuário "pequeno" e um "grande" (mais culturas,
+# plantios e eventos): o número de instruções deve ser o mesmo nos dois, e
+# nunca maior que o orçamento da tabela abaixo. Sai com código 1 se algum passar.
+#
+#   python benchmarks/bench_identity_queries.py
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+fd, DB_PATH = tempfile.mkstemp(prefix='plantdoctor_identity_', suffix='.db')
+os.close(fd)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'  # apaga e recria as tabelas: nunca o banco do ambiente
+os.environ.setdefault('JWT_SECRET_KEY', 'bench-identity-' + 'x' * 32)
+os.environ['RATE_LIMIT_ENABLED'] = '0'
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from flask_jwt_extended import create_access_token
+
+import app as appmod
+from app import app, db, User, UserType, Culture, PlantedCulture, HistoryEvent, EventType, PasswordResetToken
+
+PASSWORD = 'senha-bench'
+
+# rota -> número máximo de instruções SQL por requisição
+BUDGETS = {
+    'login': 2,
+    'admin_users': 2,
+    'update_user': 6,  # inclui os campos alterados (user_edit_history_fields)
+    'save_user_cultures': 13,  # inclui a reescrita do snapshot da tela inicial e das recomendações
+    'my_cultures': 2,
+    'planted_cultures': 3,
+    'home': 1,
+    'reset_password': 6,
+}
+
+statements = []
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+
+def make_user(email, cultures, plantings, events_per_planting, admin=False):
+    user = User(name=email.split('@')[0], email=email, password_hash=appmod.hash_password(PASSWORD),
+                user_type=UserType.ADMIN if admin else UserType.COMMON)
+    user.cultures.extend(cultures)
+    db.session.add(user)
+    db.session.flush()
+    for index in range(plantings):
+        culture = cultures[index % len(cultures)]
+        planting = PlantedCulture(user_id=user.id, culture_id=culture.id, planting_date=date(2026, 1, 1),
+                                  predicted_harvest_date=date(2026, 1, 1) + timedelta(days=culture.cycle_days))
+        db.session.add(planting)
+        db.session.flush()
+        db.session.add_all([HistoryEvent(planted_culture_id=planting.id, event_type=EventType.ADUBAGEM,
+                                         observation=f'evento {n}') for n in range(events_per_planting)])
+    db.session.commit()
+    return user
+
+
+def measure(client, method, path, **kwargs):
+    db.session.remove()
+    del statements[:]
+    response = client.open(path, method=method, **kwargs)
+    assert response.status_code < 400, (path, response.status_code, response.get_json())
+    return len(statements)
+
+
+def main():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        appmod.seed_data()
+        appmod.home_ranking()  # já calculados num worker em execução (warm_up)
+        appmod.recommendation_model()
+        appmod.ensure_search_schemas()
+        # Cache de revogações carregado e sem atualização periódica durante a medição
+        app.config['TOKEN_REVOCATION_REFRESH_SECONDS'] = 3600
+        appmod.token_revocations(force=True)
+        cultures = Culture.query.order_by(Culture.id).all()
+        culture_ids = [culture.id for culture in cultures]
+        admin_id = make_user('admin@bench.local', cultures[:1], 0, 0, admin=True).id
+        users = {
+            'pequeno': make_user('pequeno@bench.local', cultures[:1], 1, 1),
+            'grande': make_user('grande@bench.local', cultures, 40, 10),
+        }
+        users = {label: (user.id, user.email) for label, user in users.items()}
+        admin_headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(admin_id))}
+
+        client = app.test_client()
+        results = {}
+        for label, (user_id, email) in users.items():
+            headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+            token = f'bench-reset-{label}'
+            db.session.add(PasswordResetToken(user_id=user_id, token=token,
+                                              expires_at=datetime.utcnow() + timedelta(hours=1)))
+            db.session.commit()
+
+            results[label] = {
+                'login': measure(client, 'POST', '/api/auth/login', json={'email': email, 'password': PASSWORD}),
+                'admin_users': measure(client, 'GET', '/api/admin/users', headers=admin_headers),
+                'update_user': measure(client, 'PUT', f'/api/admin/users/{user_id}', headers=admin_headers,
+                                       json={'name': f'{label} editado'}),
+                'save_user_cultures': measure(client, 'POST', '/api/user/cultures', headers=headers,
+                                              json={'culture_ids': culture_ids[:2]}),
+                'my_cultures': measure(client, 'GET', '/api/user/my-cultures', headers=headers),
+                'planted_cultures': measure(client, 'GET', '/api/planted-cultures', headers=headers),
+                'home': measure(client, 'GET', '/api/home', headers=headers),
+                'reset_password': measure(client, 'POST', '/api/auth/reset-password',
+                                          json={'token': token, 'new_password': PASSWORD}),
+            }
+
+    failed = False
+    print(f"{'rota':<22}{'pequeno':>10}{'grande':>10}{'limite':>10}")
+    for route, budget in BUDGETS.items():
+        small, large = results['pequeno'][route], results['grande'][route]
+        status = ''
+        if large > budget or large != small:
+            status = '  <-- excedeu' if large > budget else '  <-- cresce com os dados'
+            failed = True
+        print(f"{route:<22}{small:>10}{large:>10}{budget:>10}{status}")
+    os.unlink(DB_PATH)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/bench_nearby.py
+# Latência de /api/diagnoses/nearby sobre uma base sintética grande de
+# diagnósticos geolocalizados (regiões produtoras com muitos pontos e o resto
+# do país esparso), espalhados por um ano.
+#
+# Para cada combinação de raio e período mede p50/p95/máximo da requisição
+# inteira pelo test client, em centros dentro e fora das regiões densas, e
+# mostra o plano de consulta das células (deve usar ix_diagnosis_history_geo).
+#
+#   python benchmarks/bench_nearby.py --diagnoses 1000000
+#   python benchmarks/bench_nearby.py --database-url postgresql://localhost/plantdoctor_bench --yes-drop
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest
+import geo
+
+# (lat, lon, desvio em graus, peso): sul de MG, norte do PR, oeste da BA, MT e o RS
+REGIONS = [(-21.5, -45.4, 0.6, 3), (-23.3, -51.2, 0.5, 2), (-12.1, -45.0, 0.8, 2),
+           (-13.0, -55.9, 1.2, 2), (-28.3, -53.5, 0.7, 1)]
+CENTERS = [('região densa', -21.5, -45.4), ('borda de região', -22.4, -44.5), ('área esparsa', -8.0, -63.0)]
+SCENARIOS = [(5, 7), (20, 30), (20, 365), (50, 30), (100, 90)]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Latência da busca de diagnósticos por raio.")
+    loadtest.add_database_arguments(parser)
+    parser.add_argument('--diagnoses', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-dataset', action='store_true')
+    return parser.parse_args()
+
+
+def generate_diagnoses(appmod, total, seed, batch_size=20000):
+    rng = random.Random(seed)
+    db = appmod.db
+    user_id = db.session.query(appmod.User.id).limit(1).scalar()
+    culture_ids = [culture_id for (culture_id,) in db.session.query(appmod.Culture.id)]
+    labels = [label for label in appmod.disease_explanations if label != 'Natural Images']
+    weights = [weight for *_, weight in REGIONS]
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    for start in range(0, total, batch_size):
+        rows = []
+        for _ in range(start, min(total, start + batch_size)):
+            if rng.random() < 0.85:
+                lat, lon, spread, _ = rng.choices(REGIONS, weights)[0]
+                latitude, longitude = rng.gauss(lat, spread), rng.gauss(lon, spread)
+            else:
+                latitude, longitude = rng.uniform(-33.0, 4.0), rng.uniform(-73.0, -35.0)
+            analyzed = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            rows.append({
+                'diagnosis_name': rng.choice(labels), 'photo_path': 'bench.jpg',
+                'analysis_date': analyzed, 'updated_at': analyzed,
+                'latitude': latitude, 'longitude': longitude, 'geo_cell': geo.encode(latitude, longitude),
+                'user_id': user_id, 'culture_id': rng.choice(culture_ids),
+            })
+        db.session.execute(appmod.DiagnosisHistory.__table__.insert(), rows)
+        db.session.commit()
+    print(f">>> {total} diagnósticos gerados em {time.perf_counter() - started:.1f}s.")
+
+
+def main():
+    args = parse_args()
+    loadtest.configure_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-nearby-' + 'x' * 32)
+    os.environ['RESPONSE_CACHE_ENABLED'] = '0'
+    import app as appmod
+
+    app = appmod.app
+    db = appmod.db
+    with app.app_context():
+        if not args.skip_dataset:
+            db.drop_all()
+            db.create_all()
+            appmod.seed_data()
+            db.session.execute(appmod.User.__table__.insert(), [
+                {'name': 'Produtor', 'email': 'produtor@bench.local', 'password_hash': 'x',
+                 'user_type': appmod.UserType.COMMON}
+            ])
+            db.session.commit()
+            generate_diagnoses(appmod, args.diagnoses, args.seed)
+            if db.engine.dialect.name == 'sqlite':
+                db.session.execute(text('ANALYZE'))
+                db.session.commit()
+        user_id = db.session.query(appmod.User.id).limit(1).scalar()
+        headers = {'Authorization': 'Bearer ' + appmod.create_access_token(identity=str(user_id))}
+        dialect = db.engine.dialect.name
+        inside, _ = geo.covering_cells(-21.5, -45.4, 20)
+        explain = 'EXPLAIN QUERY PLAN' if dialect == 'sqlite' else 'EXPLAIN'
+        placeholders = ', '.join(f"'{cell}'" for cell in sorted(inside))
+        plan = db.session.execute(text(
+            f"{explain} SELECT diagnosis_name, count(id) FROM diagnosis_history WHERE geo_cell IN ({placeholders}) "
+            f"AND analysis_date >= '{(datetime.utcnow() - timedelta(days=30)).isoformat(' ')}' GROUP BY diagnosis_name"
+        )).all()
+
+    client = app.test_client()
+    rows, worst = [], 0.0
+    for label, latitude, longitude in CENTERS:
+        for radius_km, days in SCENARIOS:
+            params = {'latitude': latitude, 'longitude': longitude, 'radius_km': radius_km, 'days': days}
+            latencies, total = [], 0
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = client.get('/api/diagnoses/nearby', headers=headers, query_string=params)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, (params, response.get_json())
+                total = response.get_json()['total']
+            latencies.sort()
+            p95 = loadtest.percentile(latencies, 0.95) * 1000
+            worst = max(worst, p95)
+            rows.append((f"{label}, {radius_km} km, {days} d", total,
+                         loadtest.percentile(latencies, 0.50) * 1000, p95, latencies[-1] * 1000))
+
+    print(f"\n{args.diagnoses} diagnósticos, {dialect}, commit {loadtest.git_commit()}")
+    print("plano das células internas:")
+    for line in plan:
+        print("   ", line[-1])
+    print(f"{'consulta':<36}{'diag.':>9}{'p50 ms':>9}{'p95 ms':>9}{'máx ms':>9}")
+    for label, total, p50, p95, top in rows:
+        print(f"{label:<36}{total:>9}{p50:>9.1f}{p95:>9.1f}{top:>9.1f}")
+    print(f"\npior p95: {worst:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+# benchmarks/bench_outbreaks.py
+# Detecção de surtos (outbreaks.py) sobre séries sintéticas com surtos conhecidos.
+#
+# 1. Só NumPy: --series séries de Poisson com sazonalidade semanal/anual por
+#    --years anos, com picos curtos e altas sustentadas injetados em posições
+#    sorteadas. Mede o tempo de detect() e confere quantos surtos foram achados
+#    (recall) e quantos dias normais foram sinalizados (falsos positivos).
+# 2. Ponta a ponta: grava --db-series séries em diagnosis_history (SQLite
+#    temporário ou --database-url) com um surto nos últimos dias e roda o
+#    detect_outbreaks() do app, que tem de criar os avisos uma vez só.
+#
+#   python benchmarks/bench_outbreaks.py
+#   python benchmarks/bench_outbreaks.py --series 5000 --years 5
+import os
+import sys
+import time
+import argparse
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest
+import outbreaks
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tempo e acerto da detecção de surtos.")
+    loadtest.add_database_arguments(parser)
+    parser.add_argument('--series', type=int, default=2000, help="Séries (cultura, doença) sintéticas.")
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--outbreaks', type=int, default=400, help="Surtos injetados.")
+    parser.add_argument('--db-series', type=int, default=30)
+    parser.add_argument('--db-days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def synthetic_counts(rng, n_series, n_days, n_outbreaks):
+    """Contagens diárias e a lista de surtos injetados (série, início, duração, tipo)."""
+    days = np.arange(n_days)
+    base = rng.gamma(2.0, 2.0, size=(n_series, 1))
+    season = 1.0 + 0.5 * np.sin(2 * np.pi * (days / 365.0 + rng.random((n_series, 1))))
+    week = 1.0 - 0.3 * (days % 7 >= 5)
+    rate = base * season * week
+
+    injected = []
+    for _ in range(n_outbreaks):
+        series = int(rng.integers(n_series))
+        start = int(rng.integers(outbreaks.DEFAULT_WINDOW + 30, n_days - 15))
+        if rng.random() < 0.5:
+            length = int(rng.integers(1, 4))
+            rate[series, start:start + length] *= rng.uniform(4.0, 8.0)
+            injected.append((series, start, length, 'pico'))
+        else:
+            length = 12
+            rate[series, start:start + length] *= np.linspace(1.5, 3.0, length)
+            injected.append((series, start, length, 'alta'))
+    rate = np.maximum(rate, 0.0)
+    return rng.poisson(rate).astype(np.float64), injected
+
+
+def run_numpy(args):
+    rng = np.random.default_rng(args.seed)
+    n_days = args.years * 365
+    counts, injected = synthetic_counts(rng, args.series, n_days, args.outbreaks)
+
+    started = time.perf_counter()
+    found = outbreaks.detect(counts)
+    elapsed = time.perf_counter() - started
+
+    expected = np.zeros(counts.shape, dtype=bool)
+    hits = {'pico': [0, 0], 'alta': [0, 0]}
+    for series, start, length, kind in injected:
+        # Aceita o sinal até 3 dias depois do fim (a EWMA demora a baixar)
+        expected[series, start:start + length + 3] = True
+        hits[kind][1] += 1
+        # Surtos abaixo do mínimo de diagnósticos não têm como ser sinalizados
+        if counts[series, start:start + length].max() < outbreaks.DEFAULT_MIN_COUNT:
+            hits[kind][1] -= 1
+        elif found['flags'][series, start:start + length + 3].any():
+            hits[kind][0] += 1
+    false_positives = int((found['flags'] & ~expected).sum())
+    normal_days = int((~expected[:, outbreaks.DEFAULT_WINDOW:]).sum())
+
+    print(f"\n{args.series} séries x {n_days} dias ({counts.size:,} células), commit {loadtest.git_commit()}")
+    print(f"detect(): {elapsed * 1000:.0f} ms")
+    for kind, (found_count, total) in hits.items():
+        print(f"  surtos '{kind}' achados: {found_count}/{total} ({found_count / max(total, 1):.0%})")
+    print(f"  falsos positivos: {false_positives} dias de {normal_days:,} normais "
+          f"({false_positives / max(normal_days, 1):.3%}; "
+          f"{false_positives / args.series / args.years:.2f} por série por ano)")
+
+
+def run_database(args):
+    loadtest.configure_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-outbreaks-' + 'x' * 32)
+    import app as appmod
+
+    rng = np.random.default_rng(args.seed)
+    db = appmod.db
+    today = date.today()
+    with appmod.app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(appmod.User.__table__.insert(), [
+            {'name': f'Admin {i}', 'email': f'admin{i}@bench.local', 'password_hash': 'x',
+             'user_type': appmod.UserType.ADMIN} for i in range(3)
+        ])
+        user_id = db.session.query(appmod.User.id).limit(1).scalar()
+        db.session.execute(appmod.Culture.__table__.insert(), [
+            {'name': f'Cultura {i}', 'image_url': '-'} for i in range(args.db_series)
+        ])
+        culture_ids = [culture_id for (culture_id,) in db.session.query(appmod.Culture.id).order_by(appmod.Culture.id)]
+
+        counts = rng.poisson(rng.gamma(2.0, 1.5, size=(args.db_series, 1)), size=(args.db_series, args.db_days))
+        surge = slice(args.db_days - 2, args.db_days)
+        counts[0, surge] += 25
+        start = today - timedelta(days=args.db_days - 1)
+        rows = []
+        for series, day in zip(*counts.nonzero()):
+            stamp = datetime(start.year, start.month, start.day, 12) + timedelta(days=int(day))
+            rows.extend([{'diagnosis_name': 'Ferrugem', 'photo_path': 'bench.jpg', 'analysis_date': stamp,
+                          'updated_at': stamp, 'user_id': user_id, 'culture_id': culture_ids[series]}]
+                        * int(counts[series, day]))
+        # Rótulos que não são doença ficam de fora, mesmo com muitos diagnósticos
+        rows.extend([{'diagnosis_name': 'Cafe_saudavel', 'photo_path': 'bench.jpg',
+                      'analysis_date': datetime(today.year, today.month, today.day, 9), 'updated_at': datetime.now(),
+                      'user_id': user_id, 'culture_id': culture_ids[0]}] * 200)
+        for batch in range(0, len(rows), 5000):
+            db.session.execute(appmod.DiagnosisHistory.__table__.insert(), rows[batch:batch + 5000])
+        db.session.commit()
+
+        started = time.perf_counter()
+        result = appmod.detect_outbreaks(history_days=args.db_days)
+        elapsed = time.perf_counter() - started
+        again = appmod.detect_outbreaks(history_days=args.db_days)
+        dialect = db.engine.dialect.name
+
+    print(f"\n{dialect}: {len(rows):,} diagnósticos, {args.db_series} séries x {args.db_days} dias")
+    print(f"detect_outbreaks(): {elapsed * 1000:.0f} ms, {result}")
+    assert result['series'] == args.db_series, result
+    assert result['alerts'] >= 3, "o surto injetado deveria gerar avisos para os 3 admins"
+    assert again['alerts'] == 0, "rodar de novo não deve duplicar avisos"
+
+
+def main():
+    args = parse_args()
+    run_numpy(args)
+    run_database(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# benchmarks/bench_rate_limit.py
+# Mede o custo do limitador de requisições: o take() do armazenamento local e o
+# hook completo de before_request (rota com e sem política).
+#
+#   python benchmarks/bench_rate_limit.py
+import os
+import sys
+import time
+import random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from rate_limit import LocalBucketStore, RateLimiter, Policy
+
+ITERATIONS = 200_000
+
+
+def bench(label, fn, iterations=ITERATIONS):
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<50} {elapsed / iterations * 1e6:8.2f} µs/op")
+
+
+def main():
+    store = LocalBucketStore(max_keys=100_000)
+    keys = [f'login:0:10.0.{i // 256}.{i % 256}' for i in range(50_000)]
+    random.shuffle(keys)
+    bench("LocalBucketStore.take (chave quente)", lambda i: store.take([('login:0:1.2.3.4', 1e9, 1e9)]))
+    bench("LocalBucketStore.take (50k chaves)", lambda i: store.take([(keys[i % len(keys)], 20, 20 / 60)]))
+    small = LocalBucketStore(max_keys=1_000)
+    bench("LocalBucketStore.take (com despejo LRU)", lambda i: small.take([(keys[i % len(keys)], 20, 20 / 60)]))
+    bench("LocalBucketStore.take (IP + e-mail)", lambda i: store.take([(keys[i % len(keys)], 20, 20 / 60),
+                                                                      ('login:1:email:' + keys[i % 97], 5, 5 / 60)]))
+
+    from flask import Flask
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'x' * 32
+    from flask_jwt_extended import JWTManager
+    JWTManager(app)
+
+    @app.route('/api/auth/login', methods=['POST'])
+    def login():
+        return ''
+
+    @app.route('/api/cultures')
+    def get_cultures():
+        return ''
+
+    limiter = RateLimiter({'login': [Policy('ip', 10**9, 1)]}, LocalBucketStore())
+    with app.test_request_context('/api/cultures'):
+        app.preprocess_request()
+        bench("before_request em rota sem política", lambda i: limiter.check())
+    with app.test_request_context('/api/auth/login', method='POST', environ_base={'REMOTE_ADDR': '1.2.3.4'}):
+        bench("before_request em rota com política por IP", lambda i: limiter.check())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+# benchmarks/bench_recommendations.py
+# Recomendação de culturas por coocorrência (recommendations.py).
+#
+# 1. Só NumPy, com --users usuários sintéticos: cada um segue um "perfil" de
+#    região (culturas que costumam andar juntas) e tem de 1 a 5 culturas.
+#    Mede a montagem da matriz de coocorrência e o top-k de todos os usuários,
+#    e a qualidade por leave-one-out em usuários fora do treino: esconde uma
+#    cultura e confere se ela aparece no top-5 (comparado com as mais populares).
+# 2. Ponta a ponta no banco (SQLite temporário ou --database-url) com --db-users:
+#    tempo do rebuild_culture_recommendations(), latência do caminho incremental
+#    (refresh_culture_recommendations de um usuário) e da rota de leitura.
+#
+#   python benchmarks/bench_recommendations.py
+#   python benchmarks/bench_recommendations.py --users 5000000 --cultures 120 --db-users 500000
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest
+import recommendations
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tempo e qualidade da recomendação de culturas.")
+    loadtest.add_database_arguments(parser)
+    parser.add_argument('--users', type=int, default=2000000)
+    parser.add_argument('--cultures', type=int, default=60)
+    parser.add_argument('--profiles', type=int, default=12)
+    parser.add_argument('--holdout', type=int, default=20000, help="Usuários fora do treino no leave-one-out.")
+    parser.add_argument('--db-users', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def synthetic_pairs(rng, n_users, n_cultures, n_profiles, chunk=100000):
+    """Pares (usuário, posição da cultura) ordenados por usuário."""
+    # Cada perfil concentra a maior parte do peso em poucas culturas
+    weights = rng.dirichlet(np.full(n_cultures, 0.15), size=n_profiles) + 1e-4
+    logits = np.log(weights / weights.sum(axis=1, keepdims=True)).astype(np.float32)
+    users, cultures = [], []
+    for first in range(0, n_users, chunk):
+        size = min(chunk, n_users - first)
+        profile = rng.integers(n_profiles, size=size)
+        counts = rng.integers(1, 6, size=size)
+        # Sorteio sem reposição pelo truque de Gumbel: as `counts` maiores pontuações de cada linha
+        scores = logits[profile] + rng.gumbel(size=(size, n_cultures)).astype(np.float32)
+        ranked = np.argsort(-scores, axis=1)[:, :5]
+        keep = np.arange(5) < counts[:, None]
+        users.append(np.repeat(np.arange(first, first + size), counts))
+        cultures.append(ranked[keep])
+    return np.concatenate(users), np.concatenate(cultures)
+
+
+def leave_one_out(rng, model, user_index, culture_index, holdout_users, k=5):
+    starts = np.searchsorted(user_index, holdout_users)
+    stops = np.searchsorted(user_index, holdout_users, side='right')
+    eligible = stops - starts >= 2
+    starts, stops = starts[eligible], stops[eligible]
+    hidden = starts + (rng.random(len(starts)) * (stops - starts)).astype(np.int64)
+    owned = np.zeros((len(starts), len(model.culture_ids)), dtype=np.float32)
+    rows = np.repeat(np.arange(len(starts)), stops - starts)
+    columns = culture_index[np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])]
+    owned[rows, columns] = 1.0
+    owned[np.arange(len(starts)), culture_index[hidden]] = 0.0
+    target = culture_index[hidden][:, None]
+    best, _ = recommendations.top_k(owned, model.similarity, model.popularity, k)
+    popular = np.argsort(-model.popularity)
+    popular_hits = [target[row, 0] in [c for c in popular if not owned[row, c]][:k] for row in range(len(starts))]
+    return (best == target).any(axis=1).mean(), np.mean(popular_hits), len(starts)
+
+
+def run_numpy(args):
+    rng = np.random.default_rng(args.seed)
+    started = time.perf_counter()
+    user_index, culture_index = synthetic_pairs(rng, args.users, args.cultures, args.profiles)
+    print(f">>> {len(user_index):,} pares sintéticos em {time.perf_counter() - started:.1f}s.")
+
+    # Os últimos `holdout` usuários ficam fora do treino
+    train = user_index < args.users - args.holdout
+    started = time.perf_counter()
+    model, _, users, (train_users, train_cultures) = recommendations.Model.build(
+        range(args.cultures), user_index[train], culture_index[train]
+    )
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _, owned in recommendations.user_blocks(train_users, train_cultures, len(users), args.cultures, 50000):
+        recommendations.top_k(owned, model.similarity, model.popularity, 10)
+    top_k_s = time.perf_counter() - started
+
+    hit_rate, popular_rate, evaluated = leave_one_out(
+        rng, model, user_index, culture_index, np.arange(args.users - args.holdout, args.users)
+    )
+    print(f"\n{args.users:,} usuários x {args.cultures} culturas, commit {loadtest.git_commit()}")
+    print(f"coocorrência: {build_s:.2f}s   top-10 de todos: {top_k_s:.2f}s")
+    print(f"leave-one-out ({evaluated} usuários): acerto no top-5 {hit_rate:.1%} "
+          f"(só as mais populares: {popular_rate:.1%})")
+
+
+def run_database(args):
+    loadtest.configure_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-recommendations-' + 'x' * 32)
+    os.environ['RESPONSE_CACHE_ENABLED'] = '0'
+    import app as appmod
+
+    rng = np.random.default_rng(args.seed)
+    db = appmod.db
+    app = appmod.app
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        appmod.seed_data()
+        culture_ids = np.array([culture_id for (culture_id,) in db.session.query(appmod.Culture.id)])
+        user_index, culture_index = synthetic_pairs(rng, args.db_users, len(culture_ids), 4)
+        for first in range(0, args.db_users, 20000):
+            db.session.execute(appmod.User.__table__.insert(), [
+                {'name': f'Produtor {i}', 'email': f'produtor{i}@bench.local', 'password_hash': 'x',
+                 'search_key': f'produtor {i}', 'user_type': appmod.UserType.COMMON}
+                for i in range(first, min(args.db_users, first + 20000))
+            ])
+        first_id = db.session.query(appmod.func.min(appmod.User.id)).scalar()
+        pairs = [{'user_id': int(first_id + user), 'culture_id': int(culture_ids[culture])}
+                 for user, culture in zip(user_index.tolist(), culture_index.tolist())]
+        for start in range(0, len(pairs), 50000):
+            db.session.execute(appmod.user_cultures.insert(), pairs[start:start + 50000])
+        db.session.commit()
+
+        started = time.perf_counter()
+        result = appmod.rebuild_culture_recommendations()
+        rebuild_s = time.perf_counter() - started
+
+        sample = rng.integers(args.db_users, size=args.requests) + first_id
+        latencies = []
+        for user_id in sample.tolist():
+            started = time.perf_counter()
+            appmod.refresh_culture_recommendations(user_id)
+            latencies.append(time.perf_counter() - started)
+        tokens = [appmod.create_access_token(identity=str(user_id)) for user_id in sample.tolist()]
+        dialect = db.engine.dialect.name
+
+    client = app.test_client()
+    reads = []
+    for token in tokens:
+        started = time.perf_counter()
+        response = client.get('/api/user/recommended-cultures', headers={'Authorization': f'Bearer {token}'})
+        reads.append(time.perf_counter() - started)
+        assert response.status_code == 200 and response.get_json(), response.get_json()
+
+    latencies.sort()
+    reads.sort()
+    print(f"\n{dialect}: {result['users']:,} usuários, {result['pairs']:,} pares, {result['cultures']} culturas")
+    print(f"rebuild completo: {rebuild_s:.1f}s")
+    print(f"incremental (1 usuário): p50 {loadtest.percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"p95 {loadtest.percentile(latencies, 0.95) * 1000:.2f} ms")
+    print(f"GET /api/user/recommended-cultures: p50 {loadtest.percentile(reads, 0.5) * 1000:.2f} ms, "
+          f"p95 {loadtest.percentile(reads, 0.95) * 1000:.2f} ms")
+
+
+def main():
+    args = parse_args()
+    run_numpy(args)
+    run_database(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_revocation.py
+# Custo da verificação de revogação de JWT (revocation.py + token_revocations).
+#
+# Grava --revoked tokens revogados (logout) e --watermarks marcas de usuário
+# (troca de senha/papel) e mede:
+#   - a carga completa e a atualização incremental do cache de um worker;
+#   - is_token_revoked para tokens válidos (sem consulta), revogados por marca e
+#     revogados por jti (filtro + confirmação no banco);
+#   - a taxa de falsos positivos do filtro (tokens válidos que vão ao banco).
+#
+#   python benchmarks/bench_revocation.py
+#   python benchmarks/bench_revocation.py --revoked 1000000 --watermarks 200000
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Custo da verificação de revogação de JWT.")
+    loadtest.add_database_arguments(parser)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--revoked', type=int, default=200000)
+    parser.add_argument('--watermarks', type=int, default=20000)
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    loadtest.configure_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-revocation-' + 'x' * 32)
+    import app as appmod
+
+    rng = random.Random(args.seed)
+    db = appmod.db
+    with appmod.app.app_context():
+        db.drop_all()
+        db.create_all()
+        for start in range(0, args.users, 20000):
+            db.session.execute(appmod.User.__table__.insert(), [
+                {'name': f'Produtor {i}', 'email': f'produtor{i}@bench.local', 'password_hash': 'x',
+                 'user_type': appmod.UserType.COMMON} for i in range(start, min(args.users, start + 20000))
+            ])
+        user_ids = [user_id for (user_id,) in db.session.query(appmod.User.id)]
+        now = datetime.utcnow()
+        expires_at = now + timedelta(hours=1)
+        revoked = [(rng.choice(user_ids), str(uuid.uuid4())) for _ in range(args.revoked)]
+        for start in range(0, len(revoked), 50000):
+            db.session.execute(appmod.TokenRevocation.__table__.insert(), [
+                {'user_id': user_id, 'jti': jti, 'revoked_at': now - timedelta(minutes=10), 'expires_at': expires_at}
+                for user_id, jti in revoked[start:start + 50000]
+            ])
+        marked = rng.sample(user_ids, min(args.watermarks, len(user_ids)))
+        db.session.execute(appmod.TokenRevocation.__table__.insert(), [
+            {'user_id': user_id, 'jti': None, 'revoked_at': now, 'expires_at': expires_at} for user_id in marked
+        ])
+        db.session.commit()
+
+        started = time.perf_counter()
+        cache = appmod.token_revocations(force=True)
+        full_s = time.perf_counter() - started
+        started = time.perf_counter()
+        appmod.token_revocations(force=True)
+        incremental_s = time.perf_counter() - started
+
+        iat = int(now.timestamp()) - 3600
+        unmarked = sorted(set(user_ids) - set(marked))
+        cases = {
+            'válido': [{'sub': str(rng.choice(unmarked)), 'jti': str(uuid.uuid4()), 'iat': iat + 7200}
+                       for _ in range(args.checks)],
+            'revogado (marca)': [{'sub': str(rng.choice(marked)), 'jti': str(uuid.uuid4()), 'iat': iat}
+                                 for _ in range(min(args.checks, 20000))],
+            'revogado (jti)': [{'sub': str(user_id), 'jti': jti, 'iat': iat}
+                               for user_id, jti in rng.sample(revoked, min(args.checks, len(revoked), 20000))],
+        }
+        appmod.app.config['TOKEN_REVOCATION_REFRESH_SECONDS'] = 3600
+        results = []
+        for label, payloads in cases.items():
+            started = time.perf_counter()
+            outcomes = [appmod.is_token_revoked(payload) for payload in payloads]
+            elapsed = time.perf_counter() - started
+            expected = label != 'válido'
+            assert all(outcome == expected for outcome in outcomes), label
+            results.append((label, len(payloads), elapsed / len(payloads) * 1e6))
+        false_positives = sum(cache.check(int(p['sub']), p['jti'], p['iat']) == 'maybe' for p in cases['válido'])
+        dialect = db.engine.dialect.name
+
+    print(f"\n{dialect}: {args.revoked} jti revogados, {len(marked)} marcas, commit {loadtest.git_commit()}")
+    print(f"filtro: {cache.tokens.size / 8 / 1024:.0f} KiB, {cache.tokens.hashes} hashes")
+    print(f"carga completa: {full_s * 1000:.0f} ms   atualização incremental: {incremental_s * 1000:.1f} ms")
+    print(f"{'caso':<20}{'tokens':>9}{'µs/token':>10}")
+    for label, total, per_token in results:
+        print(f"{label:<20}{total:>9}{per_token:>10.1f}")
+    print(f"falsos positivos do filtro: {false_positives / len(cases['válido']):.3%} dos tokens válidos")
+
+
+if __name__ == '__main__':
+    main()
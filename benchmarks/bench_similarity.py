@@ -0,0 +1,71 @@
+# benchmarks/bench_similarity.py
+# Memória e tempo de consulta do índice de dúvidas parecidas com N dúvidas sintéticas.
+#
+#   python benchmarks/bench_similarity.py --size 1000000 --dimensions 256
+import os
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from similarity import SimilarityIndex
+
+CULTURES = ['café', 'milho', 'soja', 'arroz', 'feijão', 'banana', 'algodão', 'trigo', 'mandioca', 'cacau']
+PROBLEMS = ['ferrugem', 'manchas pretas', 'lagarta', 'pulgão', 'folhas amarelas', 'murcha', 'sigatoka',
+            'bicho mineiro', 'broca', 'podridão', 'cigarrinha', 'falta de chuva', 'excesso de chuva']
+TEMPLATES = ['Como controlar {p} no {c}?', 'Meu {c} está com {p}, o que fazer?', 'Qual produto usar contra {p} em {c}?',
+             'É normal aparecer {p} no {c} nesta época?', '{p} no {c}: vale a pena aplicar fungicida?',
+             'Quanto tempo leva para o {c} se recuperar de {p}?', 'Como prevenir {p} na lavoura de {c}?']
+
+
+def synthetic_questions(n, rng):
+    for i in range(n):
+        yield (rng.choice(TEMPLATES).format(c=rng.choice(CULTURES), p=rng.choice(PROBLEMS))
+               + f' Talhão {rng.randint(1, 500)}.')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=1_000_000)
+    parser.add_argument('--dimensions', type=int, default=256)
+    parser.add_argument('--batch', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    index = SimilarityIndex(dimensions=args.dimensions, initial_capacity=args.size)
+    started = time.perf_counter()
+    batch_ids, batch_texts = [], []
+    for item_id, question in enumerate(synthetic_questions(args.size, rng)):
+        batch_ids.append(item_id)
+        batch_texts.append(question)
+        if len(batch_texts) >= args.batch:
+            index.add(batch_ids, batch_texts)
+            batch_ids, batch_texts = [], []
+    if batch_texts:
+        index.add(batch_ids, batch_texts)
+    build = time.perf_counter() - started
+
+    queries = list(synthetic_questions(args.queries, rng))
+    latencies = []
+    for question in queries:
+        t0 = time.perf_counter()
+        index.query(question, k=5)
+        latencies.append(time.perf_counter() - t0)
+    latencies = np.array(latencies) * 1000
+
+    print(f"dúvidas indexadas:   {len(index):,}")
+    print(f"dimensões:           {args.dimensions}")
+    print(f"memória do índice:   {index.nbytes / 2**20:,.1f} MiB")
+    print(f"construção:          {build:,.1f}s ({len(index) / build:,.0f} dúvidas/s)")
+    print(f"consulta top-5 p50:  {np.percentile(latencies, 50):.2f} ms")
+    print(f"consulta top-5 p99:  {np.percentile(latencies, 99):.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# benchmarks/bench_startup.py
+# Mede o tempo de inicialização da aplicação e a memória por worker num
+# servidor pre-fork (como o gunicorn), comparando três modos:
+#
+#   cold          cada worker importa e cria a aplicação depois do fork
+#   preload       o mestre cria e aquece a aplicação (warm_up) antes do fork
+#   preload+freeze  como preload, com gc.disable() no import e gc.freeze() antes do fork
+#
+# Cada modo roda num subprocesso que faz os forks; os workers chamam after_fork,
+# atendem algumas requisições e devolvem Pss e Private_Dirty (/proc/self/smaps_rollup).
+# Quanto menor o Private_Dirty, mais páginas continuam compartilhadas com o mestre.
+#
+#   python benchmarks/bench_startup.py --workers 4
+#   python benchmarks/bench_startup.py --database-url postgresql://localhost/plantdoctor_bench --yes-drop
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest
+
+MODES = ('cold', 'preload', 'preload+freeze')
+REQUESTS_PER_WORKER = 50
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tempo de inicialização e memória por worker.")
+    loadtest.add_database_arguments(parser)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--doubts', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-dataset', action='store_true')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def memory_kb():
+    """Pss e Private_Dirty do processo atual, em kB."""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Pss', 'Private_Dirty'):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def serve_requests(app):
+    from flask_jwt_extended import create_access_token
+    from app import db, User
+    with app.app_context():
+        user_id = db.session.query(User.id).order_by(User.id).limit(1).scalar()
+        headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+        db.session.remove()
+    client = app.test_client()
+    paths = ['/api/cultures', '/api/cultures/ranking', '/api/explanations/Cafe_Ferrugem',
+             '/api/doubts/similar?q=folhas amarelas no tomate']
+    for index in range(REQUESTS_PER_WORKER):
+        client.get(paths[index % len(paths)], headers=headers)
+
+
+def worker(mode, app, write_fd):
+    started = time.perf_counter()
+    if mode == 'cold':
+        import app as appmod
+        app = appmod.create_app()
+        appmod.warm_up(app)
+    else:
+        import app as appmod
+        appmod.after_fork(app)
+        gc.enable()
+    ready = time.perf_counter() - started
+    serve_requests(app)
+    result = dict(memory_kb(), ready_s=ready)
+    os.write(write_fd, (json.dumps(result) + '\n').encode())
+    os._exit(0)
+
+
+def run_mode(mode, workers):
+    """Executado no subprocesso: prepara o mestre conforme o modo e faz os forks."""
+    timings = {}
+    app = None
+    if mode == 'preload+freeze':
+        gc.disable()
+    if mode != 'cold':
+        started = time.perf_counter()
+        import app as appmod
+        app = appmod.create_app()
+        timings['create_app_s'] = time.perf_counter() - started
+        started = time.perf_counter()
+        appmod.warm_up(app)
+        timings['warm_up_s'] = time.perf_counter() - started
+        if mode == 'preload+freeze':
+            gc.freeze()
+
+    read_fd, write_fd = os.pipe()
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            worker(mode, app, write_fd)
+        children.append(pid)
+    os.close(write_fd)
+    for pid in children:
+        os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as f:
+        results = [json.loads(line) for line in f if line.strip()]
+    print(json.dumps({'master': dict(memory_kb(), **timings), 'workers': results}))
+
+
+def main():
+    args = parse_args()
+    if args.mode:
+        run_mode(args.mode, args.workers)
+        return
+
+    loadtest.configure_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-startup-' + 'x' * 32)
+
+    # Tempo de import + create_app num interpretador limpo
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import app; app.create_app()'], cwd=ROOT, check=True)
+    import_s = time.perf_counter() - started
+
+    import app as appmod
+    app = appmod.create_app()
+    dataset = argparse.Namespace(
+        seed=args.seed, users=args.users, plantings_per_user=3, events_per_planting=2,
+        diagnoses_per_user=3, doubts=args.doubts, alerts_per_user=2, mix='ranking=1'
+    )
+    with app.app_context():
+        if not args.skip_dataset:
+            loadtest.generate_dataset(dataset, appmod)
+        dialect = appmod.db.engine.dialect.name
+        env = dict(os.environ, DATABASE_URL=appmod.db.engine.url.render_as_string(hide_password=False))
+
+    rows = []
+    for mode in MODES:
+        print(f">>> {mode}: {args.workers} workers...")
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--mode', mode,
+                                 '--workers', str(args.workers)],
+                                cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+        rows.append((mode, json.loads(output.strip().splitlines()[-1])))
+
+    print(f"\nimport + create_app (processo novo): {import_s:.2f}s")
+    print(f"{args.workers} workers, {dialect}, commit {loadtest.git_commit()}")
+    print(f"{'modo':<16} {'warm_up s':>10} {'pronto s':>9} {'Pss kB':>9} {'Priv.Dirty kB':>14} {'total Pss kB':>13}")
+    for mode, result in rows:
+        workers = result['workers']
+        ready = sum(w['ready_s'] for w in workers) / len(workers)
+        pss = sum(w['Pss'] for w in workers) / len(workers)
+        dirty = sum(w['Private_Dirty'] for w in workers) / len(workers)
+        total = result['master']['Pss'] + sum(w['Pss'] for w in workers)
+        warm = result['master'].get('warm_up_s')
+        warm = f"{warm:>10.2f}" if warm is not None else f"{'-':>10}"
+        print(f"{mode:<16} {warm} {ready:>9.3f} {pss:>9.0f} {dirty:>14.0f} {total:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
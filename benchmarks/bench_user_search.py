@@ -0,0 +1,137 @@
+# benchmarks/bench_user_search.py
+# Latência da busca de usuários da administração (/api/admin/users/search)
+# sobre uma base sintética grande de produtores com nomes brasileiros.
+#
+# Para cada consulta típica de typeahead (1 a 3 letras, nome completo, trecho de
+# sobrenome, pedaço de e-mail, com e sem filtros, segunda página pelo cursor)
+# mede p50/p95/máximo da requisição inteira pelo test client. A meta é ficar
+# abaixo de --target-ms (50 ms) com 1M de usuários.
+#
+#   python benchmarks/bench_user_search.py --users 200000
+#   python benchmarks/bench_user_search.py --users 1000000
+#   python benchmarks/bench_user_search.py --database-url postgresql://localhost/plantdoctor_bench --yes-drop
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest
+
+FIRST_NAMES = ['Maria', 'José', 'Ana', 'João', 'Antônio', 'Francisco', 'Carlos', 'Paulo', 'Pedro', 'Lucas',
+               'Luíza', 'Márcia', 'Juliana', 'Sebastião', 'Raimunda', 'Luís', 'Marcos', 'Gabriel', 'Aparecida',
+               'Cícero', 'Benedita', 'Joaquim', 'Tereza', 'Rafael', 'Conceição', 'Edson', 'Fátima', 'Jéssica']
+SURNAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima',
+            'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Araújo', 'Melo', 'Barbosa', 'Rocha',
+            'Dias', 'Nascimento', 'Andrade', 'Moreira', 'Nunes', 'Marques', 'Machado', 'Mendes', 'Freitas',
+            'Conceição', 'Assunção', 'Brandão', 'Damasceno', 'Figueiredo', 'Guimarães', 'Queiroz']
+DOMAINS = ['gmail.com', 'hotmail.com', 'coopagro.com.br', 'yahoo.com.br', 'uol.com.br']
+
+QUERIES = [
+    ('1 letra', {'q': 'm'}),
+    ('2 letras', {'q': 'jo'}),
+    ('3 letras', {'q': 'mar'}),
+    ('nome', {'q': 'maria'}),
+    ('nome + sobrenome', {'q': 'maria silva'}),
+    ('trecho sobrenome', {'q': 'veira'}),
+    ('acentos', {'q': 'Conceição'}),
+    ('e-mail', {'q': 'coopagro'}),
+    ('e-mail exato', {'q': 'produtor123@'}),
+    ('raro', {'q': 'damasceno queiroz'}),
+    ('filtro admin', {'q': 'sil', 'user_type': 'ADMIN'}),
+    ('filtro data', {'q': 'ana', 'registered_from': '2025-06-01'}),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Latência da busca de usuários.")
+    loadtest.add_database_arguments(parser)
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20, help="Repetições de cada consulta.")
+    parser.add_argument('--target-ms', type=float, default=50.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-dataset', action='store_true')
+    return parser.parse_args()
+
+
+def generate_users(appmod, total, seed, batch_size=20000):
+    rng = random.Random(seed)
+    db, User = appmod.db, appmod.User
+    started = time.perf_counter()
+    base_date = datetime(2024, 1, 1)
+    for start in range(0, total, batch_size):
+        rows = []
+        for i in range(start, min(total, start + batch_size)):
+            name = f"{rng.choice(FIRST_NAMES)} {' '.join(rng.sample(SURNAMES, rng.randint(1, 3)))}"
+            rows.append({
+                'name': name,
+                'email': f"produtor{i}@{rng.choice(DOMAINS)}",
+                'password_hash': 'x',
+                'user_type': appmod.UserType.ADMIN if rng.random() < 0.001 else appmod.UserType.COMMON,
+                'created_at': base_date + timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+            })
+        db.session.execute(User.__table__.insert(), rows)
+        db.session.commit()
+    print(f">>> {total} usuários gerados em {time.perf_counter() - started:.1f}s.")
+
+
+def main():
+    args = parse_args()
+    loadtest.configure_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-user-search-' + 'x' * 32)
+    os.environ['RESPONSE_CACHE_ENABLED'] = '0'
+    import app as appmod
+    import user_search
+
+    app = appmod.app
+    with app.app_context():
+        if not args.skip_dataset:
+            appmod.db.drop_all()
+            appmod.db.create_all()
+            generate_users(appmod, args.users, args.seed)
+        appmod.db.session.commit()
+        started = time.perf_counter()
+        user_search.ensure_schema(appmod.db.engine)
+        print(f">>> Índices da busca prontos em {time.perf_counter() - started:.1f}s.")
+        admin_id = appmod.db.session.query(appmod.User.id).filter_by(user_type=appmod.UserType.ADMIN).limit(1).scalar()
+        headers = {'Authorization': 'Bearer ' + appmod.create_access_token(identity=str(admin_id))}
+        dialect = appmod.db.engine.dialect.name
+
+    client = app.test_client()
+    rows, worst = [], 0.0
+    for label, params in QUERIES:
+        for page in ('1ª página', '2ª página'):
+            latencies, count, cursor = [], 0, None
+            if page == '2ª página':
+                cursor = client.get('/api/admin/users/search', headers=headers,
+                                    query_string=params).get_json()['next_cursor']
+                if not cursor:
+                    continue
+            query_string = dict(params, cursor=cursor) if cursor else params
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                response = client.get('/api/admin/users/search', headers=headers, query_string=query_string)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, (params, response.get_json())
+                count = len(response.get_json()['items'])
+            latencies.sort()
+            p95 = loadtest.percentile(latencies, 0.95) * 1000
+            worst = max(worst, p95)
+            rows.append((f"{label} ({page})", count, loadtest.percentile(latencies, 0.50) * 1000, p95,
+                         latencies[-1] * 1000))
+
+    print(f"\n{args.users} usuários, {dialect}, commit {loadtest.git_commit()}")
+    print(f"{'consulta':<36}{'itens':>7}{'p50 ms':>9}{'p95 ms':>9}{'máx ms':>9}")
+    for label, count, p50, p95, top in rows:
+        flag = '  <-- acima da meta' if p95 > args.target_ms else ''
+        print(f"{label:<36}{count:>7}{p50:>9.1f}{p95:>9.1f}{top:>9.1f}{flag}")
+    print(f"\npior p95: {worst:.1f} ms (meta {args.target_ms:.0f} ms)")
+    sys.exit(1 if worst > args.target_ms else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# benchmarks/bench_weather_risk.py
+# Tempo e memória do cálculo de risco de doenças pelo clima
+# (create_weather_risk_alerts) com muitas estações e centenas de milhares de plantios.
+#
+# Gera um CSV por estação com --history-days dias de observações (só os últimos
+# dias entram na análise) e plantios em aberto ligados às estações, com algumas
+# estações sem observações. Cada tamanho de lote (--chunks) roda num processo
+# filho a partir da mesma base; o filho informa o tempo e o pico de memória
+# acima do que já tinha no início (VmHWM - VmRSS). A segunda execução no mesmo
+# dia não pode criar avisos novos.
+#
+#   python benchmarks/bench_weather_risk.py
+#   python benchmarks/bench_weather_risk.py --plantings 500000 --chunks 10000 50000 200000
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import loadtest
+
+CULTURES = ['Café', 'Milho', 'Arroz', 'Algodão', 'Soja']
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tempo e memória do risco de doenças pelo clima.")
+    loadtest.add_database_arguments(parser)
+    parser.add_argument('--stations', type=int, default=2000)
+    parser.add_argument('--history-days', type=int, default=90)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--plantings', type=int, default=300000)
+    parser.add_argument('--chunks', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def memory_kb(key):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(key + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+def write_observations(directory, stations, days, today, rng):
+    for station in range(stations):
+        # Cada estação tem um clima: umas quentes e úmidas, outras secas
+        temperature, humidity = rng.uniform(14, 32), rng.uniform(55, 98)
+        with open(os.path.join(directory, f'S{station:05d}.csv'), 'w') as f:
+            f.write('date,temp_mean,humidity,rain\n')
+            for offset in range(days - 1, -1, -1):
+                day = today - timedelta(days=offset)
+                f.write(f"{day.isoformat()},{temperature + rng.gauss(0, 2):.1f},"
+                        f"{min(100.0, humidity + rng.gauss(0, 5)):.0f},{max(0.0, rng.gauss(2, 6)):.1f}\n")
+
+
+def generate_plantings(appmod, args, today, rng):
+    db = appmod.db
+    db.drop_all()
+    db.create_all()
+    db.session.execute(appmod.Culture.__table__.insert(), [
+        {'name': name, 'image_url': '-', 'cycle_days': 120} for name in CULTURES
+    ])
+    culture_ids = [culture_id for (culture_id,) in db.session.query(appmod.Culture.id)]
+    for start in range(0, args.users, 20000):
+        db.session.execute(appmod.User.__table__.insert(), [
+            {'name': f'Produtor {i}', 'email': f'produtor{i}@bench.local', 'password_hash': 'x',
+             'user_type': appmod.UserType.COMMON} for i in range(start, min(args.users, start + 20000))
+        ])
+    user_ids = [user_id for (user_id,) in db.session.query(appmod.User.id)]
+    for start in range(0, args.plantings, 20000):
+        rows = []
+        for _ in range(start, min(args.plantings, start + 20000)):
+            planting_date = today - timedelta(days=rng.randint(0, 100))
+            # ~5% dos plantios apontam para estações sem observações
+            station = rng.randrange(int(args.stations * 1.05))
+            rows.append({
+                'user_id': rng.choice(user_ids), 'culture_id': rng.choice(culture_ids),
+                'planting_date': planting_date, 'predicted_harvest_date': planting_date + timedelta(days=120),
+                'weather_station': f'S{station:05d}',
+            })
+        db.session.execute(appmod.PlantedCulture.__table__.insert(), rows)
+    db.session.commit()
+
+
+def run_child(appmod, paths, today, chunk_size):
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        baseline = memory_kb('VmRSS')
+        started = time.perf_counter()
+        with appmod.app.app_context():
+            result = appmod.create_weather_risk_alerts(paths, today, chunk_size=chunk_size)
+            again = appmod.create_weather_risk_alerts(paths, today, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        os.write(write, repr((result, again['alerts'], elapsed, memory_kb('VmHWM') - baseline)).encode())
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as f:
+        output = f.read()
+    os.waitpid(pid, 0)
+    return eval(output)
+
+
+def main():
+    args = parse_args()
+    loadtest.configure_database(args)
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-weather-risk-' + 'x' * 32)
+    import app as appmod
+
+    rng = random.Random(args.seed)
+    today = date.today()
+    directory = tempfile.mkdtemp(prefix='plantdoctor_weather_')
+    try:
+        started = time.perf_counter()
+        write_observations(directory, args.stations, args.history_days, today, rng)
+        with appmod.app.app_context():
+            generate_plantings(appmod, args, today, rng)
+            dialect = appmod.db.engine.dialect.name
+            appmod.db.engine.dispose()
+        print(f">>> Base sintética pronta em {time.perf_counter() - started:.1f}s.")
+
+        print(f"\n{args.stations} estações x {args.history_days} dias, {args.plantings} plantios, "
+              f"{dialect}, commit {loadtest.git_commit()}")
+        print(f"{'lote':>8}{'plantios':>10}{'avisos':>9}{'repetição':>11}{'tempo s':>9}{'pico MB':>9}")
+        for chunk_size in args.chunks:
+            with appmod.app.app_context():
+                appmod.db.session.execute(appmod.Alert.__table__.delete())
+                appmod.db.session.commit()
+                appmod.db.engine.dispose()
+            result, repeated, elapsed, peak_kb = run_child(appmod, [directory], today, chunk_size)
+            print(f"{chunk_size:>8}{result['plantings']:>10}{result['alerts']:>9}{repeated:>11}"
+                  f"{elapsed:>9.1f}{peak_kb / 1024:>9.1f}")
+            assert repeated == 0, "a segunda execução da semana não deve criar avisos"
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
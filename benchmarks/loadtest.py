@@ -0,0 +1,351 @@
+# benchmarks/loadtest.py
+# Teste de carga de ponta a ponta com base de dados sintética reprodutível.
+#
+# Gera usuários, plantios, eventos de histórico, diagnósticos, dúvidas e avisos,
+# e depois replica uma carga mista contra as rotas reais (login, lista de
+# plantios, avisos, ranking, salvar diagnóstico) com N threads concorrentes.
+# Reporta p50/p95/p99 e vazão por rota e salva o resultado em JSON para
+# comparar entre commits.
+#
+# Exemplos:
+#   python benchmarks/loadtest.py --users 2000 --concurrency 8 --duration 30
+#   python benchmarks/loadtest.py --database-url postgresql://localhost/plantdoctor_bench --yes-drop
+#   python benchmarks/loadtest.py --compare benchmarks/results/<arquivo>.json
+#   python benchmarks/loadtest.py --base-url http://127.0.0.1:8000 --database-url <banco do servidor> --skip-dataset
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LOADTEST_PASSWORD = 'senha-loadtest'
+DEFAULT_MIX = 'login=1,plantings=4,alerts=4,ranking=2,diagnosis=1'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Teste de carga do Plant Doctor.")
+    add_database_arguments(parser)
+    parser.add_argument('--base-url', help="Envia a carga via HTTP para um servidor já rodando (ex: gunicorn).")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--plantings-per-user', type=int, default=5)
+    parser.add_argument('--events-per-planting', type=int, default=4)
+    parser.add_argument('--diagnoses-per-user', type=int, default=3)
+    parser.add_argument('--doubts', type=int, default=1000)
+    parser.add_argument('--alerts-per-user', type=int, default=10)
+    parser.add_argument('--skip-dataset', action='store_true', help="Reaproveita a base já gerada.")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=20.0, help="Segundos de carga medida.")
+    parser.add_argument('--warmup', type=float, default=2.0, help="Segundos de aquecimento (não medidos).")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="Pesos por rota, ex: 'login=1,alerts=4'.")
+    parser.add_argument('--output-dir', default=os.path.join(ROOT, 'benchmarks', 'results'))
+    parser.add_argument('--compare', help="Resultado JSON anterior para comparação.")
+    return parser.parse_args()
+
+
+def add_database_arguments(parser):
+    parser.add_argument('--database-url', help="Banco alvo (padrão: SQLite temporário; a DATABASE_URL do ambiente "
+                                               "é ignorada).")
+    parser.add_argument('--yes-drop', action='store_true',
+                        help="Confirma que as tabelas de --database-url podem ser apagadas e recriadas.")
+
+
+def configure_database(args):
+    """Aponta DATABASE_URL para o banco do benchmark.
+
+    A base sintética apaga e recria todas as tabelas: sem --database-url o
+    benchmark usa sempre um SQLite temporário, e um banco explícito só é aceito
+    com --yes-drop (ou com --skip-dataset, que não apaga nada).
+    """
+    if args.database_url:
+        if not getattr(args, 'skip_dataset', False) and not args.yes_drop:
+            sys.exit(f"As tabelas de {args.database_url} seriam apagadas; repita com --yes-drop para confirmar.")
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        fd, path = tempfile.mkstemp(prefix='plantdoctor_loadtest_', suffix='.db')
+        os.close(fd)
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    # A carga sintética não deve ser barrada pelo limitador de requisições
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+
+# --- BASE DE DADOS SINTÉTICA ---
+
+def _insert_batches(db, table, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[start:start + batch_size])
+    db.session.commit()
+
+
+def _new_ids(db, model, max_before):
+    return [row[0] for row in db.session.query(model.id).filter(model.id > max_before).order_by(model.id)]
+
+
+def generate_dataset(args, appmod):
+    from werkzeug.security import generate_password_hash
+    from sqlalchemy import func
+
+    db = appmod.db
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+
+    db.drop_all()
+    db.create_all()
+    appmod.ensure_search_schemas()
+    appmod.seed_data()
+    cultures = appmod.Culture.query.all()
+
+    # Um único hash para todos: gerar milhares de hashes só atrasaria a preparação
+    password_hash = generate_password_hash(LOADTEST_PASSWORD)
+    max_user = db.session.query(func.coalesce(func.max(appmod.User.id), 0)).scalar()
+    _insert_batches(db, appmod.User.__table__, [{
+        'name': f'Produtor {i}',
+        'email': f'produtor{i}@loadtest.local',
+        'password_hash': password_hash,
+        'user_type': appmod.UserType.ADMIN if i == 0 else appmod.UserType.COMMON,
+    } for i in range(args.users)])
+    user_ids = _new_ids(db, appmod.User, max_user)
+
+    interests = []
+    for user_id in user_ids:
+        for culture in rng.sample(cultures, rng.randint(1, 4)):
+            interests.append({'user_id': user_id, 'culture_id': culture.id})
+    _insert_batches(db, appmod.user_cultures, interests)
+
+    today = date.today()
+    plantings = []
+    for user_id in user_ids:
+        for _ in range(args.plantings_per_user):
+            culture = rng.choice(cultures)
+            planting_date = today - timedelta(days=rng.randint(0, 720))
+            plantings.append({
+                'user_id': user_id,
+                'culture_id': culture.id,
+                'planting_date': planting_date,
+                'predicted_harvest_date': planting_date + timedelta(days=culture.cycle_days),
+                'notes': 'Talhão %d' % rng.randint(1, 40),
+            })
+    max_planting = db.session.query(func.coalesce(func.max(appmod.PlantedCulture.id), 0)).scalar()
+    _insert_batches(db, appmod.PlantedCulture.__table__, plantings)
+    planting_ids = _new_ids(db, appmod.PlantedCulture, max_planting)
+
+    event_types = list(appmod.EventType)
+    events = [{
+        'planted_culture_id': planting_id,
+        'event_type': rng.choice(event_types),
+        'event_date': datetime.now() - timedelta(days=rng.randint(0, 365)),
+        'observation': 'Registro sintético',
+    } for planting_id in planting_ids for _ in range(args.events_per_planting)]
+    _insert_batches(db, appmod.HistoryEvent.__table__, events)
+
+    labels = [label for label in appmod.disease_explanations if label != 'Natural Images']
+    _insert_batches(db, appmod.DiagnosisHistory.__table__, [{
+        'user_id': user_id,
+        'culture_id': rng.choice(cultures).id,
+        'diagnosis_name': rng.choice(labels),
+        'observation': 'IA detectou com %d%% de confiança' % rng.randint(50, 99),
+        'photo_path': f'file:///fotos/{user_id}/{n}.jpg',
+    } for user_id in user_ids for n in range(args.diagnoses_per_user)])
+
+    _insert_batches(db, appmod.Doubt.__table__, [{
+        'user_id': rng.choice(user_ids),
+        'question_text': f'Como tratar a praga número {n} na minha lavoura?',
+        'is_anonymous': rng.random() < 0.2,
+    } for n in range(args.doubts)])
+
+    _insert_batches(db, appmod.Alert.__table__, [{
+        'user_id': user_id,
+        'title': 'Aviso sintético',
+        'message': f'Mensagem {n}',
+        'is_read': rng.random() < 0.7,
+    } for user_id in user_ids for n in range(args.alerts_per_user)])
+
+    print(f">>> Base sintética gerada em {time.perf_counter() - started:.1f}s: "
+          f"{len(user_ids)} usuários, {len(planting_ids)} plantios, {len(events)} eventos.")
+
+
+# --- CARGA MISTA ---
+
+class Workload:
+    def __init__(self, args, appmod):
+        self.rng_seed = args.seed
+        self.mix = []
+        for part in args.mix.split(','):
+            name, weight = part.split('=')
+            self.mix.append((name.strip(), float(weight)))
+        self.users = [(u.id, u.email) for u in appmod.User.query.order_by(appmod.User.id).all()]
+        self.culture_ids = [c.id for c in appmod.Culture.query.all()]
+        labels = [label for label in appmod.disease_explanations if label != 'Natural Images']
+        self.labels = labels
+        with appmod.app.app_context():
+            self.tokens = {user_id: appmod.create_access_token(identity=str(user_id)) for user_id, _ in self.users}
+
+    def request_for(self, rng):
+        names, weights = zip(*self.mix)
+        route = rng.choices(names, weights)[0]
+        user_id, email = rng.choice(self.users)
+        headers = {'Authorization': f'Bearer {self.tokens[user_id]}'}
+        if route == 'login':
+            return route, 'POST', '/api/auth/login', {'email': email, 'password': LOADTEST_PASSWORD}, {}
+        if route == 'plantings':
+            return route, 'GET', '/api/planted-cultures', None, headers
+        if route == 'alerts':
+            return route, 'GET', '/api/alerts', None, headers
+        if route == 'ranking':
+            return route, 'GET', '/api/cultures/ranking', None, headers
+        if route == 'diagnosis':
+            return route, 'POST', '/api/diagnosis-history', {
+                'culture_id': rng.choice(self.culture_ids),
+                'diagnosis_name': rng.choice(self.labels),
+                'photo_path': 'file:///fotos/loadtest.jpg',
+            }, headers
+        raise ValueError(f'Rota desconhecida no mix: {route}')
+
+
+def _make_sender(args, appmod):
+    if args.base_url:
+        import requests
+        session = requests.Session()
+
+        def send(method, path, body, headers):
+            response = session.request(method, args.base_url.rstrip('/') + path, json=body, headers=headers)
+            return response.status_code
+        return send
+
+    client = appmod.app.test_client()
+
+    def send(method, path, body, headers):
+        return client.open(path, method=method, json=body, headers=headers).status_code
+    return send
+
+
+def run_load(args, appmod, workload):
+    results = {}
+    errors = {}
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + args.warmup
+    stop_at = measure_from + args.duration
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        send = _make_sender(args, appmod)
+        local_results, local_errors = {}, {}
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            route, method, path, body, headers = workload.request_for(rng)
+            started = time.perf_counter()
+            status = send(method, path, body, headers)
+            elapsed = time.perf_counter() - started
+            if started < measure_from:
+                continue
+            local_results.setdefault(route, []).append(elapsed)
+            if status >= 400:
+                local_errors[route] = local_errors.get(route, 0) + 1
+        with lock:
+            for route, latencies in local_results.items():
+                results.setdefault(route, []).extend(latencies)
+            for route, count in local_errors.items():
+                errors[route] = errors.get(route, 0) + count
+
+    threads = [threading.Thread(target=worker, args=[i]) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(results, errors, duration):
+    summary = {}
+    for route, latencies in sorted(results.items()):
+        latencies.sort()
+        summary[route] = {
+            'requests': len(latencies),
+            'errors': errors.get(route, 0),
+            'throughput_rps': round(len(latencies) / duration, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        }
+    total = sum(len(latencies) for latencies in results.values())
+    summary['_total'] = {'requests': total, 'throughput_rps': round(total / duration, 2)}
+    return summary
+
+
+def print_summary(summary, baseline=None):
+    print(f"{'rota':<12} {'req':>8} {'erros':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, row in summary.items():
+        if route == '_total':
+            continue
+        line = (f"{route:<12} {row['requests']:>8} {row['errors']:>6} {row['throughput_rps']:>9} "
+                f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+        if baseline and route in baseline:
+            base = baseline[route]
+            deltas = [(row[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+                      for key in ('p50_ms', 'p95_ms', 'p99_ms')]
+            line += '   Δ ' + ' / '.join(f'{delta:+.1f}%' for delta in deltas)
+        print(line)
+    print(f"total: {summary['_total']['requests']} requisições, {summary['_total']['throughput_rps']} req/s")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido'
+
+
+def main():
+    args = parse_args()
+    configure_database(args)
+    import app as appmod
+
+    with appmod.app.app_context():
+        dialect = appmod.db.engine.dialect.name
+        if not args.skip_dataset:
+            generate_dataset(args, appmod)
+        workload = Workload(args, appmod)
+
+    print(f">>> Carga: {args.concurrency} threads, {args.duration}s ({dialect}, commit {git_commit()})")
+    results, errors = run_load(args, appmod, workload)
+    summary = summarize(results, errors, args.duration)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['routes']
+    print_summary(summary, baseline)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    commit = git_commit()
+    path = os.path.join(args.output_dir, f"{datetime.now():%Y%m%d_%H%M%S}_{commit}_{dialect}.json")
+    with open(path, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'dialect': dialect,
+            'timestamp': datetime.now().isoformat(),
+            'config': {key: value for key, value in vars(args).items() if key not in ('compare', 'output_dir')},
+            'routes': summary,
+        }, f, indent=2)
+    print(f">>> Resultado salvo em {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,23 @@
 # create_db.py
-from app import app, db, seed_data
+from app import app, db, seed_data, rebuild_search_index, ensure_search_schemas, migrate_schema, migrate_user_edit_history
+import user_search
 
 print("--- INICIANDO SETUP DA BASE DE DADOS ---")
 with app.app_context():
     print("Criando todas as tabelas...")
     db.create_all()
+    print("Acrescentando colunas e índices novos às tabelas existentes...")
+    added = migrate_schema()
+    print(f">>> {len(added)} colunas acrescentadas{': ' + ', '.join(added) if added else ''}.")
+    print("Migrando o histórico de edições de usuários (se for de uma versão anterior)...")
+    migrated = migrate_user_edit_history()
+    print(f">>> {migrated['folded']} linhas antigas convertidas, {migrated['indexed']} linhas com campos indexados.")
     print("Populando a base de dados com dados iniciais...")
     seed_data()
+    print("Criando o índice de busca textual...")
+    print(f">>> {rebuild_search_index()} dúvidas/sugestões indexadas.")
+    print("Criando os índices da busca de usuários...")
+    print(f">>> {user_search.backfill_search_keys(db.session)} chaves de busca de usuários atualizadas.")
+    db.session.commit()
+    ensure_search_schemas()
     print("--- SETUP DA BASE DE DADOS CONCLUÍDO ---")
@@ -0,0 +1,12 @@
+# detect_outbreaks.py
+# Rotina periódica (cron) que procura surtos de doenças nos diagnósticos e
+# avisa os administradores. Ajustes por variáveis de ambiente: OUTBREAK_WINDOW_DAYS,
+# OUTBREAK_Z_THRESHOLD, OUTBREAK_MIN_COUNT e OUTBREAK_ALERT_DAYS.
+from app import app, detect_outbreaks
+
+print("--- INICIANDO DETECÇÃO DE SURTOS ---")
+with app.app_context():
+    result = detect_outbreaks()
+    print(f">>> {result['series']} séries (cultura, doença) em {result['days']} dias: "
+          f"{result['flagged']} dias sinalizados, {result['alerts']} avisos criados.")
+print("--- DETECÇÃO DE SURTOS CONCLUÍDA ---")
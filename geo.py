@@ -0,0 +1,103 @@
+# geo.py
+# Localização de plantios e diagnósticos.
+#
+# Cada linha com coordenadas guarda também a célula geohash de 5 caracteres
+# (~4,9 x 4,9 km no equador) em geo_cell. Uma busca por raio vira uma lista de
+# células que cobrem o círculo, consultada por igualdade num índice comum
+# (geo_cell, data) — o mesmo no SQLite e no Postgres, sem PostGIS nem R*Tree, e
+# que já filtra a janela de tempo. As células inteiramente dentro do raio são
+# contadas no próprio banco; só as da borda precisam do cálculo de distância.
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+CELL_PRECISION = 5
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def parse_coordinates(latitude, longitude):
+    """(lat, lon) em float, ou (None, None) se ambas ausentes. ValueError se inválidas ou só uma informada."""
+    if latitude in (None, '') and longitude in (None, ''):
+        return None, None
+    latitude, longitude = float(latitude), float(longitude)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("coordenadas fora da faixa")
+    return latitude, longitude
+
+
+def cell_size(precision=CELL_PRECISION):
+    """(altura, largura) das células em graus."""
+    return 180.0 / 2 ** (precision * 5 // 2), 360.0 / 2 ** ((precision * 5 + 1) // 2)
+
+
+def _cell(lat_step, lon_step, precision):
+    """Geohash da célula na linha `lat_step` e coluna `lon_step` da grade: intercala os bits (longitude primeiro)."""
+    lat_bits, lon_bits = precision * 5 // 2, (precision * 5 + 1) // 2
+    lon_step %= 2 ** lon_bits
+    value = 0
+    for bit in range(precision * 5):
+        if bit % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | ((lon_step >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((lat_step >> lat_bits) & 1)
+    return ''.join(_BASE32[(value >> shift) & 31] for shift in range(precision * 5 - 5, -1, -5))
+
+
+def encode(latitude, longitude, precision=CELL_PRECISION):
+    height, width = cell_size(precision)
+    lat_step = min(int((latitude + 90) // height), round(180 / height) - 1)
+    lon_step = min(int((longitude + 180) // width), round(360 / width) - 1)
+    return _cell(lat_step, lon_step, precision)
+
+
+def cell_for(latitude, longitude):
+    """Célula de geo_cell, ou None sem coordenadas."""
+    if latitude is None or longitude is None:
+        return None
+    return encode(latitude, longitude)
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Distância pelo grande círculo (haversine)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_cells(latitude, longitude, radius_km, precision=CELL_PRECISION):
+    """Células que tocam o círculo, separadas em (inside, edge).
+
+    inside: a célula inteira está dentro do raio (os quatro cantos estão).
+    edge:   só parte da célula está; as linhas precisam do teste de distância.
+    """
+    height, width = cell_size(precision)
+    lat_delta = radius_km / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(min(89.0, abs(latitude) + lat_delta)))
+    lon_delta = min(180.0, radius_km / (KM_PER_DEGREE * max(cos_lat, 1e-6)))
+
+    inside, edge = set(), set()
+    lat_start = math.floor((max(-90.0, latitude - lat_delta) + 90) / height)
+    lat_stop = min(math.floor((min(90.0, latitude + lat_delta) + 90) / height), round(180 / height) - 1)
+    lon_start = math.floor((longitude - lon_delta + 180) / width)
+    lon_stop = math.floor((longitude + lon_delta + 180) / width)
+    # Cada vértice da grade é canto de até quatro células: a distância é calculada uma vez só
+    lon_edges = [-180 + step * width for step in range(lon_start, lon_stop + 2)]
+    vertex_inside = [[distance_km(latitude, longitude, -90 + step * height, lon) <= radius_km for lon in lon_edges]
+                     for step in range(lat_start, lat_stop + 2)]
+    for row, lat_step in enumerate(range(lat_start, lat_stop + 1)):
+        lat_min = -90 + lat_step * height
+        nearest_lat = min(max(latitude, lat_min), lat_min + height)
+        below, above = vertex_inside[row], vertex_inside[row + 1]
+        for column, lon_step in enumerate(range(lon_start, lon_stop + 1)):
+            if below[column] and below[column + 1] and above[column] and above[column + 1]:
+                inside.add(_cell(lat_step, lon_step, precision))
+                continue
+            # Limites pela grade (sem dar a volta no antimeridiano, para as distâncias)
+            nearest_lon = min(max(longitude, lon_edges[column]), lon_edges[column + 1])
+            if distance_km(latitude, longitude, nearest_lat, nearest_lon) <= radius_km:
+                edge.add(_cell(lat_step, lon_step, precision))
+    return inside, edge
@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+# Configuração do gunicorn com preload: a aplicação é criada e aquecida uma vez
+# no processo mestre e os workers herdam as páginas de memória por copy-on-write.
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# Variáveis: GUNICORN_BIND (padrão 0.0.0.0:8000), WEB_CONCURRENCY (workers).
+import gc
+import os
+import multiprocessing
+
+wsgi_app = 'app:create_app()'
+preload_app = True
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Sem coleta durante o preload: o GC escreve nos cabeçalhos dos objetos e
+# duplicaria as páginas que deveriam continuar compartilhadas.
+gc.disable()
+
+
+def when_ready(server):
+    from app import warm_up
+    warm_up(server.app.wsgi())
+    # Move tudo o que existe para a geração permanente: o GC dos workers não toca mais nesses objetos
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import after_fork
+    after_fork(server.app.wsgi())
+    gc.enable()
@@ -0,0 +1,356 @@
+# import_data.py
+# Importação em massa para a entrada de cooperativas (membros e plantios existentes).
+#
+# Lê arquivos CSV ou NDJSON (.ndjson/.jsonl) em streaming, gera os hashes de senha
+# num pool de processos e insere em lotes grandes (COPY no Postgres, executemany
+# nos demais bancos). Cada lote é uma transação que também grava o progresso do
+# arquivo (import_checkpoints) e os 'ref' dos plantios, registra as alterações
+# para a sincronização, marca os snapshots da tela inicial dos donos como
+# desatualizados e refaz as recomendações deles. Uma importação interrompida é
+# retomada com o mesmo comando, sem reimportar lotes já confirmados.
+#
+# Colunas esperadas:
+#   usuários:  name, email, password (ou password_hash), user_type (opcional)
+#   interesses: email, culture
+#   plantios:  ref (opcional, usado pelos eventos), email, culture, planting_date, notes,
+#              weather_station (opcional)
+#   eventos:   planting_ref, event_type, event_date (opcional), observation
+#
+# Exemplo:
+#   python import_data.py --users membros.csv --interests interesses.csv \
+#       --plantings plantios.ndjson --events eventos.csv
+import io
+import os
+import csv
+import json
+import time
+import argparse
+import unicodedata
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash
+from sqlalchemy import func, select, literal
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import user_search
+from app import (
+    app, db, User, UserType, Culture, PlantedCulture, HistoryEvent, EventType, SyncChange, user_cultures,
+    mark_home_snapshots_stale, refresh_users_culture_recommendations
+)
+from models import ImportCheckpoint, ImportPlantingRef
+
+MAX_REJECTED_SHOWN = 5
+
+
+def fold(text):
+    """Minúsculas e sem acentos, para casar nomes de cultura ('Café' == 'cafe')."""
+    normalized = unicodedata.normalize('NFKD', text.strip().casefold())
+    return ''.join(ch for ch in normalized if not unicodedata.combining(ch))
+
+
+def read_records(path, skip=0):
+    """Lê CSV ou NDJSON em streaming, pulando os `skip` primeiros registros."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = csv.DictReader(f)
+        for index, record in enumerate(records):
+            if index >= skip:
+                yield record
+
+
+def batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- INSERÇÃO EM LOTE ---
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if hasattr(value, 'name') and isinstance(getattr(value, 'value', None), str):
+        value = value.name  # Enum
+    elif hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def bulk_insert(table, rows):
+    """COPY no Postgres; executemany nos demais bancos. Usa a transação da sessão."""
+    if not rows:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        columns = list(rows[0].keys())
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(row[column]) for column in columns) + '\n')
+        buffer.seek(0)
+        cursor = db.session.connection().connection.cursor()
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", buffer)
+    else:
+        db.session.execute(table.insert(), rows)
+
+
+def record_bulk_sync_changes(entity, new_rows):
+    """Registra na sincronização as linhas inseridas em lote (o INSERT/COPY não passa pelo flush do ORM).
+
+    `new_rows` é um SELECT de (user_id, entity_id).
+    """
+    db.session.execute(SyncChange.__table__.insert().from_select(
+        ['user_id', 'entity', 'entity_id', 'operation'],
+        select(new_rows.c[0], literal(entity), new_rows.c[1], literal('upsert'))
+    ))
+
+
+class Importer:
+    def __init__(self, batch_size, workers):
+        self.batch_size = batch_size
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.cultures = {}
+        self.cycle_days = {}
+        for culture in Culture.query.all():
+            self.cultures[fold(culture.name)] = culture.id
+            self.cycle_days[culture.id] = culture.cycle_days
+        self.user_ids = {}
+
+    def users_changed(self, user_ids):
+        """Tela inicial e recomendações dos donos das linhas do lote, na transação do lote."""
+        mark_home_snapshots_stale(user_ids)
+        refresh_users_culture_recommendations(user_ids)
+
+    def resolve_users(self, emails):
+        """Preenche o mapa email -> id com uma única consulta para os que faltam."""
+        missing = {email for email in emails if email not in self.user_ids}
+        if missing:
+            for user_id, email in db.session.query(User.id, User.email).filter(User.email.in_(missing)):
+                self.user_ids[email] = user_id
+
+    def run(self, kind, path, handler):
+        key = f'{kind}:{os.path.abspath(path)}'
+        checkpoint = db.session.get(ImportCheckpoint, key) or ImportCheckpoint(file_key=key, records_done=0)
+        done = checkpoint.records_done
+        if done:
+            print(f">>> {kind}: retomando {path} a partir do registro {done}.")
+        inserted = rejected = 0
+        started = time.perf_counter()
+        for batch in batches(read_records(path, skip=done), self.batch_size):
+            batch_inserted, batch_rejected = handler(batch)
+            done += len(batch)
+            checkpoint.records_done = done
+            db.session.add(checkpoint)
+            db.session.commit()
+            inserted += batch_inserted
+            rejected += len(batch_rejected)
+            for record, reason in batch_rejected[:max(0, MAX_REJECTED_SHOWN - rejected + len(batch_rejected))]:
+                print(f"    registro rejeitado ({reason}): {record}")
+            elapsed = time.perf_counter() - started
+            print(f"    {kind}: {done} registros lidos, {inserted} inseridos ({inserted / elapsed:,.0f} linhas/s)")
+        elapsed = time.perf_counter() - started
+        rate = inserted / elapsed if elapsed else 0
+        print(f">>> {kind}: {inserted} inseridos, {rejected} rejeitados em {elapsed:.1f}s ({rate:,.0f} linhas/s).")
+        return inserted
+
+    # --- HANDLERS POR TIPO DE ARQUIVO ---
+
+    def import_users(self, batch):
+        rejected = []
+        candidates = {}
+        for record in batch:
+            email = (record.get('email') or '').strip().lower()
+            if not email or not record.get('name') or not (record.get('password') or record.get('password_hash')):
+                rejected.append((record, 'nome, email ou senha em falta'))
+            elif email in candidates:
+                rejected.append((record, 'e-mail repetido no arquivo'))
+            else:
+                candidates[email] = record
+
+        self.resolve_users(candidates)
+        for email in [email for email in candidates if email in self.user_ids]:
+            rejected.append((candidates.pop(email), 'e-mail já registado'))
+
+        plain = [email for email, record in candidates.items() if not record.get('password_hash')]
+        hashes = dict(zip(plain, self.pool.map(generate_password_hash,
+                                               [candidates[email]['password'] for email in plain],
+                                               chunksize=64)))
+        rows = []
+        for email, record in candidates.items():
+            try:
+                user_type = UserType[(record.get('user_type') or 'COMMON').upper()]
+            except KeyError:
+                rejected.append((record, 'user_type inválido'))
+                continue
+            rows.append({
+                'name': record['name'],
+                'email': email,
+                'password_hash': record.get('password_hash') or hashes[email],
+                'user_type': user_type,
+                # O COPY do Postgres não passa pelo default da coluna
+                'search_key': user_search.search_key(record['name'], email),
+            })
+        bulk_insert(User.__table__, rows)
+        self.resolve_users([row['email'] for row in rows])
+        return len(rows), rejected
+
+    def import_interests(self, batch):
+        rejected = []
+        self.resolve_users([(record.get('email') or '').strip().lower() for record in batch])
+        pairs = set()
+        for record in batch:
+            user_id = self.user_ids.get((record.get('email') or '').strip().lower())
+            culture_id = self.cultures.get(fold(record.get('culture') or ''))
+            if user_id is None or culture_id is None:
+                rejected.append((record, 'usuário ou cultura desconhecidos'))
+            else:
+                pairs.add((user_id, culture_id))
+
+        existing = set(db.session.query(user_cultures.c.user_id, user_cultures.c.culture_id).filter(
+            user_cultures.c.user_id.in_({user_id for user_id, _ in pairs})
+        ))
+        rows = [{'user_id': user_id, 'culture_id': culture_id} for user_id, culture_id in pairs - existing]
+        bulk_insert(user_cultures, rows)
+        changed = sorted({row['user_id'] for row in rows})
+        if changed:
+            db.session.execute(SyncChange.__table__.insert(), [
+                {'user_id': user_id, 'entity': 'user_cultures', 'entity_id': user_id, 'operation': 'upsert'}
+                for user_id in changed
+            ])
+            self.users_changed(changed)
+        return len(rows), rejected
+
+    def import_plantings(self, batch):
+        rejected = []
+        self.resolve_users([(record.get('email') or '').strip().lower() for record in batch])
+        rows, refs = [], []
+        for record in batch:
+            user_id = self.user_ids.get((record.get('email') or '').strip().lower())
+            culture_id = self.cultures.get(fold(record.get('culture') or ''))
+            if user_id is None or culture_id is None:
+                rejected.append((record, 'usuário ou cultura desconhecidos'))
+                continue
+            try:
+                planting_date = datetime.strptime(record.get('planting_date') or '', "%Y-%m-%d").date()
+            except ValueError:
+                rejected.append((record, 'planting_date inválida'))
+                continue
+            rows.append({
+                'user_id': user_id,
+                'culture_id': culture_id,
+                'planting_date': planting_date,
+                'predicted_harvest_date': planting_date + timedelta(days=self.cycle_days[culture_id]),
+                'notes': record.get('notes') or None,
+                'weather_station': (record.get('weather_station') or '').strip() or None,
+            })
+            refs.append(record.get('ref'))
+
+        if not rows:
+            return 0, rejected
+        # Os ids são de uma sequência: tudo acima do maior id atual é deste lote ou de escritas concorrentes
+        # (registrá-las de novo na sincronização é inofensivo)
+        last_id = db.session.query(func.coalesce(func.max(PlantedCulture.id), 0)).scalar()
+        if not any(refs):
+            bulk_insert(PlantedCulture.__table__, rows)
+        else:
+            # Os eventos referenciam plantios pelo 'ref', então precisamos dos ids gerados
+            ids = db.session.execute(
+                PlantedCulture.__table__.insert().returning(PlantedCulture.id, sort_by_parameter_order=True),
+                rows
+            ).scalars().all()
+            insert = sqlite_insert if db.engine.dialect.name == 'sqlite' else postgresql_insert
+            statement = insert(ImportPlantingRef.__table__)
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['ref'], set_={'planted_culture_id': statement.excluded.planted_culture_id}
+            ), list({str(ref): {'ref': str(ref), 'planted_culture_id': planting_id}
+                     for ref, planting_id in zip(refs, ids) if ref}.values()))
+
+        owners = sorted({row['user_id'] for row in rows})
+        record_bulk_sync_changes('planted_culture', select(PlantedCulture.user_id, PlantedCulture.id).where(
+            PlantedCulture.id > last_id, PlantedCulture.user_id.in_(owners)
+        ).subquery())
+        self.users_changed(owners)
+        return len(rows), rejected
+
+    def import_events(self, batch):
+        rejected = []
+        rows = []
+        refs = {str(record.get('planting_ref')) for record in batch}
+        planting_ids = dict(db.session.query(ImportPlantingRef.ref, ImportPlantingRef.planted_culture_id).filter(
+            ImportPlantingRef.ref.in_(refs)
+        ))
+        for record in batch:
+            planting_id = planting_ids.get(str(record.get('planting_ref')))
+            if planting_id is None:
+                rejected.append((record, 'planting_ref desconhecido'))
+                continue
+            try:
+                event_type = EventType[(record.get('event_type') or '').upper()]
+                event_date = (datetime.fromisoformat(record['event_date'])
+                              if record.get('event_date') else datetime.utcnow())
+            except (KeyError, ValueError):
+                rejected.append((record, 'event_type ou event_date inválidos'))
+                continue
+            rows.append({
+                'planted_culture_id': planting_id,
+                'event_type': event_type,
+                'event_date': event_date,
+                'observation': record.get('observation') or None,
+            })
+        if not rows:
+            return 0, rejected
+        plantings = sorted({row['planted_culture_id'] for row in rows})
+        last_id = db.session.query(func.coalesce(func.max(HistoryEvent.id), 0)).scalar()
+        bulk_insert(HistoryEvent.__table__, rows)
+
+        record_bulk_sync_changes('history_event', select(PlantedCulture.user_id, HistoryEvent.id).join(
+            PlantedCulture, HistoryEvent.planted_culture_id == PlantedCulture.id
+        ).where(HistoryEvent.id > last_id, HistoryEvent.planted_culture_id.in_(plantings)).subquery())
+        # Um evento de colheita fecha o plantio: muda a tela inicial, não as recomendações
+        mark_home_snapshots_stale(select(PlantedCulture.user_id).where(PlantedCulture.id.in_(plantings)))
+        return len(rows), rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importação em massa de membros e plantios de cooperativas.")
+    parser.add_argument('--users')
+    parser.add_argument('--interests')
+    parser.add_argument('--plantings')
+    parser.add_argument('--events')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print("--- INICIANDO IMPORTAÇÃO EM MASSA ---")
+    started = time.perf_counter()
+    total = 0
+    with app.app_context():
+        importer = Importer(args.batch_size, args.workers)
+        try:
+            for kind, path, handler in (
+                ('usuários', args.users, importer.import_users),
+                ('interesses', args.interests, importer.import_interests),
+                ('plantios', args.plantings, importer.import_plantings),
+                ('eventos', args.events, importer.import_events),
+            ):
+                if path:
+                    total += importer.run(kind, path, handler)
+        finally:
+            importer.pool.shutdown()
+    elapsed = time.perf_counter() - started
+    print(f"--- IMPORTAÇÃO CONCLUÍDA: {total} linhas em {elapsed:.1f}s ({total / elapsed:,.0f} linhas/s) ---")
+    print("Obs: nenhum e-mail de boas-vindas é enviado na importação em massa.")
+
+
+if __name__ == '__main__':
+    main()
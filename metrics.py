@@ -0,0 +1,275 @@
+# metrics.py
+# Métricas da API no formato de texto do Prometheus.
+#
+# Cada thread agrega em seu próprio "shard" (sem lock no caminho da requisição);
+# os shards só são somados na hora da coleta. Com gunicorn, defina
+# METRICS_MULTIPROC_DIR para que cada worker grave seu snapshot em disco e o
+# /metrics de qualquer worker devolva a soma de todos eles.
+#
+# O /metrics só existe com METRICS_TOKEN definido (e exige
+# "Authorization: Bearer <token>"): sem o token a rota nem é registrada.
+import os
+import hmac
+import json
+import time
+import threading
+import weakref
+from bisect import bisect_left
+
+from flask import request, g, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# nome -> (tipo, ajuda, buckets)
+METRIC_DEFINITIONS = {
+    'plantdoctor_http_requests_total': ('counter', 'Requisições HTTP por rota, método e status.', None),
+    'plantdoctor_http_request_duration_seconds': ('histogram', 'Latência das requisições HTTP.', LATENCY_BUCKETS),
+    'plantdoctor_sql_statements_per_request': ('histogram', 'Instruções SQL executadas por requisição.', SQL_COUNT_BUCKETS),
+    'plantdoctor_sql_seconds_per_request': ('histogram', 'Tempo gasto em SQL por requisição.', LATENCY_BUCKETS),
+    'plantdoctor_sql_statements_total': ('counter', 'Total de instruções SQL executadas.', None),
+    'plantdoctor_sql_seconds_total': ('counter', 'Tempo total gasto em SQL.', None),
+    'plantdoctor_email_sends_total': ('counter', 'Envios de e-mail pelo Brevo por resultado.', None),
+    'plantdoctor_password_hash_seconds': ('histogram', 'Tempo de geração/verificação de hash de senha.', HASH_BUCKETS),
+    'plantdoctor_response_cache_requests_total': ('counter', 'Consultas ao cache de respostas por rota e resultado (hit/miss).', None),
+    'plantdoctor_response_cache_evictions_total': ('counter', 'Entradas despejadas do cache de respostas local por falta de espaço.', None),
+}
+
+
+class _Shard:
+    """Agregados de uma única thread. Só a thread dona escreve aqui."""
+
+    def __init__(self):
+        self.thread = weakref.ref(threading.current_thread())
+        self.counters = {}
+        self.histograms = {}
+
+
+class MetricsRegistry:
+    def __init__(self, definitions=METRIC_DEFINITIONS):
+        self.definitions = definitions
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        # Agregado das threads que já terminaram (ex: threads de e-mail)
+        self._retired = _Shard()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = _Shard()
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        counters = self._shard().counters
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histograms = self._shard().histograms
+        series = histograms.get(key)
+        if series is None:
+            buckets = self.definitions[name][2]
+            series = histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.definitions[name][2], value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def snapshot(self):
+        """Soma os shards de todas as threads deste processo."""
+        counters, histograms = {}, {}
+        with self._shards_lock:
+            alive = []
+            for shard in self._shards:
+                if shard.thread() is None or not shard.thread().is_alive():
+                    _merge_into(self._retired.counters, self._retired.histograms,
+                                shard.counters.copy(), shard.histograms.copy())
+                else:
+                    alive.append(shard)
+            self._shards = alive
+            shards = alive + [self._retired]
+            for shard in shards:
+                _merge_into(counters, histograms, shard.counters.copy(), shard.histograms.copy())
+        return counters, histograms
+
+
+def _merge_into(counters, histograms, other_counters, other_histograms):
+    for key, value in other_counters.items():
+        counters[key] = counters.get(key, 0) + value
+    for key, (bucket_counts, total, count) in other_histograms.items():
+        series = histograms.get(key)
+        if series is None:
+            histograms[key] = [list(bucket_counts), total, count]
+        else:
+            series[0] = [a + b for a, b in zip(series[0], bucket_counts)]
+            series[1] += total
+            series[2] += count
+
+
+# --- AGREGAÇÃO ENTRE WORKERS (GUNICORN) ---
+
+def _dump(counters, histograms):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, series] for (name, labels), series in histograms.items()],
+    }
+
+
+def _load(data):
+    counters = {(name, tuple(map(tuple, labels))): value for name, labels, value in data['counters']}
+    histograms = {(name, tuple(map(tuple, labels))): series for name, labels, series in data['histograms']}
+    return counters, histograms
+
+
+class MultiprocessWriter:
+    """Grava o snapshot do worker em METRICS_MULTIPROC_DIR, no máximo a cada `interval` segundos."""
+
+    def __init__(self, registry, directory, interval=5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            path = os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(_dump(*self.registry.snapshot()), f)
+            os.replace(tmp_path, path)
+        finally:
+            self._lock.release()
+
+    def collect(self):
+        """Soma os snapshots de todos os workers (inclusive os que já morreram)."""
+        self.flush()
+        counters, histograms = {}, {}
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith('metrics_') and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    other_counters, other_histograms = _load(json.load(f))
+            except (OSError, ValueError):
+                continue
+            _merge_into(counters, histograms, other_counters, other_histograms)
+        return counters, histograms
+
+
+# --- FORMATO DE TEXTO DO PROMETHEUS ---
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render(counters, histograms, definitions=METRIC_DEFINITIONS):
+    lines = []
+    for name, (kind, help_text, buckets) in definitions.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        else:
+            for (metric, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ['+Inf'], bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+# --- INTEGRAÇÃO COM FLASK E SQLALCHEMY ---
+
+registry = MetricsRegistry()
+_request_state = threading.local()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['metrics_query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_query_start']
+    registry.inc('plantdoctor_sql_statements_total')
+    registry.inc('plantdoctor_sql_seconds_total', elapsed)
+    if getattr(_request_state, 'active', False):
+        _request_state.sql_count += 1
+        _request_state.sql_time += elapsed
+
+
+def request_sql_stats():
+    """(instruções, segundos) de SQL da requisição atual desta thread."""
+    return getattr(_request_state, 'sql_count', 0), getattr(_request_state, 'sql_time', 0.0)
+
+
+def init_app(app):
+    """Registra os hooks de métricas em todas as rotas e, com METRICS_TOKEN, o endpoint /metrics."""
+    directory = os.environ.get('METRICS_MULTIPROC_DIR')
+    writer = MultiprocessWriter(registry, directory) if directory else None
+    token = os.environ.get('METRICS_TOKEN')
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        _request_state.active = True
+        _request_state.sql_count = 0
+        _request_state.sql_time = 0.0
+
+    @app.after_request
+    def _record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        method = request.method
+        registry.inc('plantdoctor_http_requests_total', method=method, route=route, status=str(response.status_code))
+        registry.observe('plantdoctor_http_request_duration_seconds', time.perf_counter() - started,
+                         method=method, route=route)
+        registry.observe('plantdoctor_sql_statements_per_request', _request_state.sql_count, method=method, route=route)
+        registry.observe('plantdoctor_sql_seconds_per_request', _request_state.sql_time, method=method, route=route)
+        _request_state.active = False
+        if writer:
+            writer.maybe_flush()
+        return response
+
+    if not token:
+        # Sem token não há como proteger a rota: as métricas continuam sendo
+        # coletadas (e gravadas em METRICS_MULTIPROC_DIR), mas não são expostas
+        app.logger.warning("METRICS_TOKEN não definido: endpoint /metrics desativado.")
+        return
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return Response('Não autorizado.\n', status=401, mimetype='text/plain')
+        counters, histograms = writer.collect() if writer else registry.snapshot()
+        return Response(render(counters, histograms), mimetype='text/plain; version=0.0.4')
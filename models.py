@@ -1,18 +1,29 @@
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.sql import func
-from sqlalchemy import Enum as SQLAlchemyEnum, Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Date
-from sqlalchemy.orm import relationship
+# models.py
+# Modelos do banco de dados (SQLAlchemy) e o registro automático de alterações
+# para a sincronização offline. Importado pelo app, pelos scripts e pelo modo ASGI.
 import enum
 
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, select, Enum as SQLAlchemyEnum
+from sqlalchemy.orm import deferred, Session
+from sqlalchemy import event as sa_event, inspect as sa_inspect
+
+import user_search
+import geo
+
 db = SQLAlchemy()
 
+def geo_cell_default(context):
+    """Célula geohash a partir de latitude/longitude do INSERT (ver geo.py)."""
+    params = context.get_current_parameters()
+    return geo.cell_for(params.get('latitude'), params.get('longitude'))
+
 # Tabela de associação
 user_cultures = db.Table('user_cultures',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
     db.Column('culture_id', db.Integer, db.ForeignKey('culture.id'), primary_key=True)
 )
 
-# ▼▼▼ ENUM PARA O TIPO DE USUÁRIO ▼▼▼
 class UserType(enum.Enum):
     COMMON = "COMMON"
     ADMIN = "ADMIN"
@@ -22,21 +33,30 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
     email = db.Column(db.String(150), unique=True, nullable=False)
-    password_hash = db.Column(db.Text, nullable=False)
+    # Só as rotas de autenticação precisam do hash: carregado com undefer(User.password_hash)
+    password_hash = deferred(db.Column(db.Text, nullable=False))
     created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
-
-    # ▼▼▼ COLUNA DO TIPO DE USUÁRIO ▼▼▼
     user_type = db.Column(SQLAlchemyEnum(UserType), nullable=False, default=UserType.COMMON)
+    # "nome e-mail" sem acentos, para a busca da administração (ver user_search.py)
+    search_key = db.Column(db.String(301), nullable=False, default=lambda context: user_search.search_key(
+        context.get_current_parameters().get('name'), context.get_current_parameters().get('email')))
 
-    cultures = db.relationship('Culture', secondary=user_cultures, lazy='subquery',
-                                 backref=db.backref('interested_users', lazy=True))
+    # Carregado sob demanda; rotas que usam o conjunto pedem selectinload(User.cultures)
+    cultures = db.relationship('Culture', secondary=user_cultures, lazy='select',
+                                backref=db.backref('interested_users', lazy=True))
     
     planted_cultures = db.relationship('PlantedCulture', backref='user', lazy=True, cascade="all, delete-orphan")
+    
+    diagnosis_history = db.relationship('DiagnosisHistory', backref='user', lazy=True)
+    doubts = db.relationship('Doubt', backref='author', lazy=True)
+    suggestions = db.relationship('Suggestion', backref='author', lazy=True)
+    edit_history = db.relationship('UserEditHistory', foreign_keys='UserEditHistory.edited_user_id', backref='edited_user')
+    reset_tokens = db.relationship('PasswordResetToken', backref='user', lazy=True)
+    alerts = db.relationship('Alert', backref='user', lazy=True) # Relacionamento de alertas
 
     def __repr__(self):
         return f'<User {self.email}>'
     
-    # ▼▼▼ FUNÇÃO to_dict PARA RETORNAR DADOS DO USUÁRIO ▼▼▼
     def to_dict(self):
         return {
             'id': self.id,
@@ -51,6 +71,9 @@ class Culture(db.Model):
     name = db.Column(db.String(50), unique=True, nullable=False)
     image_url = db.Column(db.String(255), nullable=False)
     cycle_days = db.Column(db.Integer, nullable=False, default=90)
+    
+    planted_instances = db.relationship('PlantedCulture', backref='culture')
+    diagnosis_history = db.relationship('DiagnosisHistory', backref='culture')
 
     def to_dict(self):
         return {
@@ -67,23 +90,43 @@ class PlantedCulture(db.Model):
     planting_date = db.Column(db.Date, nullable=False)
     predicted_harvest_date = db.Column(db.Date, nullable=True)
     notes = db.Column(db.Text, nullable=True)
+    # Código da estação meteorológica mais próxima (ex: 'A701'), usado no risco de doenças pelo clima
+    weather_station = db.Column(db.String(64), nullable=True)
+    # Localização opcional; geo_cell é a célula geohash usada nas buscas por raio
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.String(12), nullable=True, default=geo_cell_default)
+    updated_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, default=func.now(), server_default=func.now(),
+                           onupdate=func.now())
     
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     culture_id = db.Column(db.Integer, db.ForeignKey('culture.id'), nullable=False)
     
-    culture = db.relationship('Culture', backref='planted_instances')
     history_events = db.relationship('HistoryEvent', backref='planted_culture', lazy=True, cascade="all, delete-orphan")
 
-    def to_dict(self):
-        return {
+    # Índices para as consultas por intervalo de colheita (calendário e lembretes)
+    __table_args__ = (
+        db.Index('ix_planted_culture_user_harvest', 'user_id', 'predicted_harvest_date'),
+        db.Index('ix_planted_culture_harvest', 'predicted_harvest_date'),
+        db.Index('ix_planted_culture_culture', 'culture_id'),
+        db.Index('ix_planted_culture_station', 'weather_station'),
+    )
+
+    def to_dict(self, include_history=True):
+        data = {
             'id': self.id,
             'planting_date': self.planting_date.isoformat(),
             'predicted_harvest_date': self.predicted_harvest_date.isoformat() if self.predicted_harvest_date else None,
             'notes': self.notes,
+            'weather_station': self.weather_station,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
             'user_id': self.user_id,
-            'culture': self.culture.to_dict(),
-            'history_events': [event.to_dict() for event in self.history_events]
+            'culture': self.culture.to_dict()
         }
+        if include_history:
+            data['history_events'] = [event.to_dict() for event in self.history_events]
+        return data
 
 class EventType(enum.Enum):
     PLANTIO = "PLANTIO"
@@ -100,9 +143,15 @@ class HistoryEvent(db.Model):
     event_date = db.Column(db.DateTime, nullable=False, default=func.now())
     event_type = db.Column(SQLAlchemyEnum(EventType), nullable=False)
     observation = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, default=func.now(), server_default=func.now(),
+                           onupdate=func.now())
     
     planted_culture_id = db.Column(db.Integer, db.ForeignKey('planted_culture.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_history_event_planting_type', 'planted_culture_id', 'event_type'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -111,21 +160,29 @@ class HistoryEvent(db.Model):
             'observation': self.observation
         }
 
-# --- ✅ NOVO MODELO DE HISTÓRICO DE DIAGNÓSTICO (IA) ---
 class DiagnosisHistory(db.Model):
     __tablename__ = 'diagnosis_history'
     
     id = db.Column(db.Integer, primary_key=True)
-    diagnosis_name = db.Column(db.String(255), nullable=False) # Ex: "Míldio"
-    observation = db.Column(db.Text, nullable=True) # Ex: "IA detectou com 95%..."
-    photo_path = db.Column(db.String(512), nullable=False) # URI da foto salva
+    diagnosis_name = db.Column(db.String(255), nullable=False)
+    observation = db.Column(db.Text, nullable=True)
+    photo_path = db.Column(db.String(512), nullable=False)
     analysis_date = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    updated_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, default=func.now(), server_default=func.now(),
+                           onupdate=func.now())
+    # Localização opcional; geo_cell é a célula geohash usada nas buscas por raio
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.String(12), nullable=True, default=geo_cell_default)
     
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     culture_id = db.Column(db.Integer, db.ForeignKey('culture.id'), nullable=False)
-    
-    user = db.relationship('User', backref='diagnosis_history')
-    culture = db.relationship('Culture', backref='diagnosis_history')
+
+    # Busca por raio e período (/api/diagnoses/nearby): igualdade na célula + intervalo de data.
+    # Cobre também as colunas lidas, então a consulta não visita a tabela.
+    __table_args__ = (
+        db.Index('ix_diagnosis_history_geo', 'geo_cell', 'analysis_date', 'diagnosis_name', 'latitude', 'longitude'),
+    )
 
     def to_dict(self):
         return {
@@ -134,12 +191,12 @@ class DiagnosisHistory(db.Model):
             'observation': self.observation,
             'photo_path': self.photo_path,
             'analysis_date': self.analysis_date.isoformat(),
-            'culture_name': self.culture.name, # Envia o nome da cultura
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'culture_name': self.culture.name,
             'culture_id': self.culture_id,
             'user_id': self.user_id
         }
-# --- FIM DO NOVO MODELO ---
-
 
 class Doubt(db.Model):
     __tablename__ = 'doubts'
@@ -149,12 +206,14 @@ class Doubt(db.Model):
     created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
     is_anonymous = db.Column(db.Boolean, default=False, nullable=False)
     
-    # NOVOS CAMPOS PARA A RESPOSTA
     reply_text = db.Column(db.Text, nullable=True)
     replied_at = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    author = db.relationship('User', backref='doubts')
+
+    __table_args__ = (
+        db.Index('ix_doubts_replied_at', 'replied_at'),
+    )
 
     def to_dict(self):
         return {
@@ -174,12 +233,10 @@ class Suggestion(db.Model):
     created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
     is_anonymous = db.Column(db.Boolean, default=False, nullable=False)
     
-    # NOVOS CAMPOS PARA A RESPOSTA
     reply_text = db.Column(db.Text, nullable=True)
     replied_at = db.Column(db.TIMESTAMP(timezone=True), nullable=True)
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    author = db.relationship('User', backref='suggestions')
 
     def to_dict(self):
         return {
@@ -191,9 +248,6 @@ class Suggestion(db.Model):
             'replied_at': self.replied_at.isoformat() if self.replied_at else None
         }
 
-# ==========================================
-# NOVA CLASSE DE AVISOS (ALERTAS)
-# ==========================================
 class Alert(db.Model):
     __tablename__ = 'alerts'
 
@@ -204,7 +258,13 @@ class Alert(db.Model):
     created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
     
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    user = db.relationship('User', backref='alerts')
+
+    # Chave de deduplicação para avisos gerados em lote (ex: 'harvest:<plantio>:<dia>')
+    dedup_key = db.Column(db.String(100), nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'dedup_key', name='uq_alerts_user_dedup'),
+    )
 
     def to_dict(self):
         return {
@@ -217,55 +277,264 @@ class Alert(db.Model):
         }
 
 class UserEditHistory(db.Model):
-    """ Registra as alterações feitas nos perfis de usuário. """
     __tablename__ = 'user_edit_history'
     
     id = db.Column(db.Integer, primary_key=True)
-    
-    # Qual usuário foi editado
     edited_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    
-    # Quem fez a edição (o admin logado)
     edited_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    
-    field_changed = db.Column(db.String(50), nullable=False) # Ex: 'name', 'email', 'user_type'
-    old_value = db.Column(db.Text, nullable=True)
-    new_value = db.Column(db.Text, nullable=True)
+    field_changed = db.Column(db.String(255), nullable=False) # campos alterados, separados por vírgula
+    changes = db.Column(db.JSON, nullable=False) # [{'field', 'old_value', 'new_value'}, ...]
     changed_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
 
-    # Relações para podermos buscar os nomes
-    edited_user = db.relationship('User', foreign_keys=[edited_user_id], backref='edit_history')
     editor = db.relationship('User', foreign_keys=[edited_by_user_id])
+    fields = db.relationship('UserEditHistoryField', lazy=True, cascade="all, delete-orphan")
 
-    def to_dict(self):
+    # Histórico por usuário, feed por admin e por período (todos em ordem de id)
+    __table_args__ = (
+        db.Index('ix_user_edit_history_user_id', 'edited_user_id', 'id'),
+        db.Index('ix_user_edit_history_editor_id', 'edited_by_user_id', 'id'),
+        db.Index('ix_user_edit_history_changed_at', 'changed_at', 'id'),
+    )
+
+    def to_dict(self, editor_name=None):
         return {
             'id': self.id,
+            'edited_user_id': self.edited_user_id,
+            'edited_by_user_id': self.edited_by_user_id,
             'field_changed': self.field_changed,
-            'old_value': self.old_value,
-            'new_value': self.new_value,
+            'changes': self.changes,
             'changed_at': self.changed_at.isoformat(),
-            'editor_name': self.editor.name
+            'editor_name': editor_name if editor_name is not None else self.editor.name
         }
 
-# ▼▼▼ NOVO: MODELO PARA RASTREAR TOKENS DE RECUPERAÇÃO DE SENHA ▼▼▼
+class UserEditHistoryField(db.Model):
+    """ Um campo alterado numa linha de user_edit_history: a chave (campo, id da
+    linha) atende o filtro por campo do feed de auditoria em ordem de id. """
+    __tablename__ = 'user_edit_history_fields'
+
+    field = db.Column(db.String(50), primary_key=True)
+    history_id = db.Column(db.Integer, db.ForeignKey('user_edit_history.id'), primary_key=True)
+
 class PasswordResetToken(db.Model):
-    """ Armazena tokens temporários para redefinição de senha. """
     __tablename__ = 'password_reset_tokens'
     
     id = db.Column(db.Integer, primary_key=True)
-    
-    # Chave estrangeira para o usuário
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    
-    # O token de redefinição real (JWT)
     token = db.Column(db.String(512), unique=True, nullable=False)
-    
-    # Data e hora de expiração do token
     expires_at = db.Column(db.DateTime, nullable=False)
     
-    # Relacionamento com o usuário
-    user = db.relationship('User', backref='reset_tokens')
-    
     def __repr__(self):
         return f"<PasswordResetToken user_id={self.user_id}>"
 
+class TokenRevocation(db.Model):
+    """ JWT revogados: um token (`jti`, no logout) ou, com jti nulo, todos os tokens
+    do usuário emitidos antes de `revoked_at` (troca de senha ou de papel).
+
+    Lida por cada worker de forma incremental (ver revocation.py); a linha pode
+    ser apagada depois de `expires_at`, quando os tokens que ela cobre já expiraram.
+    """
+    __tablename__ = 'token_revocations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    jti = db.Column(db.String(36), nullable=True, index=True)
+    revoked_at = db.Column(db.DateTime, nullable=False, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class SyncChange(db.Model):
+    """ Log de alterações por usuário, consumido pelo /api/sync. """
+    __tablename__ = 'sync_changes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    entity = db.Column(db.String(30), nullable=False) # 'planted_culture', 'history_event', 'diagnosis', 'user_cultures'
+    entity_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False) # 'upsert' ou 'delete'
+    changed_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        db.Index('ix_sync_changes_user_id', 'user_id', 'id'),
+    )
+
+class HomeSnapshot(db.Model):
+    """ Documento pronto da tela inicial do usuário, servido pelo /api/home.
+
+    Reescrito pelas rotas de escrita que o afetam; rotinas em lote só marcam
+    `stale` e o documento é refeito na próxima leitura.
+    """
+    __tablename__ = 'home_snapshots'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    stale = db.Column(db.Boolean, nullable=False, default=False)
+    built_at = db.Column(db.DateTime, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+
+class CultureCooccurrence(db.Model):
+    """ Modelo de recomendação de culturas (ver recommendations.py), refeito por
+    rebuild_culture_recommendations. Uma linha por par de culturas com usuários em
+    comum; na diagonal (culture_id == other_culture_id) `users` é a popularidade.
+    """
+    __tablename__ = 'culture_cooccurrence'
+
+    culture_id = db.Column(db.Integer, db.ForeignKey('culture.id'), primary_key=True, autoincrement=False)
+    other_culture_id = db.Column(db.Integer, db.ForeignKey('culture.id'), primary_key=True, autoincrement=False)
+    users = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class CultureRecommendation(db.Model):
+    """ Culturas recomendadas ao usuário, prontas para servir ([{culture_id, score}]).
+
+    Refeitas para todos no rebuild periódico e, para o próprio usuário, nas rotas
+    que mudam seus interesses ou plantios.
+    """
+    __tablename__ = 'culture_recommendations'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    built_at = db.Column(db.DateTime, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+
+# --- PROGRESSO DA IMPORTAÇÃO EM MASSA (import_data.py) ---
+# Gravados na mesma transação de cada lote: um lote confirmado nunca é reimportado.
+class ImportCheckpoint(db.Model):
+    """ Registros já importados de cada arquivo ('<tipo>:<caminho absoluto>'). """
+    __tablename__ = 'import_checkpoints'
+
+    file_key = db.Column(db.String(1024), primary_key=True)
+    records_done = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+
+class ImportPlantingRef(db.Model):
+    """ 'ref' de um plantio importado -> id gerado, usado pelo arquivo de eventos. """
+    __tablename__ = 'import_planting_refs'
+
+    ref = db.Column(db.String(255), primary_key=True)
+    planted_culture_id = db.Column(db.Integer, nullable=False)
+
+# --- TABELAS DE ARQUIVO (DADOS FRIOS) ---
+# Plantios colhidos e avisos lidos antigos saem das tabelas principais para estas,
+# mantendo os mesmos ids (ver archive_cold_data). São só de leitura.
+class ArchivedPlantedCulture(db.Model):
+    __tablename__ = 'planted_culture_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    planting_date = db.Column(db.Date, nullable=False)
+    predicted_harvest_date = db.Column(db.Date, nullable=True)
+    notes = db.Column(db.Text, nullable=True)
+    weather_station = db.Column(db.String(64), nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.String(12), nullable=True)
+    updated_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    archived_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    culture_id = db.Column(db.Integer, db.ForeignKey('culture.id'), nullable=False)
+
+    culture = db.relationship('Culture')
+    history_events = db.relationship('ArchivedHistoryEvent', lazy=True, order_by='ArchivedHistoryEvent.id')
+
+    __table_args__ = (
+        db.Index('ix_planted_culture_archive_user_id', 'user_id', 'id'),
+    )
+
+    def to_dict(self, include_history=True):
+        data = PlantedCulture.to_dict(self, include_history)
+        data['archived'] = True
+        return data
+
+class ArchivedHistoryEvent(db.Model):
+    __tablename__ = 'history_event_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    event_date = db.Column(db.DateTime, nullable=False)
+    event_type = db.Column(SQLAlchemyEnum(EventType), nullable=False)
+    observation = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+
+    planted_culture_id = db.Column(db.Integer, db.ForeignKey('planted_culture_archive.id'), nullable=False, index=True)
+
+    def to_dict(self):
+        return HistoryEvent.to_dict(self)
+
+class ArchivedAlert(db.Model):
+    __tablename__ = 'alerts_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    is_read = db.Column(db.Boolean, nullable=False)
+    created_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    archived_at = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    dedup_key = db.Column(db.String(100), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_alerts_archive_user_created', 'user_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        data = Alert.to_dict(self)
+        data['archived'] = True
+        return data
+
+# --- CHAVE DE BUSCA DE USUÁRIOS ---
+# Inserções já recebem a chave pelo default da coluna; edições de nome/e-mail a refazem aqui.
+@sa_event.listens_for(User, 'before_update')
+def refresh_user_search_key(mapper, connection, target):
+    state = sa_inspect(target)
+    if state.attrs.name.history.has_changes() or state.attrs.email.history.has_changes():
+        target.search_key = user_search.search_key(target.name, target.email)
+
+# --- CÉLULA GEOGRÁFICA DE PLANTIOS E DIAGNÓSTICOS ---
+# Inserções recebem a célula pelo default da coluna; mudanças de coordenadas a refazem aqui.
+@sa_event.listens_for(PlantedCulture, 'before_update')
+@sa_event.listens_for(DiagnosisHistory, 'before_update')
+def refresh_geo_cell(mapper, connection, target):
+    state = sa_inspect(target)
+    if state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes():
+        target.geo_cell = geo.cell_for(target.latitude, target.longitude)
+
+# --- REGISTRO AUTOMÁTICO DE ALTERAÇÕES PARA SINCRONIZAÇÃO ---
+SYNC_ENTITIES = {PlantedCulture: 'planted_culture', HistoryEvent: 'history_event', DiagnosisHistory: 'diagnosis'}
+
+@sa_event.listens_for(Session, 'after_flush')
+def record_sync_changes(session, flush_context):
+    """Grava no sync_changes, na mesma transação, tudo o que o flush criou, alterou ou apagou."""
+    pending = []  # (entidade, objeto, operação)
+    for obj in session.new:
+        if type(obj) in SYNC_ENTITIES:
+            pending.append((SYNC_ENTITIES[type(obj)], obj, 'upsert'))
+    for obj in session.dirty:
+        if type(obj) in SYNC_ENTITIES and session.is_modified(obj, include_collections=False):
+            pending.append((SYNC_ENTITIES[type(obj)], obj, 'upsert'))
+        elif isinstance(obj, User) and sa_inspect(obj).attrs.cultures.history.has_changes():
+            pending.append(('user_cultures', obj, 'upsert'))
+    for obj in session.deleted:
+        if type(obj) in SYNC_ENTITIES:
+            pending.append((SYNC_ENTITIES[type(obj)], obj, 'delete'))
+    if not pending:
+        return
+
+    # Eventos de histórico pertencem ao dono do plantio (que pode estar sendo apagado
+    # neste mesmo flush); os demais donos saem de uma única consulta
+    owners = {obj.id: obj.user_id for entity, obj, _ in pending if entity == 'planted_culture'}
+    planting_ids = {obj.planted_culture_id for entity, obj, _ in pending
+                    if entity == 'history_event' and obj.planted_culture_id not in owners}
+    if planting_ids:
+        owners.update(session.connection().execute(
+            select(PlantedCulture.id, PlantedCulture.user_id).where(PlantedCulture.id.in_(planting_ids))
+        ).all())
+
+    rows = []
+    for entity, obj, operation in pending:
+        if entity == 'history_event':
+            user_id = owners.get(obj.planted_culture_id)
+        elif entity == 'user_cultures':
+            user_id = obj.id
+        else:
+            user_id = obj.user_id
+        if user_id is not None:
+            rows.append({'user_id': user_id, 'entity': entity, 'entity_id': obj.id, 'operation': operation})
+    if rows:
+        session.connection().execute(SyncChange.__table__.insert(), rows)
@@ -0,0 +1,77 @@
+# outbreaks.py
+# Detecção de surtos nos diagnósticos: contagens diárias por (cultura, doença)
+# numa matriz NumPy (uma linha por série, uma coluna por dia) e dois detectores
+# calculados de uma vez para todas as séries:
+#
+#   - pico:      z-score da contagem do dia contra a média/desvio dos `window`
+#                dias anteriores (somas acumuladas, sem laço por série)
+#   - tendência: carta de controle EWMA, que acusa subidas menores mas
+#                sustentadas que o z-score de um dia só não pega
+#
+# O desvio tem piso de Poisson (sqrt da média), para que séries quase sempre em
+# zero não disparem com um ou dois diagnósticos. Um dia só é sinalizado com pelo
+# menos `min_count` diagnósticos e `window` dias de histórico antes dele.
+import numpy as np
+
+DEFAULT_WINDOW = 28
+DEFAULT_Z_THRESHOLD = 3.0
+DEFAULT_MIN_COUNT = 5
+DEFAULT_ALPHA = 0.3
+DEFAULT_EWMA_LIMIT = 3.5
+
+
+def daily_matrix(series, days, counts, n_series, n_days):
+    """Matriz (n_series, n_days) float64 a partir de trincas (série, dia, contagem)."""
+    flat = np.asarray(series, dtype=np.int64) * n_days + np.asarray(days, dtype=np.int64)
+    totals = np.bincount(flat, weights=np.asarray(counts, dtype=np.float64), minlength=n_series * n_days)
+    return totals.reshape(n_series, n_days)
+
+
+def rolling_baseline(matrix, window):
+    """Média e desvio dos `window` dias anteriores a cada dia (NaN sem histórico suficiente)."""
+    n_series, n_days = matrix.shape
+    mean = np.full(matrix.shape, np.nan)
+    std = np.full(matrix.shape, np.nan)
+    if n_days <= window:
+        return mean, std
+    zeros = np.zeros((n_series, 1))
+    sums = np.concatenate([zeros, np.cumsum(matrix, axis=1)], axis=1)
+    squares = np.concatenate([zeros, np.cumsum(matrix * matrix, axis=1)], axis=1)
+    # Dia t usa [t - window, t): sums[:, t] - sums[:, t - window]
+    window_sum = sums[:, window:n_days] - sums[:, :n_days - window]
+    window_squares = squares[:, window:n_days] - squares[:, :n_days - window]
+    mean[:, window:] = window_sum / window
+    std[:, window:] = np.sqrt(np.maximum(window_squares / window - mean[:, window:] ** 2, 0.0))
+    return mean, std
+
+
+def ewma(matrix, alpha):
+    """Média móvel exponencial ao longo dos dias, para todas as séries de uma vez."""
+    result = np.empty_like(matrix)
+    current = matrix[:, 0].copy()
+    result[:, 0] = current
+    for day in range(1, matrix.shape[1]):
+        current *= 1.0 - alpha
+        current += alpha * matrix[:, day]
+        result[:, day] = current
+    return result
+
+
+def detect(matrix, window=DEFAULT_WINDOW, z_threshold=DEFAULT_Z_THRESHOLD, min_count=DEFAULT_MIN_COUNT,
+           alpha=DEFAULT_ALPHA, ewma_limit=DEFAULT_EWMA_LIMIT):
+    """Sinaliza os dias fora do normal de cada série.
+
+    Retorna um dict de matrizes com o formato de `matrix`: flags (bool), spike e
+    trend (qual detector disparou), zscore, baseline (média) e ewma.
+    """
+    mean, std = rolling_baseline(matrix, window)
+    # Piso de Poisson: com média m o desvio esperado é pelo menos sqrt(m)
+    scale = np.maximum(std, np.sqrt(np.maximum(mean, 1.0)))
+    with np.errstate(invalid='ignore'):
+        zscore = (matrix - mean) / scale
+        smoothed = ewma(matrix, alpha)
+        spike = zscore >= z_threshold
+        trend = smoothed >= mean + ewma_limit * scale * np.sqrt(alpha / (2.0 - alpha))
+    flags = (spike | trend) & (matrix >= min_count)
+    return {'flags': flags, 'spike': spike & flags, 'trend': trend & flags,
+            'zscore': zscore, 'baseline': mean, 'ewma': smoothed}
@@ -0,0 +1,239 @@
+# profiler.py
+# Profiler por amostragem que pode ser ligado contra o tráfego real.
+#
+# Um admin inicia uma sessão (padrão de rota + N requisições e/ou janela de tempo).
+# A sessão é publicada num arquivo de controle em PROFILER_DIR, que cada worker
+# do gunicorn consulta no máximo uma vez por segundo; assim todos os workers
+# participam, e cada um grava suas pilhas colapsadas (formato do flamegraph.pl)
+# no mesmo diretório ao terminar.
+#
+# Só as threads que estão atendendo uma requisição selecionada são amostradas, e
+# a thread de amostragem dobra o próprio intervalo sempre que o tempo gasto
+# amostrando passa de `max_overhead` (fração do tempo de parede).
+import os
+import sys
+import json
+import time
+import uuid
+import fnmatch
+import tempfile
+import threading
+from collections import Counter
+
+from flask import request, g
+
+MIN_INTERVAL = 0.005
+MAX_INTERVAL = 1.0
+MAX_DURATION = 120
+MAX_REQUESTS = 1000
+MAX_OVERHEAD = 0.05
+MAX_STACK_DEPTH = 64
+MAX_DISTINCT_STACKS = 5000
+CONTROL_CHECK_INTERVAL = 1.0
+TRUNCATED_STACK = '[pilhas demais: amostra descartada]'
+
+
+class ProfilerError(ValueError):
+    """Parâmetros inválidos para a sessão de profiling."""
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._session = None
+        self._seen_sessions = set()
+        self._last_check = 0.0
+        self._threads = set()
+        self._stacks = Counter()
+        self._samples = 0
+        self._sampling_seconds = 0.0
+
+    @property
+    def _control_path(self):
+        return os.path.join(self.directory, 'session.json')
+
+    # --- CONTROLE (ROTAS DE ADMIN) ---
+
+    def start(self, route_pattern='*', max_requests=None, duration=30, interval=0.01, max_overhead=0.01):
+        if max_requests is not None and not (isinstance(max_requests, int) and 0 < max_requests <= MAX_REQUESTS):
+            raise ProfilerError(f"'max_requests' deve estar entre 1 e {MAX_REQUESTS}.")
+        if not isinstance(duration, (int, float)) or not 0 < duration <= MAX_DURATION:
+            raise ProfilerError(f"'duration' deve estar entre 0 e {MAX_DURATION} segundos.")
+        if not isinstance(interval, (int, float)) or not MIN_INTERVAL <= interval <= MAX_INTERVAL:
+            raise ProfilerError(f"'interval' deve estar entre {MIN_INTERVAL} e {MAX_INTERVAL} segundos.")
+        if not isinstance(max_overhead, (int, float)) or not 0 < max_overhead <= MAX_OVERHEAD:
+            raise ProfilerError(f"'max_overhead' deve estar entre 0 e {MAX_OVERHEAD}.")
+
+        session = {
+            'id': uuid.uuid4().hex,
+            'route_pattern': route_pattern,
+            'max_requests': max_requests,
+            'interval': interval,
+            'max_overhead': max_overhead,
+            'started_at': time.time(),
+            'expires_at': time.time() + duration,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        for filename in os.listdir(self.directory):
+            if filename.startswith('profile_'):
+                os.remove(os.path.join(self.directory, filename))
+        tmp_path = self._control_path + f'.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(session, f)
+        os.replace(tmp_path, self._control_path)
+        self._sync_control(force=True)
+        return session
+
+    def stop(self):
+        try:
+            os.remove(self._control_path)
+        except FileNotFoundError:
+            pass
+        self._sync_control(force=True)
+
+    def results(self):
+        """Sessão atual (se houver) e pilhas colapsadas somadas de todos os workers."""
+        session = self._read_control()
+        stacks = Counter()
+        workers = []
+        if os.path.isdir(self.directory):
+            for filename in sorted(os.listdir(self.directory)):
+                if not (filename.startswith('profile_') and filename.endswith('.json')):
+                    continue
+                with open(os.path.join(self.directory, filename)) as f:
+                    data = json.load(f)
+                stacks.update(data['stacks'])
+                workers.append({key: data[key] for key in ('pid', 'samples', 'sampling_seconds', 'final_interval')})
+        with self._lock:
+            if self._session is not None:
+                stacks.update(self._stacks)
+        collapsed = '\n'.join(f'{stack} {count}' for stack, count in stacks.most_common())
+        return session, workers, collapsed
+
+    # --- HOOKS POR REQUISIÇÃO ---
+
+    def before_request(self):
+        if time.monotonic() - self._last_check >= CONTROL_CHECK_INTERVAL:
+            self._sync_control()
+        session = self._session
+        if session is None or request.path.startswith('/api/admin/profiler'):
+            return
+        rule = request.url_rule.rule if request.url_rule else request.path
+        if not (fnmatch.fnmatchcase(rule, session['route_pattern'])
+                or fnmatch.fnmatchcase(request.endpoint or '', session['route_pattern'])):
+            return
+        with self._lock:
+            if self._session is not session:
+                return
+            if session['remaining'] is not None:
+                if session['remaining'] <= 0:
+                    return
+                session['remaining'] -= 1
+            self._threads.add(threading.get_ident())
+        g.profiling = True
+
+    def teardown_request(self, exc):
+        if not g.pop('profiling', False):
+            return
+        with self._lock:
+            self._threads.discard(threading.get_ident())
+            session = self._session
+            done = session is not None and session['remaining'] == 0 and not self._threads
+        if done:
+            self._finish(session)
+
+    # --- SESSÃO LOCAL DO WORKER ---
+
+    def _read_control(self):
+        try:
+            with open(self._control_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _sync_control(self, force=False):
+        self._last_check = time.monotonic()
+        control = self._read_control()
+        current = self._session
+        if control is None or control['expires_at'] <= time.time():
+            if current is not None:
+                self._finish(current)
+            return
+        if control['id'] in self._seen_sessions:
+            return
+        if current is not None:
+            self._finish(current)
+        with self._lock:
+            self._seen_sessions.add(control['id'])
+            session = dict(control, remaining=control['max_requests'])
+            self._session = session
+            self._stacks = Counter()
+            self._samples = 0
+            self._sampling_seconds = 0.0
+        threading.Thread(target=self._sample_loop, args=[session], daemon=True,
+                         name='plantdoctor-profiler').start()
+
+    def _sample_loop(self, session):
+        interval = session['interval']
+        while self._session is session:
+            time.sleep(interval)
+            if time.time() >= session['expires_at']:
+                self._finish(session)
+                return
+            if not self._threads:
+                continue
+            started = time.perf_counter()
+            frames = sys._current_frames()
+            with self._lock:
+                for ident in list(self._threads):
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = _collapse(frame)
+                    if stack not in self._stacks and len(self._stacks) >= MAX_DISTINCT_STACKS:
+                        stack = TRUNCATED_STACK
+                    self._stacks[stack] += 1
+                    self._samples += 1
+            del frames
+            spent = time.perf_counter() - started
+            self._sampling_seconds += spent
+            if spent / (interval + spent) > session['max_overhead']:
+                interval = min(interval * 2, MAX_INTERVAL)
+            session['final_interval'] = interval
+
+    def _finish(self, session):
+        with self._lock:
+            if self._session is not session:
+                return
+            self._session = None
+            self._threads.clear()
+            data = {
+                'pid': os.getpid(),
+                'samples': self._samples,
+                'sampling_seconds': round(self._sampling_seconds, 6),
+                'final_interval': session.get('final_interval', session['interval']),
+                'stacks': dict(self._stacks),
+            }
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"profile_{session['id']}_{os.getpid()}.json")
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+
+
+profiler = SamplingProfiler(os.environ.get('PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'plantdoctor_profiler')))
+
+
+def init_app(app):
+    app.before_request(profiler.before_request)
+    app.teardown_request(profiler.teardown_request)
@@ -0,0 +1,125 @@
+# query_debug.py
+# Detector de N+1 e orçamento de consultas por rota (modo de desenvolvimento/teste).
+#
+# Com QUERY_DEBUG=1 (ou app.testing), cada requisição registra os lazy loads de
+# relacionamentos e as instruções SQL repetidas; quando o mesmo lazy load ou a
+# mesma instrução dispara mais de N_PLUS_ONE_THRESHOLD vezes, um aviso é gravado
+# no log com o relacionamento e o ponto do código que o disparou.
+import os
+import threading
+import traceback
+from collections import Counter
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from metrics import request_sql_stats
+
+_state = threading.local()
+_project_root = None
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Levantada (em modo estrito) quando uma rota passa do seu orçamento de consultas."""
+
+
+def _call_site():
+    """Primeiro frame do código do projeto (fora de bibliotecas) que disparou a consulta."""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        filename = frame.filename
+        if (filename.startswith(_project_root) and 'site-packages' not in filename
+                and not filename.endswith('query_debug.py')):
+            return f'{os.path.relpath(filename, _project_root)}:{frame.lineno} ({frame.name})'
+    return 'desconhecido'
+
+
+def _warn_once(key, message, *args):
+    if key in _state.warned:
+        return
+    _state.warned.add(key)
+    current_app.logger.warning(message, *args)
+
+
+def _on_orm_execute(orm_execute_state):
+    if not getattr(_state, 'active', False):
+        return
+    if not orm_execute_state.is_relationship_load or orm_execute_state.lazy_loaded_from is None:
+        return
+    prop = orm_execute_state.loader_strategy_path.path[-1]
+    relationship_name = f'{prop.parent.class_.__name__}.{prop.key}'
+    _state.lazy_loads[relationship_name] += 1
+    count = _state.lazy_loads[relationship_name]
+    if count > _state.threshold:
+        _warn_once(('lazy', relationship_name),
+                   "Possível N+1 em %s %s: lazy load de %s disparado %d vezes (em %s)",
+                   request.method, request.path, relationship_name, count, _call_site())
+
+
+def _on_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not getattr(_state, 'active', False):
+        return
+    _state.statements[statement] += 1
+    count = _state.statements[statement]
+    if count > _state.threshold:
+        _warn_once(('sql', statement),
+                   "Possível N+1 em %s %s: a mesma consulta foi executada %d vezes (em %s): %s",
+                   request.method, request.path, count, _call_site(), ' '.join(statement.split())[:200])
+
+
+def request_report():
+    """Lazy loads e instruções repetidas da requisição atual (para testes)."""
+    return {
+        'lazy_loads': dict(getattr(_state, 'lazy_loads', {})),
+        'statements': dict(getattr(_state, 'statements', {})),
+    }
+
+
+def init_app(app):
+    global _project_root
+    app.config.setdefault('QUERY_DEBUG', os.environ.get('QUERY_DEBUG') == '1')
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5)))
+    _project_root = app.root_path
+
+    @app.before_request
+    def _start_query_debug():
+        _state.active = app.config['QUERY_DEBUG'] or app.testing
+        if _state.active:
+            _state.threshold = app.config['N_PLUS_ONE_THRESHOLD']
+            _state.lazy_loads = Counter()
+            _state.statements = Counter()
+            _state.warned = set()
+
+    @app.teardown_request
+    def _stop_query_debug(exc):
+        _state.active = False
+
+    if not event.contains(Session, 'do_orm_execute', _on_orm_execute):
+        event.listen(Session, 'do_orm_execute', _on_orm_execute)
+        event.listen(Engine, 'before_cursor_execute', _on_cursor_execute)
+
+
+def query_budget(max_queries):
+    """Limita o número de instruções SQL que a rota pode executar por requisição.
+
+    Em modo estrito (QUERY_BUDGET_STRICT ou app.testing) o excesso levanta
+    QueryBudgetExceeded, fazendo o teste falhar; em produção apenas registra um aviso.
+    Deve ficar logo abaixo de @app.route para contar também as consultas de
+    decorators como @admin_required.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            response = fn(*args, **kwargs)
+            executed, _ = request_sql_stats()
+            if executed > max_queries:
+                message = (f"Orçamento de consultas excedido em {request.method} {request.path}: "
+                           f"{executed} instruções SQL (limite {max_queries}).")
+                if current_app.config.get('QUERY_BUDGET_STRICT', current_app.testing):
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return response
+        return decorator
+    return wrapper
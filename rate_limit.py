@@ -0,0 +1,209 @@
+# rate_limit.py
+# Limitador de requisições por token bucket (por IP, por e-mail e por conta).
+#
+# As políticas por rota ficam num único dicionário (RATE_LIMIT_POLICIES em app.py)
+# e são aplicadas num before_request; quem passa do limite recebe 429 com o
+# cabeçalho Retry-After.
+#
+# Armazenamento:
+#   - LocalBucketStore: em processo, LRU fragmentado em shards com número máximo
+#     de chaves (memória fixa). Cada worker do gunicorn tem o seu. Serve também
+#     de substituto local do armazenamento compartilhado nos testes.
+#   - RedisBucketStore: compartilhado entre workers (RATE_LIMIT_STORAGE_URL=redis://...),
+#     com a atualização dos buckets feita atomicamente num script Lua.
+#
+# Uma requisição só consome tokens se todas as políticas da rota a permitirem:
+# os buckets são conferidos e debitados juntos, numa só operação atômica. Assim
+# uma requisição barrada (por exemplo, pelo limite do e-mail) não gasta o saldo
+# das outras políticas (o do IP).
+import os
+import math
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import request, jsonify, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+# scope: 'ip' (IP do cliente), 'email' (e-mail do corpo ou da query string, só para
+# as rotas de autenticação, sem JWT) ou 'account' (identidade do JWT; o e-mail
+# informado nunca é usado aqui, senão bastaria mandar outro para trocar de bucket).
+# capacity tokens, reabastecidos totalmente a cada per_seconds
+Policy = namedtuple('Policy', 'scope capacity per_seconds')
+
+
+class LocalBucketStore:
+    def __init__(self, max_keys=100_000, shards=64):
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self._max_keys_per_shard = max(1, max_keys // shards)
+
+    def take(self, buckets, cost=1):
+        """Consome `cost` tokens de cada bucket [(chave, capacidade, taxa de reposição)]
+        só se todos tiverem saldo. Retorna 0 se permitido, ou os segundos até o
+        bucket mais atrasado ter tokens (e nada é consumido).
+        """
+        indexes = [hash(key) % len(self._shards) for key, _, _ in buckets]
+        # Travas em ordem fixa: duas requisições com as mesmas chaves não se bloqueiam mutuamente
+        locks = [self._shards[index][0] for index in sorted(set(indexes))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            now = time.monotonic()
+            levels, retry_after = [], 0.0
+            for (key, capacity, refill_rate), index in zip(buckets, indexes):
+                state = self._shards[index][1].get(key)
+                tokens = capacity if state is None else min(capacity, state[0] + (now - state[1]) * refill_rate)
+                if tokens < cost:
+                    retry_after = max(retry_after, (cost - tokens) / refill_rate)
+                levels.append(tokens)
+            for (key, _, _), index, tokens in zip(buckets, indexes, levels):
+                shard = self._shards[index][1]
+                if key in shard:
+                    shard.move_to_end(key)
+                elif len(shard) >= self._max_keys_per_shard:
+                    # Despejar o bucket menos usado equivale a devolvê-lo cheio
+                    shard.popitem(last=False)
+                shard[key] = (tokens if retry_after else tokens - cost, now)
+            return retry_after
+        finally:
+            for lock in locks:
+                lock.release()
+
+
+# KEYS: os buckets; ARGV: cost e, para cada bucket, capacidade e taxa de reposição.
+# Confere todos e só debita se todos tiverem saldo.
+_REDIS_TAKE_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local levels = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1])
+    if tokens == nil then
+        tokens = capacity
+    else
+        tokens = math.min(capacity, tokens + (now - tonumber(state[2])) * rate)
+    end
+    if tokens < cost then
+        retry_after = math.max(retry_after, (cost - tokens) / rate)
+    end
+    levels[i] = tokens
+end
+if retry_after == 0 then
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[2 * i])
+        local rate = tonumber(ARGV[2 * i + 1])
+        redis.call('HSET', key, 'tokens', levels[i] - cost, 'ts', now)
+        redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    end
+end
+return tostring(retry_after)
+"""
+
+
+class RedisBucketStore:
+    def __init__(self, url, prefix='plantdoctor:ratelimit:'):
+        import redis  # dependência opcional, só necessária neste modo
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_REDIS_TAKE_SCRIPT)
+        self._prefix = prefix
+
+    def take(self, buckets, cost=1):
+        args = [cost]
+        for _, capacity, refill_rate in buckets:
+            args += [capacity, refill_rate]
+        return float(self._take(keys=[self._prefix + key for key, _, _ in buckets], args=args))
+
+
+def email_key(email):
+    if isinstance(email, str) and email.strip():
+        return 'email:' + email.strip().lower()
+    return None
+
+
+def store_from_url(url):
+    if url and url.startswith(('redis://', 'rediss://')):
+        return RedisBucketStore(url)
+    return LocalBucketStore(max_keys=int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100_000)))
+
+
+class RateLimiter:
+    def __init__(self, policies, store, trust_proxy=False):
+        self.policies = policies
+        self.store = store
+        self.trust_proxy = trust_proxy
+
+    def client_ip(self):
+        if self.trust_proxy and request.access_route:
+            return request.access_route[-1]
+        return request.remote_addr or 'desconhecido'
+
+    def email_key(self):
+        """E-mail informado no corpo JSON ou na query string (rotas de autenticação)."""
+        data = request.get_json(silent=True) if request.is_json else None
+        return email_key((data or {}).get('email') or request.args.get('email'))
+
+    def account_key(self):
+        """Identidade do JWT, ou None sem token válido."""
+        try:
+            verify_jwt_in_request(optional=True)
+        except Exception:
+            return None
+        identity = get_jwt_identity()
+        return f'user:{identity}' if identity is not None else None
+
+    def take(self, endpoint, policies, subject_for):
+        """Aplica as políticas da rota; retorna os segundos até liberar (0 se permitido).
+
+        subject_for(scope) devolve o IP, o e-mail ou a conta da requisição (None para
+        ignorar). Os buckets de todas as políticas são conferidos e debitados juntos.
+        """
+        buckets = []
+        for index, policy in enumerate(policies):
+            subject = subject_for(policy.scope)
+            if subject is not None:
+                # {endpoint}: no Redis Cluster, todas as chaves do script ficam no mesmo slot
+                buckets.append((f'{{{endpoint}}}:{index}:{subject}', policy.capacity,
+                                policy.capacity / policy.per_seconds))
+        if not buckets:
+            return 0.0
+        try:
+            return self.store.take(buckets)
+        except Exception as e:
+            # Falha no armazenamento compartilhado não pode derrubar a API
+            current_app.logger.error(f"Erro no limitador de requisições: {e}")
+            return 0.0
+
+    def check(self):
+        # Nome da view sem o prefixo do blueprint ('api.login' -> 'login')
+        endpoint = request.endpoint.rsplit('.', 1)[-1] if request.endpoint else None
+        policies = self.policies.get(endpoint) if endpoint else None
+        if not policies:
+            return None
+
+        subjects = {'ip': self.client_ip, 'email': self.email_key, 'account': self.account_key}
+        retry_after = self.take(endpoint, policies, lambda scope: subjects[scope]())
+        if retry_after > 0:
+            seconds = max(1, math.ceil(retry_after))
+            response = jsonify({"message": f"Muitas requisições. Tente novamente em {seconds} segundos."})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(seconds)
+            return response
+        return None
+
+
+def init_app(app, policies):
+    if os.environ.get('RATE_LIMIT_ENABLED', '1') == '0':
+        return None
+    limiter = RateLimiter(
+        policies,
+        store_from_url(os.environ.get('RATE_LIMIT_STORAGE_URL')),
+        trust_proxy=os.environ.get('RATE_LIMIT_TRUST_PROXY') == '1'
+    )
+    app.before_request(limiter.check)
+    app.extensions['rate_limiter'] = limiter
+    return limiter
@@ -0,0 +1,15 @@
+# rebuild_recommendations.py
+# Rotina periódica (cron) que refaz o modelo de coocorrência de culturas e as
+# recomendações de todos os usuários. Entre uma execução e outra, as rotas que
+# mudam interesses ou plantios atualizam as recomendações do próprio usuário.
+import time
+
+from app import app, rebuild_culture_recommendations
+
+print("--- INICIANDO REBUILD DAS RECOMENDAÇÕES DE CULTURAS ---")
+with app.app_context():
+    started = time.perf_counter()
+    result = rebuild_culture_recommendations()
+    print(f">>> {result['users']} usuários, {result['pairs']} pares usuário/cultura e "
+          f"{result['cultures']} culturas em {time.perf_counter() - started:.1f}s.")
+print("--- REBUILD DAS RECOMENDAÇÕES CONCLUÍDO ---")
@@ -0,0 +1,153 @@
+# recommendations.py
+# Recomendação de culturas por coocorrência: "quem cultiva o que você cultiva
+# também cultiva...".
+#
+# A entrada são os pares (usuário, cultura) de interesses e plantios. A matriz
+# de coocorrência cultura x cultura é X^T X, com X a matriz usuário x cultura
+# (0/1). X é muito esparsa em usuários e estreita em culturas, então é montada
+# em blocos densos de `chunk_users` linhas e cada bloco soma B^T B (um produto
+# de matrizes do BLAS): memória limitada ao bloco, sem precisar do SciPy.
+# A associação entre culturas é o cosseno (coocorrência normalizada pela
+# popularidade de cada uma), e a pontuação de uma cultura para um usuário é a
+# soma das associações com as culturas que ele já tem.
+from itertools import chain
+
+import numpy as np
+
+DEFAULT_CHUNK_USERS = 65536
+
+
+def user_blocks(user_index, culture_index, n_users, n_cultures, chunk_users=DEFAULT_CHUNK_USERS):
+    """Gera (primeiro usuário, bloco denso float32 (usuários do bloco, culturas)).
+
+    Os pares devem vir ordenados por usuário (posições 0..n_users-1).
+    """
+    bounds = np.searchsorted(user_index, np.arange(0, n_users + chunk_users, chunk_users))
+    for block, first in enumerate(range(0, n_users, chunk_users)):
+        start, stop = bounds[block], bounds[block + 1]
+        rows = min(chunk_users, n_users - first)
+        matrix = np.zeros((rows, n_cultures), dtype=np.float32)
+        matrix[user_index[start:stop] - first, culture_index[start:stop]] = 1.0
+        yield first, matrix
+
+
+def cooccurrence(user_index, culture_index, n_users, n_cultures, chunk_users=DEFAULT_CHUNK_USERS):
+    """Matriz (culturas, culturas) com o número de usuários que têm as duas; a diagonal é a popularidade."""
+    counts = np.zeros((n_cultures, n_cultures), dtype=np.float64)
+    for _, block in user_blocks(user_index, culture_index, n_users, n_cultures, chunk_users):
+        counts += block.T @ block
+    return counts
+
+
+def similarity(counts):
+    """Cosseno entre culturas a partir da coocorrência, com a diagonal zerada."""
+    popularity = np.sqrt(np.diag(counts))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = counts / np.outer(popularity, popularity)
+    result[~np.isfinite(result)] = 0.0
+    np.fill_diagonal(result, 0.0)
+    return result
+
+
+def top_k(owned, similarity_matrix, popularity, k):
+    """Melhores `k` culturas para cada linha de `owned` (usuários, culturas), fora as que o usuário já tem.
+
+    Usuários sem nenhuma cultura recebem as mais populares. Retorna (posições,
+    pontuações), ambas (usuários, k), com posição -1 onde não há o que recomendar.
+    """
+    owned = owned > 0
+    scores = owned.astype(np.float32) @ similarity_matrix.astype(np.float32)
+    empty = ~owned.any(axis=1)
+    if empty.any():
+        scores[empty] = (popularity / max(popularity.max(), 1.0)).astype(np.float32)
+    scores[owned | (scores <= 0)] = -np.inf
+
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < scores.shape[1] else \
+        np.broadcast_to(np.arange(scores.shape[1]), (scores.shape[0], k))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    positions = np.take_along_axis(candidates, order, axis=1)
+    best = np.take_along_axis(candidate_scores, order, axis=1)
+    positions = np.where(np.isfinite(best), positions, -1)
+    return positions, np.where(np.isfinite(best), best, 0.0)
+
+
+def load_pairs(partitions):
+    """Pares (usuário, cultura) vindos do banco em partições -> dois arrays int64 ordenados por usuário."""
+    arrays = [np.fromiter(chain.from_iterable(part), dtype=np.int64).reshape(-1, 2) for part in partitions]
+    pairs = np.concatenate(arrays) if arrays else np.empty((0, 2), dtype=np.int64)
+    order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+    return pairs[order, 0], pairs[order, 1]
+
+
+class Model:
+    """Similaridade e popularidade das culturas de um rebuild, indexadas por posição em `culture_ids`."""
+
+    def __init__(self, culture_ids, similarity_matrix, popularity):
+        self.culture_ids = np.asarray(culture_ids, dtype=np.int64)
+        self.similarity = similarity_matrix
+        self.popularity = popularity
+
+    @classmethod
+    def build(cls, culture_ids, user_ids, pair_culture_ids, chunk_users=DEFAULT_CHUNK_USERS):
+        """Monta o modelo a partir dos pares. Retorna (modelo, coocorrências, ids dos usuários, posições dos pares)."""
+        model = cls(sorted(culture_ids), None, None)
+        known = np.isin(pair_culture_ids, model.culture_ids)
+        user_ids, pair_culture_ids = user_ids[known], pair_culture_ids[known]
+        users, user_index = np.unique(user_ids, return_inverse=True)
+        culture_index = np.searchsorted(model.culture_ids, pair_culture_ids)
+        counts = cooccurrence(user_index, culture_index, len(users), len(model.culture_ids), chunk_users)
+        model.similarity = similarity(counts)
+        model.popularity = np.diag(counts).copy()
+        return model, counts, users, (user_index, culture_index)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Modelo salvo como linhas (culture_id, other_culture_id, users, score)."""
+        culture_ids = sorted({row[0] for row in rows} | {row[1] for row in rows})
+        model = cls(culture_ids, np.zeros((len(culture_ids), len(culture_ids))), np.zeros(len(culture_ids)))
+        for culture_id, other_id, users, score in rows:
+            i, j = model.positions([culture_id, other_id])
+            if i == j:
+                model.popularity[i] = users
+            else:
+                model.similarity[i, j] = score
+        return model
+
+    def rows(self, counts):
+        """Linhas não nulas para salvar o modelo (a diagonal guarda a popularidade)."""
+        first, second = np.nonzero(counts)
+        return [
+            {'culture_id': int(self.culture_ids[i]), 'other_culture_id': int(self.culture_ids[j]),
+             'users': int(counts[i, j]), 'score': float(self.similarity[i, j])}
+            for i, j in zip(first.tolist(), second.tolist())
+        ]
+
+    def positions(self, culture_ids):
+        """Posição de cada id no modelo (-1 para culturas que não existiam no rebuild)."""
+        culture_ids = np.asarray(culture_ids, dtype=np.int64)
+        if not len(self.culture_ids):
+            return np.full(len(culture_ids), -1)
+        found = np.minimum(np.searchsorted(self.culture_ids, culture_ids), len(self.culture_ids) - 1)
+        return np.where(self.culture_ids[found] == culture_ids, found, -1)
+
+    def items(self, positions, scores):
+        """Linhas de top_k -> uma lista [{'culture_id', 'score'}] por usuário."""
+        culture_ids = self.culture_ids[np.maximum(positions, 0)].tolist()
+        rounded = np.round(scores.astype(np.float64), 4).tolist()
+        valid = (positions >= 0).tolist()
+        return [
+            [{'culture_id': culture_id, 'score': score} for culture_id, score, ok in zip(*row) if ok]
+            for row in zip(culture_ids, rounded, valid)
+        ]
+
+    def recommend(self, owned_culture_ids, k):
+        """Recomendações de um usuário a partir das culturas que ele já tem."""
+        if not len(self.culture_ids):
+            return []
+        owned = np.zeros((1, len(self.culture_ids)), dtype=np.float32)
+        positions = self.positions(owned_culture_ids)
+        owned[0, positions[positions >= 0]] = 1.0
+        best, scores = top_k(owned, self.similarity, self.popularity, k)
+        return self.items(best, scores)[0]
@@ -0,0 +1,204 @@
+# response_cache.py
+# Cache de respostas GET com invalidação por tags.
+#
+# Uso:
+#   @app.route("/api/cultures/<int:culture_id>/diagnosis-history")
+#   @jwt_required()
+#   @cached(tags=['diagnoses:{user_id}'])
+#   def get_diagnosis_history(culture_id): ...
+#
+#   # na rota de escrita, depois do commit:
+#   invalidate(f'diagnoses:{user_id}')
+#
+# A chave inclui a rota, o usuário do JWT (se per_user), os argumentos da URL, o
+# formato negociado (JSON/MessagePack/CBOR) e a versão atual de cada tag. Invalidar uma tag só incrementa a sua versão: as
+# entradas antigas deixam de ser encontradas e saem por LRU/TTL, sem varredura.
+#
+# Armazenamento:
+#   - LocalCacheStore: em processo, LRU limitado em bytes (RESPONSE_CACHE_MAX_BYTES).
+#     Cada worker tem o seu cache e as suas versões de tag, então a invalidação
+#     só vale no worker que atendeu a escrita. Por isso, com ele, só as rotas
+#     globais (per_user=False, que aceitam o atraso do TTL) são cacheadas; as
+#     por usuário, invalidadas pelas escritas do próprio usuário, vão sempre à
+#     rota. Nos testes, LocalCacheStore(shared=True) faz o papel do compartilhado.
+#   - RedisCacheStore: compartilhado entre workers (RESPONSE_CACHE_URL=redis://...),
+#     com invalidação imediata em todos eles.
+import os
+import time
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+from flask import request, current_app, make_response
+from flask_jwt_extended import get_jwt_identity
+
+import metrics
+import response_encoding
+
+DEFAULT_TTL = 60
+
+
+class LocalCacheStore:
+    def __init__(self, max_bytes=32 * 1024 * 1024, shared=False):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries = OrderedDict()  # chave -> (valor, expira_em)
+        self._size = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        """Guarda o valor; retorna quantas entradas foram despejadas para abrir espaço."""
+        if len(value) > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            self._discard(key)
+            while self._size + len(value) > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                evicted += 1
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._size += len(value)
+        return evicted
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+    def tag_versions(self, tags):
+        return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+
+class RedisCacheStore:
+    shared = True
+
+    def __init__(self, url, prefix='plantdoctor:cache:'):
+        import redis  # dependência opcional, só necessária neste modo
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        return self._client.get(self._prefix + key)
+
+    def set(self, key, value, ttl):
+        # O Redis despeja sozinho (maxmemory-policy); não há como contar aqui
+        self._client.set(self._prefix + key, value, ex=max(1, int(ttl)))
+        return 0
+
+    def tag_versions(self, tags):
+        if not tags:
+            return []
+        values = self._client.mget([self._prefix + 'tag:' + tag for tag in tags])
+        return [int(value or 0) for value in values]
+
+    def bump(self, tags):
+        pipeline = self._client.pipeline()
+        for tag in tags:
+            pipeline.incr(self._prefix + 'tag:' + tag)
+        pipeline.execute()
+
+
+def store_from_url(url):
+    if url and url.startswith(('redis://', 'rediss://')):
+        return RedisCacheStore(url)
+    return LocalCacheStore(max_bytes=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+
+
+def _encode(response):
+    header = f'{response.status_code}\n{response.mimetype}\n'.encode()
+    return header + response.get_data()
+
+
+def _decode(value):
+    status, mimetype, body = value.split(b'\n', 2)
+    response = current_app.response_class(body, status=int(status), mimetype=mimetype.decode())
+    response.vary.add('Accept')
+    return response
+
+
+def _store():
+    return current_app.extensions.get('response_cache')
+
+
+def cached(tags=(), ttl=None, per_user=True):
+    """Cacheia respostas 200 de uma rota GET.
+
+    As tags são formatadas com os argumentos da rota e com {user_id}. Deve ficar
+    abaixo de @jwt_required() quando per_user=True. Rotas por usuário só são
+    cacheadas com armazenamento compartilhado entre os workers (ver acima).
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            store = _store()
+            if store is None or request.method != 'GET' or (per_user and not store.shared):
+                return fn(*args, **kwargs)
+
+            user_id = get_jwt_identity() if per_user else None
+            endpoint_tags = [tag.format(user_id=user_id, **kwargs) for tag in tags]
+            try:
+                versions = store.tag_versions(endpoint_tags)
+                key = '|'.join([
+                    request.endpoint, str(user_id), request.full_path, response_encoding.negotiated_mimetype(),
+                    ','.join(f'{tag}={version}' for tag, version in zip(endpoint_tags, versions))
+                ])
+                value = store.get(key)
+            except Exception as e:
+                # Falha no armazenamento compartilhado não pode derrubar a API
+                current_app.logger.error(f"Erro no cache de respostas: {e}")
+                return fn(*args, **kwargs)
+
+            if value is not None:
+                metrics.registry.inc('plantdoctor_response_cache_requests_total', endpoint=request.endpoint, outcome='hit')
+                return _decode(value)
+
+            metrics.registry.inc('plantdoctor_response_cache_requests_total', endpoint=request.endpoint, outcome='miss')
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                try:
+                    evicted = store.set(key, _encode(response), ttl or current_app.config['RESPONSE_CACHE_TTL'])
+                except Exception as e:
+                    current_app.logger.error(f"Erro no cache de respostas: {e}")
+                else:
+                    if evicted:
+                        metrics.registry.inc('plantdoctor_response_cache_evictions_total', evicted)
+            return response
+        return decorator
+    return wrapper
+
+
+def invalidate(*tags):
+    """Invalida todas as respostas cacheadas com qualquer uma das tags."""
+    store = _store()
+    if store is None or not tags:
+        return
+    try:
+        store.bump(tags)
+    except Exception as e:
+        current_app.logger.error(f"Erro ao invalidar o cache de respostas: {e}")
+
+
+def init_app(app):
+    app.config.setdefault('RESPONSE_CACHE_TTL', int(os.environ.get('RESPONSE_CACHE_TTL', DEFAULT_TTL)))
+    if os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '0':
+        return None
+    store = store_from_url(os.environ.get('RESPONSE_CACHE_URL'))
+    app.extensions['response_cache'] = store
+    return store
@@ -0,0 +1,170 @@
+# response_encoding.py
+# Formato e compressão das respostas, negociados pelos cabeçalhos do cliente.
+#
+#   Accept: application/msgpack   -> MessagePack
+#   Accept: application/cbor      -> CBOR
+#   (qualquer outro / ausente)    -> JSON, como antes
+#
+#   Accept-Encoding: br / gzip    -> corpo comprimido quando passa de
+#                                    COMPRESSION_MIN_SIZE bytes (padrão 1024)
+#
+# As rotas não mudam: o jsonify (e os dicts/listas retornados) passam pelo
+# provider de JSON da aplicação, que é substituído aqui por um que escolhe o
+# formato. As respostas de rotas marcadas com @precompressed (catálogos que
+# mudam pouco, como /api/cultures) têm a versão comprimida guardada pelo hash
+# do corpo: enquanto o conteúdo não muda, a compressão (no nível máximo) roda
+# uma única vez por worker.
+#
+# msgpack, cbor2 e brotli são opcionais: sem eles o formato/codificação
+# correspondente simplesmente não é oferecido.
+import os
+import gzip
+import json
+import hashlib
+
+from flask import request, current_app, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+import response_cache
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+
+DEFAULT_MIN_SIZE = 1024
+# Compressão por requisição: níveis rápidos. Pré-comprimidas: nível máximo, uma vez só.
+FAST_LEVELS = {'br': 5, 'gzip': 6}
+BEST_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def mimetypes():
+    """Formatos disponíveis, em ordem de preferência (JSON vence empates e */*)."""
+    available = [JSON]
+    if msgpack is not None:
+        available.append(MSGPACK)
+    if cbor2 is not None:
+        available.append(CBOR)
+    return available
+
+
+def negotiate(accept_header):
+    if not accept_header:
+        return JSON
+    return parse_accept_header(accept_header, MIMEAccept).best_match(mimetypes(), default=JSON)
+
+
+def negotiated_mimetype():
+    """Formato da resposta para a requisição atual."""
+    if not has_request_context() or not isinstance(current_app.json, BinaryJSONProvider):
+        return JSON
+    return negotiate(request.headers.get('Accept'))
+
+
+def encode(data, mimetype, default):
+    """Serializa no formato pedido; `default` converte tipos não nativos (datas, Decimal)."""
+    if mimetype == MSGPACK:
+        return msgpack.packb(data, default=default, use_bin_type=True)
+    if mimetype == CBOR:
+        return cbor2.dumps(data, default=lambda encoder, value: encoder.encode(default(value)))
+    return json.dumps(data, default=default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def choose_encoding(accept_encoding_header):
+    """'br', 'gzip' ou None, respeitando os pesos q= do cliente."""
+    if not accept_encoding_header:
+        return None
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return parse_accept_header(accept_encoding_header).best_match(offered)
+
+
+def compress(body, encoding, level=None):
+    if encoding == 'br':
+        return brotli.compress(body, quality=level if level is not None else FAST_LEVELS['br'])
+    return gzip.compress(body, compresslevel=level if level is not None else FAST_LEVELS['gzip'], mtime=0)
+
+
+def precompressed(fn):
+    """Marca a rota como de conteúdo estável: a versão comprimida é reaproveitada."""
+    fn.precompressed = True
+    return fn
+
+
+class BinaryJSONProvider(DefaultJSONProvider):
+    """Provider do Flask que responde em MessagePack/CBOR quando o cliente pede."""
+
+    def response(self, *args, **kwargs):
+        mimetype = negotiate(request.headers.get('Accept')) if has_request_context() else JSON
+        if mimetype == JSON:
+            response = super().response(*args, **kwargs)
+        else:
+            obj = self._prepare_response_obj(args, kwargs)
+            response = self._app.response_class(encode(obj, mimetype, self.default), mimetype=mimetype)
+        if has_request_context():
+            response.vary.add('Accept')
+        return response
+
+
+class ResponseCompressor:
+    def __init__(self, min_size, cache):
+        self.min_size = min_size
+        self.cache = cache
+
+    def compress_body(self, body, encoding, precompressed=False):
+        """Corpo comprimido, ou None se for pequeno demais ou não compensar."""
+        if len(body) < self.min_size:
+            return None
+        if precompressed:
+            key = encoding + ':' + hashlib.blake2b(body, digest_size=16).hexdigest()
+            compressed = self.cache.get(key)
+            if compressed is None:
+                compressed = compress(body, encoding, BEST_LEVELS[encoding])
+                # Chave pelo conteúdo: nunca fica desatualizada, só sai por LRU
+                self.cache.set(key, compressed, float('inf'))
+        else:
+            compressed = compress(body, encoding)
+        return compressed if len(compressed) < len(body) else None
+
+    def __call__(self, response):
+        if (request.method == 'HEAD' or response.direct_passthrough or response.status_code in (204, 304)
+                or response.status_code < 200 or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        view = current_app.view_functions.get(request.endpoint)
+        compressed = self.compress_body(response.get_data(), encoding,
+                                        getattr(view, 'precompressed', False) and response.status_code == 200)
+        if compressed is not None:
+            response.set_data(compressed)
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def init_app(app):
+    app.json = BinaryJSONProvider(app)
+    if os.environ.get('COMPRESSION_ENABLED', '1') == '0':
+        return None
+    compressor = ResponseCompressor(
+        int(os.environ.get('COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)),
+        response_cache.LocalCacheStore(max_bytes=int(os.environ.get('COMPRESSION_CACHE_MAX_BYTES', 8 * 1024 * 1024)))
+    )
+    app.after_request(compressor)
+    app.extensions['response_compressor'] = compressor
+    return compressor
@@ -0,0 +1,76 @@
+# revocation.py
+# Revogação de JWT sem consulta ao banco no caso comum.
+#
+# Há dois tipos de revogação: um token específico (o `jti`, no logout) e a
+# "marca" de um usuário (todos os tokens emitidos antes de um instante, após
+# troca de senha ou mudança de papel). Cada worker guarda os jti revogados num
+# filtro de Bloom e as marcas num dicionário user_id -> instante. Um token cujo
+# jti não está no filtro e que foi emitido depois da marca do dono é válido sem
+# tocar no banco; só um acerto do filtro (revogado de fato ou falso positivo,
+# ~0,1%) precisa confirmar o jti na tabela.
+import math
+import hashlib
+
+DEFAULT_CAPACITY = 65536
+DEFAULT_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    """Conjunto aproximado de strings: sem falsos negativos, falsos positivos ~error_rate até `capacity` itens."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Hash duplo (Kirsch-Mitzenmacher): k posições a partir de um só digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        # Só conta chaves novas: a releitura da margem repete linhas já adicionadas
+        new = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                new = True
+        self.count += new
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def full(self):
+        return self.count > self.capacity
+
+
+class RevocationCache:
+    """Filtro dos jti revogados e marcas por usuário (instantes em segundos desde a época, UTC)."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.tokens = BloomFilter(capacity, error_rate)
+        self.valid_after = {}
+
+    def add(self, user_id, jti, revoked_at):
+        """Uma linha de revogação: jti revogado ou, com jti None, marca do usuário em `revoked_at`."""
+        if jti is not None:
+            self.tokens.add(jti)
+        elif revoked_at > self.valid_after.get(user_id, 0.0):
+            self.valid_after[user_id] = revoked_at
+
+    def check(self, user_id, jti, issued_at):
+        """'revoked' (emitido antes da marca), 'maybe' (jti no filtro: confirmar no banco) ou 'valid'.
+
+        `issued_at` é o `iat` do token, em segundos inteiros: um token do mesmo
+        segundo da marca é tratado como anterior a ela (na dúvida, revogado).
+        """
+        if issued_at < self.valid_after.get(user_id, 0.0):
+            return 'revoked'
+        if jti is not None and jti in self.tokens:
+            return 'maybe'
+        return 'valid'
@@ -0,0 +1,24 @@
+# score_weather_risk.py
+# Rotina diária (cron) que calcula o risco de doenças pelo clima nos plantios em
+# aberto e avisa os produtores. Recebe os arquivos/pastas de observações das
+# estações (CSV ou Parquet, ver weather_risk.py).
+#
+#   python score_weather_risk.py /dados/clima/
+#   python score_weather_risk.py /dados/clima/ --date 2026-10-18
+import argparse
+from datetime import datetime
+
+from app import app, create_weather_risk_alerts
+
+parser = argparse.ArgumentParser(description="Avisos preventivos de doenças pelo clima.")
+parser.add_argument('paths', nargs='+', help="Arquivos ou pastas com as observações das estações.")
+parser.add_argument('--date', help="Dia de referência (YYYY-MM-DD); padrão: hoje.")
+args = parser.parse_args()
+reference_date = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else None
+
+print("--- INICIANDO CÁLCULO DE RISCO PELO CLIMA ---")
+with app.app_context():
+    result = create_weather_risk_alerts(args.paths, reference_date)
+    print(f">>> {result['stations']} estações, {result['plantings']} plantios avaliados, "
+          f"{result['alerts']} avisos criados.")
+print("--- CÁLCULO DE RISCO CONCLUÍDO ---")
@@ -0,0 +1,9 @@
+# send_harvest_reminders.py
+# Rotina diária (cron) que cria avisos de colheita próxima para todos os usuários.
+from app import app, create_harvest_reminders
+
+print("--- INICIANDO ROTINA DE LEMBRETES DE COLHEITA ---")
+with app.app_context():
+    created = create_harvest_reminders()
+    print(f">>> {created} avisos de colheita criados.")
+print("--- ROTINA DE LEMBRETES CONCLUÍDA ---")
@@ -0,0 +1,111 @@
+# similarity.py
+# Índice de similaridade para detectar dúvidas repetidas.
+#
+# Cada texto vira um vetor de n-gramas com "hashing trick" (palavras, pares de
+# palavras e trigramas de caracteres, sem acentos) numa dimensão fixa, normalizado
+# para que o produto interno seja a similaridade de cosseno. Os vetores ficam numa
+# única matriz float32 contígua; uma consulta é um único produto matriz-vetor
+# seguido de argpartition para os top-k.
+import re
+import zlib
+import threading
+import unicodedata
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 256
+
+STOPWORDS = frozenset("""
+a o as os um uma uns umas de do da dos das em no na nos nas por pelo pela para pra
+com sem e ou que se como qual quais quando onde meu minha meus minhas seu sua
+eu voce ele ela isso isto esse essa este esta ja nao sim mais muito muita
+""".split())
+
+
+def _fold(text):
+    normalized = unicodedata.normalize('NFKD', (text or '').lower())
+    return ''.join(ch for ch in normalized if not unicodedata.combining(ch))
+
+
+def features(text):
+    words = [w for w in re.findall(r'\w+', _fold(text)) if w not in STOPWORDS]
+    grams = list(words)
+    grams.extend(f'{a} {b}' for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f' {word} '
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def vectorize(texts, dimensions=DEFAULT_DIMENSIONS):
+    """Matriz (len(texts), dimensions) float32 com linhas de norma 1."""
+    rows, columns, signs = [], [], []
+    for row, text in enumerate(texts):
+        for gram in features(text):
+            # crc32 é estável entre processos (ao contrário de hash())
+            code = zlib.crc32(gram.encode())
+            rows.append(row)
+            columns.append(code % dimensions)
+            signs.append(1.0 if code & 0x80000000 else -1.0)
+    matrix = np.zeros((len(texts), dimensions), dtype=np.float32)
+    if rows:
+        np.add.at(matrix, (np.asarray(rows), np.asarray(columns)), np.asarray(signs, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class SimilarityIndex:
+    def __init__(self, dimensions=DEFAULT_DIMENSIONS, initial_capacity=1024):
+        self.dimensions = dimensions
+        self._matrix = np.zeros((initial_capacity, dimensions), dtype=np.float32)
+        self._ids = np.zeros(initial_capacity, dtype=np.int64)
+        self._rows = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return self._matrix.nbytes + self._ids.nbytes
+
+    def add(self, ids, texts):
+        """Inclui (ou substitui) itens. Leitores concorrentes continuam vendo um estado consistente."""
+        vectors = vectorize(texts, self.dimensions)
+        with self._lock:
+            for item_id, vector in zip(ids, vectors):
+                row = self._rows.get(item_id)
+                if row is None:
+                    if self._size == len(self._ids):
+                        self._grow()
+                    row = self._size
+                    self._ids[row] = item_id
+                    self._rows[item_id] = row
+                    self._matrix[row] = vector
+                    self._size += 1
+                else:
+                    self._matrix[row] = vector
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def query(self, text, k=5, min_score=0.0, exclude_id=None):
+        """[(id, score)] dos k itens mais parecidos, do mais para o menos parecido."""
+        matrix, ids, size = self._matrix, self._ids, self._size
+        if size == 0:
+            return []
+        vector = vectorize([text], self.dimensions)[0]
+        scores = matrix[:size] @ vector
+        if exclude_id is not None and exclude_id in self._rows:
+            scores[self._rows[exclude_id]] = -1.0
+        k = min(k, size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] >= min_score]
@@ -0,0 +1,40 @@
+# tests/conftest.py
+# Aplicação de teste (TESTING=True: orçamentos de consultas estritos) sobre um SQLite temporário.
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('JWT_SECRET_KEY', 'testes-' + 'x' * 32)
+os.environ['RATE_LIMIT_ENABLED'] = '0'
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    import app as appmod
+
+    path = tmp_path_factory.mktemp('db') / 'plantdoctor.db'
+    flask_app = appmod.create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        # Cache de revogações carregado uma vez, sem atualização periódica durante os testes
+        'TOKEN_REVOCATION_REFRESH_SECONDS': 3600,
+    })
+    with flask_app.app_context():
+        appmod.db.create_all()
+        appmod.ensure_search_schemas()
+        appmod.seed_data()
+        # Já calculados num worker em execução (warm_up)
+        appmod.home_ranking()
+        appmod.recommendation_model()
+        appmod.token_revocations(force=True)
+        yield flask_app
+        appmod.db.session.remove()
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    return app.test_client()
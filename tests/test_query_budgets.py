@@ -0,0 +1,113 @@
+# tests/test_query_budgets.py
+# Número de instruções SQL por requisição nas rotas que carregam o usuário e no
+# calendário de colheitas. Cada rota roda para um usuário "pequeno" e um
+# "grande" (mais culturas, plantios e eventos): a contagem não pode passar do
+# orçamento nem crescer com os dados. Com TESTING=True o @query_budget da rota
+# também falha a requisição se o orçamento for excedido.
+from datetime import date, datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import app as appmod
+from app import db, User, UserType, Culture, PlantedCulture, HistoryEvent, EventType, PasswordResetToken
+
+PASSWORD = 'senha-teste'
+
+# rota -> número máximo de instruções SQL por requisição (todas, inclusive as dos hooks)
+BUDGETS = {
+    'login': 2,
+    'admin_users': 2,
+    'update_user': 6,
+    'save_user_cultures': 13,
+    'my_cultures': 2,
+    'planted_cultures': 3,
+    'upcoming_harvests': 1,
+    'home': 1,
+    'reset_password': 6,
+}
+
+
+def make_user(email, cultures, plantings, events_per_planting, admin=False):
+    user = User(name=email.split('@')[0], email=email, password_hash=appmod.hash_password(PASSWORD),
+                user_type=UserType.ADMIN if admin else UserType.COMMON)
+    user.cultures.extend(cultures)
+    db.session.add(user)
+    db.session.flush()
+    for index in range(plantings):
+        culture = cultures[index % len(cultures)]
+        # Colheita prevista nos próximos dias: entra no calendário de colheitas
+        planting_date = date.today() - timedelta(days=culture.cycle_days - 1 - index % 20)
+        planting = PlantedCulture(user_id=user.id, culture_id=culture.id, planting_date=planting_date,
+                                  predicted_harvest_date=planting_date + timedelta(days=culture.cycle_days))
+        db.session.add(planting)
+        db.session.flush()
+        db.session.add_all([HistoryEvent(planted_culture_id=planting.id, event_type=EventType.ADUBAGEM,
+                                         observation=f'evento {n}') for n in range(events_per_planting)])
+    db.session.commit()
+    return user
+
+
+@pytest.fixture(scope='module')
+def statement_counts(app, client):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def measure(method, path, **kwargs):
+        db.session.remove()
+        del statements[:]
+        response = client.open(path, method=method, **kwargs)
+        assert response.status_code < 400, (path, response.status_code, response.get_json())
+        return len(statements)
+
+    cultures = Culture.query.order_by(Culture.id).all()
+    culture_ids = [culture.id for culture in cultures]
+    admin_id = make_user('admin@teste.local', cultures[:1], 0, 0, admin=True).id
+    admin_headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(admin_id))}
+    users = {
+        'pequeno': make_user('pequeno@teste.local', cultures[:1], 1, 1),
+        'grande': make_user('grande@teste.local', cultures, 40, 10),
+    }
+    users = {label: (user.id, user.email) for label, user in users.items()}
+
+    event.listen(Engine, 'before_cursor_execute', count)
+    try:
+        results = {}
+        for label, (user_id, email) in users.items():
+            headers = {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+            token = f'teste-reset-{label}'
+            db.session.add(PasswordResetToken(user_id=user_id, token=token,
+                                              expires_at=datetime.utcnow() + timedelta(hours=1)))
+            db.session.commit()
+
+            results[label] = {
+                'login': measure('POST', '/api/auth/login', json={'email': email, 'password': PASSWORD}),
+                'admin_users': measure('GET', '/api/admin/users', headers=admin_headers),
+                'update_user': measure('PUT', f'/api/admin/users/{user_id}', headers=admin_headers,
+                                       json={'name': f'{label} editado'}),
+                'save_user_cultures': measure('POST', '/api/user/cultures', headers=headers,
+                                              json={'culture_ids': culture_ids[:2]}),
+                'my_cultures': measure('GET', '/api/user/my-cultures', headers=headers),
+                'planted_cultures': measure('GET', '/api/planted-cultures', headers=headers),
+                'upcoming_harvests': measure('GET', '/api/harvests/upcoming', headers=headers),
+                'home': measure('GET', '/api/home', headers=headers),
+                'reset_password': measure('POST', '/api/auth/reset-password',
+                                          json={'token': token, 'new_password': PASSWORD}),
+            }
+    finally:
+        event.remove(Engine, 'before_cursor_execute', count)
+    return results
+
+
+@pytest.mark.parametrize('route', list(BUDGETS))
+def test_statements_within_budget(statement_counts, route):
+    assert statement_counts['grande'][route] <= BUDGETS[route]
+
+
+@pytest.mark.parametrize('route', list(BUDGETS))
+def test_statements_do_not_grow_with_data(statement_counts, route):
+    assert statement_counts['grande'][route] == statement_counts['pequeno'][route]
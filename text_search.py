@@ -0,0 +1,168 @@
+# text_search.py
+# Busca textual em dúvidas e sugestões, com a mesma interface para os dois bancos:
+#   - SQLite: tabela virtual FTS5 (tokenizador unicode61, ranking bm25)
+#   - Postgres: tabela com tsvector ('portuguese') e índice GIN (ranking ts_rank)
+#
+# O texto é normalizado (minúsculas, sem acentos) antes de indexar e de buscar,
+# então "adubação" encontra "adubacao" e vice-versa. O destaque dos termos é
+# feito em Python sobre o texto original, só para os itens da página.
+import re
+import html
+import unicodedata
+
+from sqlalchemy import text
+
+KIND_CODES = {'doubt': 0, 'suggestion': 1}
+KIND_NAMES = {code: kind for kind, code in KIND_CODES.items()}
+MAX_TERMS = 8
+SNIPPET_CHARS = 160
+
+_ensured_engines = set()
+
+
+def fold(value):
+    """Minúsculas e sem acentos ('Adubação' -> 'adubacao')."""
+    normalized = unicodedata.normalize('NFKD', (value or '').lower())
+    return ''.join(ch for ch in normalized if not unicodedata.combining(ch))
+
+
+def _fold_aligned(value):
+    """Como fold(), mas preservando um caractere por caractere (para o destaque)."""
+    folded = []
+    for ch in value:
+        base = [c for c in unicodedata.normalize('NFKD', ch.lower()) if not unicodedata.combining(c)]
+        folded.append(base[0] if len(base) == 1 else ch.lower())
+    return ''.join(folded)
+
+
+def query_terms(query):
+    return re.findall(r'\w+', fold(query))[:MAX_TERMS]
+
+
+def _doc_key(kind, item_id):
+    return item_id * len(KIND_CODES) + KIND_CODES[kind]
+
+
+class SqliteSearchBackend:
+    def ensure_schema(self, connection):
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "content, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+
+    def index(self, connection, documents):
+        keys = [{'key': _doc_key(kind, item_id)} for kind, item_id, _ in documents]
+        connection.execute(text("DELETE FROM search_index WHERE rowid = :key"), keys)
+        connection.execute(text("INSERT INTO search_index (rowid, content) VALUES (:key, :content)"), [
+            {'key': _doc_key(kind, item_id), 'content': fold(content)} for kind, item_id, content in documents
+        ])
+
+    def search(self, connection, terms, kind, limit, offset):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        kind_filter = "AND rowid % :kinds = :kind_code" if kind else ""
+        return connection.execute(text(
+            f"SELECT rowid, -bm25(search_index) AS score FROM search_index "
+            f"WHERE search_index MATCH :match {kind_filter} ORDER BY rank LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'kinds': len(KIND_CODES), 'kind_code': KIND_CODES.get(kind),
+            'limit': limit, 'offset': offset}).all()
+
+
+class PostgresSearchBackend:
+    def ensure_schema(self, connection):
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS search_documents ("
+            "doc_key BIGINT PRIMARY KEY, kind SMALLINT NOT NULL, document TSVECTOR NOT NULL)"
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_search_documents_document ON search_documents USING GIN (document)"
+        ))
+
+    def index(self, connection, documents):
+        connection.execute(text(
+            "INSERT INTO search_documents (doc_key, kind, document) "
+            "VALUES (:key, :kind, to_tsvector('portuguese', :content)) "
+            "ON CONFLICT (doc_key) DO UPDATE SET document = EXCLUDED.document"
+        ), [{'key': _doc_key(kind, item_id), 'kind': KIND_CODES[kind], 'content': fold(content)}
+            for kind, item_id, content in documents])
+
+    def search(self, connection, terms, kind, limit, offset):
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        kind_filter = "AND kind = :kind_code" if kind else ""
+        return connection.execute(text(
+            f"SELECT doc_key, ts_rank(document, query) AS score "
+            f"FROM search_documents, to_tsquery('portuguese', :tsquery) AS query "
+            f"WHERE document @@ query {kind_filter} ORDER BY score DESC, doc_key DESC "
+            f"LIMIT :limit OFFSET :offset"
+        ), {'tsquery': tsquery, 'kind_code': KIND_CODES.get(kind), 'limit': limit, 'offset': offset}).all()
+
+
+def _backend_for(dialect_name):
+    if dialect_name == 'postgresql':
+        return PostgresSearchBackend()
+    return SqliteSearchBackend()
+
+
+def _backend(session):
+    connection = session.connection()
+    return _backend_for(connection.dialect.name), connection
+
+
+def ensure_schema(engine):
+    """Cria a tabela do índice numa transação própria, fora das transações das rotas.
+
+    O engine só é marcado como pronto depois do commit.
+    """
+    engine_key = str(engine.url)
+    if engine_key in _ensured_engines:
+        return
+    with engine.begin() as connection:
+        _backend_for(connection.dialect.name).ensure_schema(connection)
+    _ensured_engines.add(engine_key)
+
+
+def index_documents(session, documents):
+    """Indexa (ou reindexa) [(tipo, id, texto)] na transação da sessão."""
+    if documents:
+        backend, connection = _backend(session)
+        backend.index(connection, documents)
+
+
+def index_document(session, kind, item_id, *texts):
+    index_documents(session, [(kind, item_id, '\n'.join(t for t in texts if t))])
+
+
+def search(session, query, kind=None, limit=20, offset=0):
+    """[(tipo, id, score)] em ordem de relevância."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    backend, connection = _backend(session)
+    rows = backend.search(connection, terms, kind, limit, offset)
+    return [(KIND_NAMES[key % len(KIND_CODES)], key // len(KIND_CODES), float(score)) for key, score in rows]
+
+
+def highlight(value, terms, tag='mark'):
+    """Trecho do texto original com os termos (e prefixos) destacados, já escapado para HTML."""
+    if not value:
+        return None
+    folded = _fold_aligned(value)
+    spans = []
+    for match in re.finditer(r'\w+', folded):
+        if any(match.group().startswith(term) for term in terms):
+            spans.append(match.span())
+    if not spans:
+        return html.escape(value[:SNIPPET_CHARS]) + ('…' if len(value) > SNIPPET_CHARS else '')
+
+    start = max(0, spans[0][0] - SNIPPET_CHARS // 3)
+    end = min(len(value), start + SNIPPET_CHARS)
+    parts = ['…' if start > 0 else '']
+    cursor = start
+    for span_start, span_end in spans:
+        if span_start < start or span_end > end:
+            continue
+        parts.append(html.escape(value[cursor:span_start]))
+        parts.append(f'<{tag}>{html.escape(value[span_start:span_end])}</{tag}>')
+        cursor = span_end
+    parts.append(html.escape(value[cursor:end]))
+    parts.append('…' if end < len(value) else '')
+    return ''.join(parts)
@@ -0,0 +1,219 @@
+# user_search.py
+# Busca "typeahead" de usuários (nome e e-mail) para a administração.
+#
+# Cada usuário tem uma coluna search_key = "nome e-mail" em minúsculas e sem
+# acentos (preenchida pelo modelo; importações em lote chamam search_key()).
+# A busca tem duas faixas, nesta ordem:
+#   0. prefixo: a chave começa com o texto digitado (índice B-tree ordenado)
+#   1. trecho:  cada termo de 3+ letras aparece em qualquer ponto da chave
+#               (trigramas: pg_trgm/GIN no Postgres, FTS5 'trigram' no SQLite)
+# A faixa 0 sai em ordem alfabética (search_key, id); a faixa 1 em ordem de id,
+# que é a ordem natural do índice de trigramas: a página sai sem ordenar todos
+# os usuários que contêm um trecho comum ("silva", "gmail"). O cursor de
+# paginação (keyset) guarda a faixa e a última posição; nenhuma página usa OFFSET.
+import re
+import json
+import base64
+
+from sqlalchemy import text
+
+from text_search import fold
+
+MIN_SUBSTRING_CHARS = 3
+
+_ensured_engines = set()
+
+
+def search_key(name, email):
+    return f"{fold(name).strip()} {fold(email).strip()}"
+
+
+def normalize_query(query):
+    return ' '.join(fold(query).split())
+
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def encode_cursor(tier, key, user_id):
+    return base64.urlsafe_b64encode(json.dumps([tier, key, user_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(faixa, chave, id) ou None se o cursor for inválido."""
+    try:
+        tier, key, user_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return int(tier), str(key), int(user_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _filters(filters):
+    clauses, params = [], {}
+    if filters.get('user_type'):
+        clauses.append("user_type = :user_type")
+        params['user_type'] = filters['user_type']
+    if filters.get('registered_from'):
+        clauses.append("created_at >= :registered_from")
+        params['registered_from'] = filters['registered_from']
+    if filters.get('registered_until'):
+        clauses.append("created_at < :registered_until")
+        params['registered_until'] = filters['registered_until']
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+
+class SqliteUserSearchBackend:
+    def ensure_schema(self, connection):
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_search'"
+        )).first()
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_users_search_key ON users (search_key, id)"))
+        # Tabela FTS5 de conteúdo externo: só o índice de trigramas, o texto fica em users
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5("
+            "search_key, content = 'users', content_rowid = 'id', tokenize = 'trigram')"
+        ))
+        connection.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS users_search_ai AFTER INSERT ON users BEGIN "
+            "INSERT INTO users_search (rowid, search_key) VALUES (new.id, new.search_key); END"
+        ))
+        connection.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS users_search_ad AFTER DELETE ON users BEGIN "
+            "INSERT INTO users_search (users_search, rowid, search_key) VALUES ('delete', old.id, old.search_key); END"
+        ))
+        connection.execute(text(
+            "CREATE TRIGGER IF NOT EXISTS users_search_au AFTER UPDATE OF search_key ON users BEGIN "
+            "INSERT INTO users_search (users_search, rowid, search_key) VALUES ('delete', old.id, old.search_key); "
+            "INSERT INTO users_search (rowid, search_key) VALUES (new.id, new.search_key); END"
+        ))
+        if not exists:
+            connection.execute(text("INSERT INTO users_search (users_search) VALUES ('rebuild')"))
+
+    def page(self, connection, tier, prefix, terms, after, limit, filters):
+        filter_sql, params = _filters(filters)
+        params.update(limit=limit, prefix_low=prefix, prefix_high=prefix + '\U0010ffff')
+        if tier == 0:
+            if after:
+                filter_sql += " AND (search_key, id) > (:after_key, :after_id)"
+                params.update(after_key=after[0], after_id=after[1])
+            return connection.execute(text(
+                f"SELECT id, search_key FROM users WHERE search_key >= :prefix_low AND search_key < :prefix_high"
+                f"{filter_sql} ORDER BY search_key, id LIMIT :limit"
+            ), params).all()
+
+        # O FTS5 como laço externo devolve os rowids já em ordem: o LIMIT para a varredura cedo
+        params.update(match=' '.join('"' + term.replace('"', '""') + '"' for term in terms),
+                      after_id=after[1] if after else 0)
+        return connection.execute(text(
+            f"SELECT users.id, users.search_key FROM users_search JOIN users ON users.id = users_search.rowid "
+            f"WHERE users_search MATCH :match AND users_search.rowid > :after_id "
+            f"AND NOT (users.search_key >= :prefix_low AND users.search_key < :prefix_high){filter_sql} "
+            f"ORDER BY users_search.rowid LIMIT :limit"
+        ), params).all()
+
+
+class PostgresUserSearchBackend:
+    def ensure_schema(self, connection):
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        # Collation "C": o mesmo índice atende LIKE 'prefixo%' e a ordenação do keyset
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_users_search_key ON users ((search_key COLLATE "C"), id)'
+        ))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_users_search_key_trgm ON users USING GIN (search_key gin_trgm_ops)"
+        ))
+
+    def page(self, connection, tier, prefix, terms, after, limit, filters):
+        filter_sql, params = _filters(filters)
+        params.update(limit=limit, prefix=_like_escape(prefix) + '%')
+        key = 'search_key COLLATE "C"'
+        if tier == 0:
+            if after:
+                filter_sql += f" AND ({key}, id) > (:after_key, :after_id)"
+                params.update(after_key=after[0], after_id=after[1])
+            return connection.execute(text(
+                f"SELECT id, search_key FROM users WHERE {key} LIKE :prefix{filter_sql} ORDER BY {key}, id LIMIT :limit"
+            ), params).all()
+
+        where = f"NOT ({key} LIKE :prefix) AND id > :after_id"
+        params['after_id'] = after[1] if after else 0
+        for index, term in enumerate(terms):
+            where += f" AND search_key LIKE :term{index}"
+            params[f'term{index}'] = '%' + _like_escape(term) + '%'
+        return connection.execute(text(
+            f"SELECT id, search_key FROM users WHERE {where}{filter_sql} ORDER BY id LIMIT :limit"
+        ), params).all()
+
+
+def _backend_for(dialect_name):
+    if dialect_name == 'postgresql':
+        return PostgresUserSearchBackend()
+    return SqliteUserSearchBackend()
+
+
+def _backend(session):
+    connection = session.connection()
+    return _backend_for(connection.dialect.name), connection
+
+
+def ensure_schema(engine):
+    """Cria os índices (e, no SQLite, a tabela FTS5 já populada) numa transação própria.
+
+    Nunca dentro da transação de uma requisição: um rollback dela desfaria só
+    parte da DDL. O engine só é marcado como pronto depois do commit.
+    """
+    engine_key = str(engine.url)
+    if engine_key in _ensured_engines:
+        return
+    with engine.begin() as connection:
+        _backend_for(connection.dialect.name).ensure_schema(connection)
+    _ensured_engines.add(engine_key)
+
+
+def search(session, query, limit=20, cursor=None, **filters):
+    """Ids dos usuários que casam com `query`, na ordem da busca, e o cursor da próxima página.
+
+    filters: user_type (nome do enum), registered_from / registered_until (datetime).
+    """
+    prefix = normalize_query(query)
+    if not prefix:
+        return [], None
+    terms = [term for term in re.findall(r'\S+', prefix) if len(term) >= MIN_SUBSTRING_CHARS]
+    tier, after = 0, None
+    if cursor:
+        tier, key, user_id = cursor
+        after = (key, user_id)
+
+    backend, connection = _backend(session)
+    rows = []
+    while tier <= 1 and len(rows) <= limit:
+        if tier == 0 or terms:
+            found = backend.page(connection, tier, prefix, terms, after, limit + 1 - len(rows), filters)
+            rows.extend((tier, user_id, key) for user_id, key in found)
+        tier, after = tier + 1, None
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_tier, last_id, last_key = rows[limit - 1]
+        # Na faixa 1 a posição é só o id
+        next_cursor = encode_cursor(last_tier, last_key if last_tier == 0 else '', last_id)
+    return [user_id for _, user_id, _ in rows[:limit]], next_cursor
+
+
+def backfill_search_keys(session, batch_size=5000):
+    """Recalcula search_key de todos os usuários (bases anteriores à coluna). Retorna quantos mudaram."""
+    changed, last_id = 0, 0
+    connection = session.connection()
+    while True:
+        rows = connection.execute(text(
+            "SELECT id, name, email, search_key FROM users WHERE id > :last_id ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': batch_size}).all()
+        if not rows:
+            return changed
+        updates = [{'id': row.id, 'key': search_key(row.name, row.email)} for row in rows
+                   if row.search_key != search_key(row.name, row.email)]
+        if updates:
+            connection.execute(text("UPDATE users SET search_key = :key WHERE id = :id"), updates)
+            changed += len(updates)
+        last_id = rows[-1].id
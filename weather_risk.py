@@ -0,0 +1,203 @@
+# weather_risk.py
+# Risco de doenças pelo clima: lê observações de estações meteorológicas de
+# arquivos locais (CSV ou Parquet) e calcula, para todas as estações de uma vez,
+# a fração de dias favoráveis a cada doença (regras em knowledge_base.py).
+# Os plantios herdam o risco da estação ligada a eles (weather_station).
+#
+# Arquivos: um por estação ou por estação/dia, em qualquer estrutura de pastas.
+# Colunas: date (YYYY-MM-DD), station (opcional: sem ela vale o nome do arquivo,
+# ou da pasta quando o arquivo se chama pela data, ex: A701/2026-10-18.csv),
+# temp_mean (°C), humidity (% de umidade relativa) e rain (mm). Várias linhas da
+# mesma estação/dia (observações horárias) viram a média de temperatura e
+# umidade e a soma da chuva.
+#
+# Só as linhas dentro da janela analisada ficam em memória: o tamanho das
+# matrizes é (estações x dias da maior janela), não o tamanho dos arquivos.
+import os
+import csv
+from array import array
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from text_search import fold
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet é opcional; CSV funciona sempre
+    pq = None
+
+READ_BATCH_SIZE = 65536
+FILE_EXTENSIONS = ('.csv', '.parquet')
+
+
+class StationWeather:
+    """Clima diário de `days` dias até `end`: matrizes (estações, dias), NaN onde não há observação."""
+
+    def __init__(self, stations, end, temperature, humidity, rain):
+        self.stations = stations
+        self.end = end
+        self.temperature = temperature
+        self.humidity = humidity
+        self.rain = rain
+
+    @property
+    def days(self):
+        return self.temperature.shape[1]
+
+
+def observation_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.endswith(FILE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _parse_day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip()[:10])
+
+
+def _file_day(stem):
+    try:
+        return date.fromisoformat(stem)
+    except ValueError:
+        return None
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def read_records(path):
+    """Linhas do arquivo como dicts, em streaming."""
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError(f"Leitura de {path} requer o pacote pyarrow.")
+        parquet = pq.ParquetFile(path)
+        wanted = ('station', 'date', 'temp_mean', 'humidity', 'rain')
+        columns = [name for name in wanted if name in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=READ_BATCH_SIZE, columns=columns):
+            yield from batch.to_pylist()
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+
+
+def _daily(flat, values, size, reduce):
+    """Agrega por célula (estação, dia): média ou soma dos valores presentes, NaN sem nenhum."""
+    present = np.isfinite(values)
+    totals = np.bincount(flat[present], weights=values[present], minlength=size)
+    counts = np.bincount(flat[present], minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = totals / counts if reduce == 'mean' else totals
+    result[counts == 0] = np.nan
+    return result
+
+
+def load_observations(paths, end, days):
+    """Lê as observações dos `days` dias até `end` (inclusive) e devolve um StationWeather."""
+    start = end - timedelta(days=days - 1)
+    stations = {}
+    station_index, day_index = array('q'), array('q')
+    temperature, humidity, rain = array('d'), array('d'), array('d')
+
+    for path in observation_files(paths):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        file_day = _file_day(stem)
+        if file_day is not None and not start <= file_day <= end:
+            continue
+        default_station = os.path.basename(os.path.dirname(path)) if file_day else stem
+        for record in read_records(path):
+            try:
+                offset = (_parse_day(record.get('date') or file_day) - start).days
+            except ValueError:
+                continue
+            if not 0 <= offset < days:
+                continue
+            station = str(record.get('station') or default_station).strip()
+            station_index.append(stations.setdefault(station, len(stations)))
+            day_index.append(offset)
+            temperature.append(_number(record.get('temp_mean')))
+            humidity.append(_number(record.get('humidity')))
+            rain.append(_number(record.get('rain')))
+
+    size = len(stations) * days
+    flat = np.frombuffer(station_index, dtype=np.int64) * days + np.frombuffer(day_index, dtype=np.int64)
+    shape = (len(stations), days)
+    return StationWeather(
+        stations, end,
+        _daily(flat, np.frombuffer(temperature), size, 'mean').reshape(shape),
+        _daily(flat, np.frombuffer(humidity), size, 'mean').reshape(shape),
+        _daily(flat, np.frombuffer(rain), size, 'sum').reshape(shape),
+    )
+
+
+def station_risk(weather, rules):
+    """Risco de cada regra em cada estação, numa passada vetorizada por regra.
+
+    Retorna (risk, favorable): matrizes (regras, estações) com a fração e o número
+    de dias favoráveis na janela da regra. Estações com menos da metade da janela
+    observada ficam com risco NaN (sem dados para avaliar).
+    """
+    n_stations = len(weather.stations)
+    risk = np.full((len(rules), n_stations), np.nan)
+    favorable_days = np.zeros((len(rules), n_stations), dtype=np.int64)
+    for i, rule in enumerate(rules.values()):
+        window = min(rule['window_days'], weather.days)
+        temperature = weather.temperature[:, -window:]
+        humidity = weather.humidity[:, -window:]
+        low, high = rule['temperature']
+        with np.errstate(invalid='ignore'):
+            favorable = ((temperature >= low) & (temperature <= high) & (humidity >= rule['humidity_min'])
+                         & (np.nan_to_num(weather.rain[:, -window:]) >= rule['rain_min']))
+        observed = (np.isfinite(temperature) & np.isfinite(humidity)).sum(axis=1)
+        favorable_days[i] = favorable.sum(axis=1)
+        risk[i] = favorable_days[i] / window
+        risk[i, observed * 2 < window] = np.nan
+    return risk, favorable_days
+
+
+def culture_rule_mask(rules, cultures):
+    """Quais regras valem para cada cultura, pelo prefixo do rótulo ('Cafe_Ferrugem' -> Café).
+
+    cultures: {culture_id: nome}. Retorna ({culture_id: linha}, matriz booleana
+    (culturas, regras)) só com as culturas que têm alguma regra.
+    """
+    prefixes = [fold(label.split('_', 1)[0]) for label in rules]
+    positions, rows = {}, []
+    for culture_id, name in cultures.items():
+        row = [prefix == fold(name) for prefix in prefixes]
+        if any(row):
+            positions[culture_id] = len(rows)
+            rows.append(row)
+    return positions, np.array(rows, dtype=bool).reshape(len(rows), len(prefixes))
+
+
+def station_positions(weather, codes):
+    """Posição de cada código de estação nas matrizes de `weather` (-1 se não houver observações)."""
+    return np.fromiter((weather.stations.get(code, -1) for code in codes), dtype=np.int64, count=len(codes))
+
+
+def planting_risk(risk, station_index, rule_mask, threshold):
+    """Risco de um lote de plantios.
+
+    station_index: (plantios,) posição da estação de cada plantio, -1 se a estação
+    não tem observações. rule_mask: (plantios, regras), as regras da cultura do plantio.
+    Retorna (scores, at_risk), ambos (plantios, regras).
+    """
+    scores = risk[:, station_index].T
+    scores[station_index < 0] = np.nan
+    with np.errstate(invalid='ignore'):
+        at_risk = rule_mask & (scores >= threshold)
+    return scores, at_risk